@@ -0,0 +1,79 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    body: bytes     # JSON già serializzato, servito così com'è
+    etag: str       # hash del contenuto: uguale su tutti i worker se il catalogo è lo stesso
+    version: int    # versione locale del processo (cresce a ogni invalidazione)
+
+
+class CatalogCache:
+    """
+    Cataloghi quasi statici (per processo) tenuti in memoria già serializzati, con versione ed ETag.
+
+    - get(): se il catalogo non c'è (o è scaduto) lo carica con loader() e lo tiene.
+    - invalidate(): da chiamare dopo il commit di una scrittura sul catalogo; la versione cresce,
+      così un caricamento iniziato prima dell'invalidazione non rimette in cache dati vecchi.
+    - TTL: gli altri worker non ricevono l'invalidazione, si riallineano alla scadenza.
+    """
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, tuple] = {}  # nome -> (scadenza, snapshot)
+        self._versions: Dict[str, int] = {}
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, name: str, loader: Callable[[], bytes]) -> CatalogSnapshot:
+        with self._lock:
+            entry = self._snapshots.get(name)
+            if entry is not None and entry[0] > self._clock():
+                self.hits += 1
+                return entry[1]
+            version = self._versions.get(name, 0)
+
+        # Il caricamento avviene fuori dal lock: una query lenta non blocca gli altri cataloghi
+        body = loader()
+        snapshot = CatalogSnapshot(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"', version=version)
+        with self._lock:
+            self.loads += 1
+            if self._versions.get(name, 0) == version:
+                self._snapshots[name] = (self._clock() + self.ttl, snapshot)
+        return snapshot
+
+    def invalidate(self, name: str):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._snapshots.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "loads": self.loads,
+                "catalogs": {
+                    name: {"version": snapshot.version, "etag": snapshot.etag, "bytes": len(snapshot.body)}
+                    for name, (_, snapshot) in self._snapshots.items()
+                },
+                "versions": dict(self._versions),
+            }
+
+
+# Istanza unica per processo: cataloghi globali delle amenities ("property", "room")
+amenity_catalogs = CatalogCache(ttl=settings.AMENITY_CATALOG_TTL_SECONDS)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match può contenere più ETag (anche deboli, W/"...") oppure *."""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
@@ -0,0 +1,112 @@
+from typing import Dict, Optional
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # dipendenza opzionale: senza, solo gzip
+    brotli = None
+
+def supported_encodings():
+    # In ordine di preferenza a parità di q (brotli comprime meglio il JSON ripetitivo)
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def parse_q_values(value: str) -> Dict[str, float]:
+    """Header Accept / Accept-Encoding -> {valore: q}. Es. "gzip, br;q=0.8, *;q=0" -> {"gzip": 1.0, "br": 0.8, "*": 0.0}"""
+    weights: Dict[str, float] = {}
+    for part in value.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, number = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """La codifica con q più alto tra quelle supportate (None = nessuna compressione)."""
+    weights = parse_q_values(accept_encoding or "")
+    best, best_q = None, 0.0
+    for coding in supported_encodings():
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int, thread_minimum_size: int, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.quality = quality
+        self.thread_minimum_size = thread_minimum_size
+        self._compressor = None
+
+    @property
+    def compressor(self):
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=self.quality)
+        return self._compressor
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if len(body) >= self.thread_minimum_size:
+            # Come per gzip: i blocchi grandi non si comprimono nel loop degli eventi
+            return await anyio.to_thread.run_sync(self._compress_body, body, more_body)
+        return self._compress_body(body, more_body)
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        if more_body:
+            # flush: ogni blocco dello streaming (es. export NDJSON) arriva subito al client
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compressione negoziata con Accept-Encoding: brotli (se il pacchetto è installato) o gzip,
+    scelta per q-value; sotto minimum_size byte la risposta esce com'è.
+    Funziona anche con lo streaming (export NDJSON): ogni blocco viene compresso e inviato.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        thread_minimum_size: int = 128 * 1024
+    ):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=gzip_level, thread_minimum_size=thread_minimum_size)
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("Accept-Encoding"))
+        if encoding == "br":
+            responder = BrotliResponder(
+                self.app, self.minimum_size, quality=self.brotli_quality,
+                thread_minimum_size=self.thread_minimum_size, exclude_content_types=self.exclude_content_types
+            )
+        elif encoding == "gzip":
+            responder = GZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel,
+                thread_minimum_size=self.thread_minimum_size, exclude_content_types=self.exclude_content_types
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=self.exclude_content_types)
+        await responder(scope, receive, send)
@@ -13,6 +13,11 @@ class Settings(BaseSettings):
 
     # --- STORAGE (S3) ---
     S3_MEDIA_BUCKET: str = os.getenv("S3_MEDIA_BUCKET")
+    # Client S3 unico per processo: connessioni HTTP riusate tra le richieste (al massimo S3_MAX_POOL_CONNECTIONS)
+    S3_MAX_POOL_CONNECTIONS: int = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))
+    S3_CONNECT_TIMEOUT: float = float(os.getenv("S3_CONNECT_TIMEOUT", "5"))    # secondi
+    S3_READ_TIMEOUT: float = float(os.getenv("S3_READ_TIMEOUT", "30"))         # secondi
+    S3_MAX_ATTEMPTS: int = int(os.getenv("S3_MAX_ATTEMPTS", "3"))              # tentativi, retry compresi
     # CLOUDFRONT_DOMAIN: str = os.getenv("CLOUDFRONT_DOMAIN", "")
 
     # --- DATABASE ---
@@ -22,10 +27,108 @@ class Settings(BaseSettings):
     DB_PASS: str = os.getenv("DB_PASS", "postgres")
     DB_NAME: str = os.getenv("DB_NAME", "myappdb")
 
+    # Pool di connessioni (per processo): al massimo DB_POOL_SIZE + DB_MAX_OVERFLOW connessioni aperte
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))      # secondi di attesa di una connessione libera
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))        # secondi, poi la connessione si riapre (-1 = mai)
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = nessun limite
+
+    # Repliche in sola lettura (URL postgresql://... separati da virgola, vuoto = nessuna):
+    # le GET di search, properties, rooms e media leggono da lì, le scritture restano sul primary
+    DB_REPLICA_URLS: str = os.getenv("DB_REPLICA_URLS", "")
+    DB_REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))      # oltre, la replica viene saltata
+    DB_REPLICA_LAG_CHECK_SECONDS: float = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "2"))  # ogni quanto si misura il ritardo
+
+    # --- RISPOSTE ---
+    # Compressione negoziata (Accept-Encoding): brotli se il pacchetto è installato, altrimenti gzip
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))  # byte, sotto non si comprime
+    GZIP_LEVEL: int = int(os.getenv("GZIP_LEVEL", "6"))            # 1-9
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", "4"))    # 0-11: oltre 5 costa molta CPU per pochi byte
+
+    # --- SEARCH ---
+    # "fulltext": tsvector + trigram sul documento di ricerca (vedi schema.sql)
+    # "ilike": vecchia ricerca con ILIKE su 5 colonne (utile per confronto)
+    # "trigram": similarità pesata su nome, città, indirizzo, descrizione (tollera errori di battitura)
+    SEARCH_TEXT_MODE: str = os.getenv("SEARCH_TEXT_MODE", "fulltext")
+    # "python": 5 query + assemblaggio in Python
+    # "json": una sola query, Postgres costruisce il documento con LATERAL + json_agg
+    SEARCH_ASSEMBLY: str = os.getenv("SEARCH_ASSEMBLY", "python")
+
+    # Cataloghi globali delle amenities: in memoria per AMENITY_CATALOG_TTL_SECONDS (riallinea gli altri worker),
+    # i client li tengono AMENITY_CATALOG_MAX_AGE_SECONDS e poi rivalidano con If-None-Match (304)
+    AMENITY_CATALOG_TTL_SECONDS: float = float(os.getenv("AMENITY_CATALOG_TTL_SECONDS", "300"))
+    AMENITY_CATALOG_MAX_AGE_SECONDS: int = int(os.getenv("AMENITY_CATALOG_MAX_AGE_SECONDS", "60"))
+
+    # Cache degli utenti autenticati (cognito sub -> utente), per processo: evita una query per richiesta
+    USER_CACHE_ENABLED: bool = os.getenv("USER_CACHE_ENABLED", "true").lower() == "true"
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+    USER_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+    # Import massivo (POST /api/properties/import, python -m app.services.import_service):
+    # properties per transazione e limite di righe per richiesta HTTP (la CLI non ha limite)
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+    IMPORT_MAX_ROWS: int = int(os.getenv("IMPORT_MAX_ROWS", "20000"))
+
+    # Stanze per richiesta in POST /api/properties/{id}/rooms/batch (una transazione)
+    ROOM_BATCH_MAX_ROOMS: int = int(os.getenv("ROOM_BATCH_MAX_ROOMS", "500"))
+
+    # Export del catalogo (GET /api/properties/mine/export, python -m app.services.export_service):
+    # properties lette e scritte per pagina; la memoria dipende da questo, non dal numero di hotel
+    EXPORT_CHUNK_SIZE: int = int(os.getenv("EXPORT_CHUNK_SIZE", "200"))
+
+    # Cache dei risultati della search (per processo, LRU + TTL)
+    SEARCH_CACHE_ENABLED: bool = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+    SEARCH_CACHE_TTL_SECONDS: float = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "30"))
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512"))
+
+    # Quanti figli per risultato restituisce la search (0 = tutti); il totale è in room_count / media_count
+    SEARCH_MAX_ROOMS: int = int(os.getenv("SEARCH_MAX_ROOMS", "3"))              # le più economiche
+    SEARCH_MAX_MEDIA: int = int(os.getenv("SEARCH_MAX_MEDIA", "5"))              # prime foto della property
+    SEARCH_MAX_ROOM_MEDIA: int = int(os.getenv("SEARCH_MAX_ROOM_MEDIA", "1"))    # prime foto di ogni stanza
+
+    # Da dove legge /api/search:
+    # "cards": proiezione property_search_cards (una tabella, documento già pronto)
+    # "live": tabelle normalizzate (usato comunque quando ci sono filtri sulle stanze)
+    SEARCH_SOURCE: str = os.getenv("SEARCH_SOURCE", "cards")
+
+    # Motore di ricerca in memoria (app/search/engine.py): se attivo serve /api/search senza query
+    SEARCH_ENGINE_ENABLED: bool = os.getenv("SEARCH_ENGINE_ENABLED", "false").lower() == "true"
+    # Ogni quanti secondi il motore rilegge le card scritte dagli altri processi (0 = mai:
+    # solo con un processo, altrimenti il motore resta spento)
+    SEARCH_ENGINE_REFRESH_SECONDS: float = float(os.getenv("SEARCH_ENGINE_REFRESH_SECONDS", "5"))
+    # Worker uvicorn per container (lo legge anche uvicorn)
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+    # Indice bitmap delle amenities in memoria (filtri "ha tutte queste amenities")
+    AMENITY_INDEX_ENABLED: bool = os.getenv("AMENITY_INDEX_ENABLED", "true").lower() == "true"
+    # Ogni quanti secondi l'indice si ricostruisce per vedere i link scritti dagli altri processi
+    # (0 = mai: solo con un processo, altrimenti l'indice resta spento)
+    AMENITY_INDEX_REFRESH_SECONDS: float = float(os.getenv("AMENITY_INDEX_REFRESH_SECONDS", "30"))
+
+    # Ogni quanti secondi l'autocompletamento si ricostruisce per vedere le properties pubblicate
+    # o ritirate dagli altri processi (0 = mai: vede solo quelle di questo processo)
+    SUGGEST_INDEX_REFRESH_SECONDS: float = float(os.getenv("SUGGEST_INDEX_REFRESH_SECONDS", "60"))
+
+    # --- ENDPOINT INTERNI (/internal/*) ---
+    # Token da mandare nell'header X-Internal-Token; vuoto = rotte /internal non montate
+    INTERNAL_API_TOKEN: str = os.getenv("INTERNAL_API_TOKEN", "")
+
     @property
     def DATABASE_URL(self):
         return f"postgresql://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def REPLICA_DATABASE_URLS(self):
+        return [url.strip() for url in self.DB_REPLICA_URLS.split(",") if url.strip()]
+
+    # Stesso database con driver asyncpg, per le rotte GET async (vedi get_async_db)
+    @property
+    def ASYNC_DATABASE_URL(self):
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
     # Questo permette a Pydantic di leggere dal file .env se presente (utile per debug senza docker)
     class Config:
         env_file = ".env"
@@ -1,9 +1,26 @@
+import threading
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base # <--- 1. Importa questo
 from app.config import settings
+from app.db_pool import InstrumentedQueuePool
+
+def engine_options() -> dict:
+    # Pool configurabile da Settings; le metriche sono su /internal/db-pool
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    # statement_timeout impostato alla connessione: una query più lenta viene annullata da Postgres
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return options
 
 # Crea l'engine
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **engine_options())
 
 # Crea la session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -16,4 +33,42 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# =================================================================
+# ASYNC (asyncpg) - solo letture, usato dalle rotte GET async
+# =================================================================
+# L'engine async ha un suo pool (stesse dimensioni di quello sync) e viene creato al primo uso:
+# un processo che non serve rotte async (CLI, script) non apre connessioni in più.
+# sqlalchemy.ext.asyncio richiede greenlet: l'import è dentro le funzioni per lo stesso motivo.
+_async_engine = None
+_async_lock = threading.Lock()
+
+def create_async_engine_for(url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    options = {k: v for k, v in engine_options().items() if k != "poolclass"}
+    if "connect_args" in options:
+        # asyncpg non accetta "options": i parametri di sessione vanno in server_settings
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+    return create_async_engine(url, **options)
+
+def async_session_for(async_engine):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    # expire_on_commit=False: gli oggetti restano leggibili senza altre query (niente lazy load in async)
+    return AsyncSession(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine_for(settings.ASYNC_DATABASE_URL)
+    return _async_engine
+
+async def get_async_db():
+    async with async_session_for(get_async_engine()) as db:
+        yield db
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
@@ -0,0 +1,92 @@
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from sqlalchemy import exc
+from sqlalchemy.pool import Pool, QueuePool
+
+# Limiti superiori (ms) dei bucket dell'istogramma dei tempi di attesa; l'ultimo bucket è "oltre"
+WAIT_BUCKETS_MS: List[float] = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class PoolMetrics:
+    """
+    Statistiche (per processo) sul pool di connessioni: quante volte si è chiesta una connessione,
+    quanto si è aspettato (istogramma) e quante richieste sono andate in timeout (QueuePool limit).
+    Thread-safe: le rotte sync di FastAPI girano nel threadpool.
+    """
+
+    def __init__(self, buckets_ms: Optional[List[float]] = None):
+        self._lock = threading.Lock()
+        self.buckets_ms = list(buckets_ms or WAIT_BUCKETS_MS)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.counts = [0] * (len(self.buckets_ms) + 1)
+            self.started_at = time.time()
+
+    def observe(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            self.counts[bisect.bisect_left(self.buckets_ms, wait_ms)] += 1
+
+    def stats(self, pool: Optional[Pool] = None) -> Dict[str, Any]:
+        with self._lock:
+            observed = self.checkouts + self.timeouts
+            histogram = [
+                {"le_ms": bound, "count": count}
+                for bound, count in zip(self.buckets_ms + [None], self.counts)
+            ]
+            stats: Dict[str, Any] = {
+                "since": self.started_at,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total_ms / observed, 3) if observed else None,
+                "wait_max_ms": round(self.wait_max_ms, 3),
+                "wait_histogram": histogram,
+            }
+        if isinstance(pool, QueuePool):
+            # Stato attuale del pool (non storico)
+            stats.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout_seconds": pool.timeout(),
+            })
+        return stats
+
+
+# Istanza unica per processo
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool che misura il tempo per ottenere una connessione (attesa in coda,
+    più l'eventuale apertura di una nuova connessione / pre-ping) e conta i timeout.
+    Le metriche stanno in un attributo di classe: dispose() ricrea il pool con la stessa classe.
+    """
+
+    metrics = pool_metrics
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.observe((time.perf_counter() - started) * 1000, timed_out=True)
+            raise
+        self.metrics.observe((time.perf_counter() - started) * 1000)
+        return connection
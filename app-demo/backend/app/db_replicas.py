@@ -0,0 +1,228 @@
+import itertools
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from app.config import settings
+from app.db import SessionLocal, async_session_for, create_async_engine_for, engine_options, get_async_engine
+from app.db_pool import InstrumentedQueuePool, PoolMetrics
+
+# Istante (epoch, secondi) dell'ultima scrittura del client: cookie per il browser, header per gli altri client
+LAST_WRITE_COOKIE = "last_write_at"
+LAST_WRITE_HEADER = "X-Last-Write-At"
+
+# Una misura del ritardo più vecchia di STALE_CHECKS intervalli non vale più (thread fermo, replica irraggiungibile)
+STALE_CHECKS = 3
+
+# Ritardo della replica in secondi: 0 se ha già applicato tutto il WAL ricevuto
+# (una replica ferma su un primary senza scritture non è "in ritardo"), NULL se non ha ancora applicato nulla
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class Replica:
+    """Una replica in sola lettura: engine sync (pool con metriche proprie), engine async creato al primo uso."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.metrics = PoolMetrics()
+        pool_class = type("ReplicaQueuePool", (InstrumentedQueuePool,), {"metrics": self.metrics})
+        self.engine = create_engine(url, **{**engine_options(), "poolclass": pool_class})
+        self.async_engine = None
+        # Ultima misura del ritardo (None = sconosciuto: la replica non si usa)
+        self.lag_seconds: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def async_url(self) -> str:
+        return make_url(self.url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+class ReplicaRouter:
+    """
+    Sceglie da dove leggere: una delle repliche (a turno) o, se nessuna va bene, il primary.
+    Una replica va bene se il suo ritardo è misurato, recente e sotto DB_REPLICA_MAX_LAG_SECONDS.
+
+    Read-your-writes: chi ha appena scritto manda l'istante della scrittura (cookie / header);
+    si usa solo una replica che, al momento della misura, aveva già applicato le transazioni
+    fino a quell'istante (checked_at - lag > written_at), altrimenti si legge dal primary.
+
+    Il ritardo lo misura un thread in background (start/stop nel lifespan):
+    senza thread (CLI, script) le misure non ci sono e si legge sempre dal primary.
+    """
+
+    def __init__(self, urls: List[str], max_lag_seconds: float, check_seconds: float):
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reads = {"replica": 0, "primary": 0, "primary_after_write": 0}
+
+    @property
+    def write_window_seconds(self) -> int:
+        # Oltre questa finestra qualunque replica utilizzabile ha già applicato la scrittura
+        return math.ceil(self.max_lag_seconds + STALE_CHECKS * self.check_seconds)
+
+    # =================================================================
+    # ROUTING
+    # =================================================================
+
+    def choose(self, written_at: Optional[float] = None) -> Optional[Replica]:
+        """La replica da cui leggere, None = primary."""
+        now = time.time()
+        with self._lock:
+            healthy = [r for r in self.replicas if self._healthy(r, now)]
+            fresh = [r for r in healthy if written_at is None or r.checked_at - r.lag_seconds > written_at]
+            if not fresh:
+                self.reads["primary_after_write" if healthy else "primary"] += 1
+                return None
+            self.reads["replica"] += 1
+            return fresh[next(self._turn) % len(fresh)]
+
+    def get_async_engine(self, replica: Replica):
+        if replica.async_engine is None:
+            with self._lock:
+                if replica.async_engine is None:
+                    replica.async_engine = create_async_engine_for(replica.async_url)
+        return replica.async_engine
+
+    # =================================================================
+    # MISURA DEL RITARDO
+    # =================================================================
+
+    def check_lag(self):
+        for replica in self.replicas:
+            started, lag, error = time.time(), None, None
+            try:
+                with replica.engine.connect() as conn:
+                    lag = conn.execute(text(REPLICA_LAG_SQL)).scalar()
+            except Exception as e:
+                error = str(e)
+            # Ritardo e istante della misura cambiano insieme (choose li legge con il lock)
+            with self._lock:
+                replica.lag_seconds = float(lag) if lag is not None else None
+                replica.checked_at = started
+                replica.error = error
+
+    def start(self):
+        if self.replicas and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="replica-lag", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=self.check_seconds + 5)
+            self._thread = None
+
+    async def dispose(self):
+        for replica in self.replicas:
+            replica.engine.dispose()
+            if replica.async_engine is not None:
+                await replica.async_engine.dispose()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            reads = dict(self.reads)
+            replicas = [
+                {
+                    "name": r.name,
+                    "healthy": self._healthy(r, now),
+                    "lag_seconds": r.lag_seconds,
+                    "checked_at": r.checked_at,
+                    "error": r.error,
+                }
+                for r in self.replicas
+            ]
+        for replica, info in zip(self.replicas, replicas):
+            info["pool"] = replica.metrics.stats(replica.engine.pool)
+        return {
+            "max_lag_seconds": self.max_lag_seconds,
+            "check_seconds": self.check_seconds,
+            "write_window_seconds": self.write_window_seconds,
+            "reads": reads,
+            "replicas": replicas,
+        }
+
+    # =================================================================
+    # HELPER PRIVATI
+    # =================================================================
+
+    # Da chiamare con il lock preso
+    def _healthy(self, replica: Replica, now: float) -> bool:
+        return (
+            replica.lag_seconds is not None
+            and replica.lag_seconds <= self.max_lag_seconds
+            and now - replica.checked_at <= STALE_CHECKS * self.check_seconds
+        )
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.check_lag()
+            self._stop.wait(self.check_seconds)
+
+
+# Istanza unica per processo
+replica_router = ReplicaRouter(
+    settings.REPLICA_DATABASE_URLS, settings.DB_REPLICA_MAX_LAG_SECONDS, settings.DB_REPLICA_LAG_CHECK_SECONDS
+)
+
+# =================================================================
+# DEPENDENCY E MIDDLEWARE
+# =================================================================
+
+def last_write_at(request: Request) -> Optional[float]:
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+# Sessione di sola lettura: replica se possibile, altrimenti primary (da non usare per scrivere)
+def get_read_db(request: Request):
+    replica = replica_router.choose(last_write_at(request))
+    db = SessionLocal(bind=replica.engine) if replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    replica = replica_router.choose(last_write_at(request))
+    async_engine = replica_router.get_async_engine(replica) if replica else get_async_engine()
+    async with async_session_for(async_engine) as db:
+        yield db
+
+async def read_your_writes_middleware(request: Request, call_next):
+    # Dopo una scrittura riuscita il client riceve l'istante della scrittura: per qualche secondo
+    # le sue letture vanno solo su repliche che l'hanno già applicata (o sul primary)
+    response = await call_next(request)
+    if (
+        replica_router.replicas
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and request.url.path.startswith("/api/")
+        and response.status_code < 400
+    ):
+        # Istante preso a risposta pronta, quindi dopo il commit
+        value = f"{time.time():.3f}"
+        response.headers[LAST_WRITE_HEADER] = value
+        response.set_cookie(
+            LAST_WRITE_COOKIE, value, max_age=replica_router.write_window_seconds,
+            path="/api", httponly=True, samesite="lax"
+        )
+    return response
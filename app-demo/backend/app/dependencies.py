@@ -1,44 +1,89 @@
-from fastapi import Header
+import hmac
+from fastapi import Header, Query
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import FrozenSet, Optional
 from sqlalchemy.orm import Session
 from app.db import get_db
+from app.db_replicas import get_async_read_db, get_read_db
 from app.repositories.user_repository import UserRepository
 from app.domain import entities
 from app.domain.factories import PropertyAmenityFactory, RoomAmenityFactory
 from fastapi import Depends, HTTPException
-from app.repositories.search_repository import SearchRepository
-from app.services.search_service import SearchService
-from app.repositories.property_repository import PropertyRepository
-from app.services.property_service import PropertyService
-from app.repositories.room_repository import RoomRepository
-from app.services.room_service import RoomService
+from app.domain.search import PROPERTY_INCLUDES
+from app.repositories.search_repository import AsyncSearchRepository, SearchRepository
+from app.repositories.search_card_repository import SearchCardRepository
+from app.services.search_service import AsyncSearchService, SearchService
+from app.search.cache import SearchResultCache, search_cache
+from app.search.amenity_index import AmenityBitmapIndex, amenity_index
+from app.search.suggest import SuggestIndex, suggest_index
+from app.search.engine import SearchEngine, search_engine
+from app.config import settings
+from app.cache import TTLCache
+from app.catalog_cache import CatalogCache, amenity_catalogs
+from app.repositories.property_repository import AsyncPropertyRepository, PropertyRepository
+from app.services.property_service import AsyncPropertyService, PropertyService
+from app.repositories.room_repository import AsyncRoomRepository, RoomRepository
+from app.services.room_service import AsyncRoomService, RoomService
+from app.repositories.import_repository import BulkImportRepository
+from app.services.import_service import ImportService
+from app.services.export_service import ExportService
 from app.repositories.media_repository import MediaRepository
 from app.services.media_service import MediaService
 from app.repositories.amenity_repository import PropertyAmenityRepository, RoomAmenityRepository
-from app.storage.s3_media_storage import S3MediaStorage
+from app.storage.s3_media_storage import S3MediaStorage, s3_media_storage
 from app.storage.media_storage_interface import IMediaStorage
 
+# Parametro include= delle letture di properties (search, dettaglio, mine)
+def get_include(
+    include: Optional[str] = Query(
+        None, description="Comma-separated child collections to return: rooms, media, amenities (default all)"
+    )
+) -> Optional[FrozenSet[str]]:
+    if include is None:
+        return None
+    values = frozenset(v.strip() for v in include.split(",") if v.strip())
+    unknown = values - PROPERTY_INCLUDES
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    return values
+
 def get_user_repo(db: Session = Depends(get_db)) -> UserRepository:
     return UserRepository(db)
 
+# Utenti autenticati già visti (cognito sub -> entities.User), per processo.
+# Gli utenti non cambiano dopo la creazione: il TTL limita solo quanto resta in memoria chi non torna.
+user_cache = TTLCache(maxsize=settings.USER_CACHE_MAX_ENTRIES, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+def get_user_cache() -> Optional[TTLCache]:
+    # None = cache disabilitata (una query per richiesta autenticata)
+    return user_cache if settings.USER_CACHE_ENABLED else None
+
 # DEPENDENCY PER GLI OWNER (STRICT)
 # Da usare per rotte protette: Create Property, Add Room, Publish, etc.
 def get_or_create_user_from_headers(
     x_user_cognito_sub: str,
     x_user_email: Optional[str],
-    user_repo: UserRepository
+    user_repo: UserRepository,
+    cache: Optional[TTLCache] = None
 ) -> entities.User:
+    if cache is not None:
+        user = cache.get(x_user_cognito_sub)
+        if user is not None:
+            return user
+
     user = user_repo.get_by_cognito_id(x_user_cognito_sub)
 
     if not user:
         name_fallback = x_user_email.split("@")[0] if x_user_email else "user"
+        # Upsert: sicuro anche con più richieste concorrenti dello stesso utente nuovo
         user = user_repo.create_from_cognito(
             cognito_uuid=x_user_cognito_sub,
             email=x_user_email,
             name=name_fallback
         )
 
+    if cache is not None:
+        cache.set(x_user_cognito_sub, user)
     return user
 
 
@@ -46,7 +91,8 @@ def get_current_user(
     x_user_cognito_sub: str = Header(..., alias="x-user-cognito-sub"),
     x_user_email: Optional[str] = Header(..., alias="x-user-email"),
     x_user_role: Optional[str] = Header(None, alias="x-user-role"), # Cambiato in Optional[str]
-    user_repo: UserRepository = Depends(get_user_repo)
+    user_repo: UserRepository = Depends(get_user_repo),
+    cache: Optional[TTLCache] = Depends(get_user_cache)
 ) -> entities.User:
 
     # Log per debug: controlla cosa arriva esattamente negli header
@@ -60,14 +106,16 @@ def get_current_user(
     return get_or_create_user_from_headers(
         x_user_cognito_sub,
         x_user_email,
-        user_repo
+        user_repo,
+        cache
     )
 
 
 def get_optional_user(
     x_user_cognito_sub: Optional[str] = Header(None, alias="x-user-cognito-sub"),
     x_user_email: Optional[str] = Header(None, alias="x-user-email"),
-    user_repo: UserRepository = Depends(get_user_repo)
+    user_repo: UserRepository = Depends(get_user_repo),
+    cache: Optional[TTLCache] = Depends(get_user_cache)
 ) -> Optional[entities.User]:
 
     if not x_user_cognito_sub:
@@ -76,37 +124,103 @@ def get_optional_user(
     return get_or_create_user_from_headers(
         x_user_cognito_sub,
         x_user_email,
-        user_repo
+        user_repo,
+        cache
     )
 
+def require_internal_token(
+    x_internal_token: Optional[str] = Header(None, alias="x-internal-token")
+):
+    # Metriche e rebuild per processo (/internal/*): solo per chi ha il token di ops,
+    # perché il Gateway e l'ALB inoltrano qualsiasi path al backend
+    if not settings.INTERNAL_API_TOKEN or not x_internal_token or not hmac.compare_digest(
+        x_internal_token.encode(), settings.INTERNAL_API_TOKEN.encode()
+    ):
+        raise HTTPException(403, "Internal endpoints only")
+
 # DEPS SERVICE E REPOSITORY
 
 ## SEARCH
 
-def get_search_repo(db: Session = Depends(get_db)) -> SearchRepository:
-    return SearchRepository(db)
+def get_search_engine() -> Optional[SearchEngine]:
+    # None = motore disabilitato (la search interroga Postgres)
+    return search_engine if settings.SEARCH_ENGINE_ENABLED else None
+
+def get_search_card_repo(
+    db: Session = Depends(get_db),
+    engine: Optional[SearchEngine] = Depends(get_search_engine)
+) -> SearchCardRepository:
+    return SearchCardRepository(db, engine)
+
+def get_amenity_index() -> Optional[AmenityBitmapIndex]:
+    # None = indice disabilitato (repository e search usano solo SQL)
+    return amenity_index if settings.AMENITY_INDEX_ENABLED else None
+
+# Le letture della search vanno su una replica (se configurata), le scritture restano sul primary
+def get_search_repo(
+    db: Session = Depends(get_read_db),
+    index: Optional[AmenityBitmapIndex] = Depends(get_amenity_index)
+) -> SearchRepository:
+    return SearchRepository(db, amenity_index=index)
+
+def get_search_cache() -> Optional[SearchResultCache]:
+    # None = cache disabilitata (i service la ignorano)
+    return search_cache if settings.SEARCH_CACHE_ENABLED else None
+
+def get_suggest_index() -> SuggestIndex:
+    return suggest_index
 
 def get_search_service(
-    search_repo: SearchRepository = Depends(get_search_repo)
+    search_repo: SearchRepository = Depends(get_search_repo),
+    cache: Optional[SearchResultCache] = Depends(get_search_cache),
+    suggestions: SuggestIndex = Depends(get_suggest_index),
+    engine: Optional[SearchEngine] = Depends(get_search_engine)
 ) -> SearchService:
-    return SearchService(search_repo)
+    return SearchService(search_repo, cache, suggestions, engine)
+
+# Versioni async (AsyncSession / asyncpg) per le rotte GET: stessi indici, cache e motore
+def get_async_search_repo(
+    db = Depends(get_async_read_db),
+    index: Optional[AmenityBitmapIndex] = Depends(get_amenity_index)
+) -> AsyncSearchRepository:
+    return AsyncSearchRepository(db, amenity_index=index)
+
+def get_async_search_service(
+    search_repo: AsyncSearchRepository = Depends(get_async_search_repo),
+    cache: Optional[SearchResultCache] = Depends(get_search_cache),
+    suggestions: SuggestIndex = Depends(get_suggest_index),
+    engine: Optional[SearchEngine] = Depends(get_search_engine)
+) -> AsyncSearchService:
+    return AsyncSearchService(search_repo, cache, suggestions, engine)
 
 ## AMENITY
 
-def get_property_amenity_repo(db: Session = Depends(get_db)):
-    return PropertyAmenityRepository(db)
+def get_amenity_catalogs() -> CatalogCache:
+    return amenity_catalogs
+
+def get_property_amenity_repo(db: Session = Depends(get_db),
+                              search_cards: SearchCardRepository = Depends(get_search_card_repo),
+                              catalogs: CatalogCache = Depends(get_amenity_catalogs),
+                              index: Optional[AmenityBitmapIndex] = Depends(get_amenity_index)) -> PropertyAmenityRepository:
+    return PropertyAmenityRepository(db, search_cards, catalogs, index)
 
-def get_room_amenity_repo(db: Session = Depends(get_db)):
-    return RoomAmenityRepository(db)
+def get_room_amenity_repo(db: Session = Depends(get_db),
+                          search_cards: SearchCardRepository = Depends(get_search_card_repo),
+                          catalogs: CatalogCache = Depends(get_amenity_catalogs),
+                          index: Optional[AmenityBitmapIndex] = Depends(get_amenity_index)) -> RoomAmenityRepository:
+    return RoomAmenityRepository(db, search_cards, catalogs, index)
 
 
 ## MEDIA
 
 def get_s3_media_storage() -> S3MediaStorage:
-    return S3MediaStorage()
+    # Istanza unica: il client boto3 (e il suo pool di connessioni) si crea al primo uso
+    return s3_media_storage
 
-def get_media_repo(db: Session = Depends(get_db), storage: IMediaStorage = Depends(get_s3_media_storage)):
-    return MediaRepository(db, storage)
+def get_media_repo(db: Session = Depends(get_db),
+                   storage: IMediaStorage = Depends(get_s3_media_storage),
+                   search_cards: SearchCardRepository = Depends(get_search_card_repo)):
+    return MediaRepository(db, storage, search_cards)
 
 
 def get_media_service(
@@ -115,11 +229,20 @@ def get_media_service(
 ) -> MediaService:
     return MediaService(media_repo, s3_storage)
 
+# Solo per le GET: legge da una replica e non aggiorna la proiezione della search
+def get_read_media_service(
+    db: Session = Depends(get_read_db),
+    s3_storage: S3MediaStorage = Depends(get_s3_media_storage)
+) -> MediaService:
+    return MediaService(MediaRepository(db, s3_storage), s3_storage)
+
 ## PROPERTY
 
 def get_property_repo(db: Session = Depends(get_db), 
-                      storage: IMediaStorage = Depends(get_s3_media_storage)):
-    return PropertyRepository(db, storage)
+                      storage: IMediaStorage = Depends(get_s3_media_storage),
+                      index: Optional[AmenityBitmapIndex] = Depends(get_amenity_index),
+                      search_cards: SearchCardRepository = Depends(get_search_card_repo)):
+    return PropertyRepository(db, storage, index, search_cards)
 
 def get_property_amenity_factory() -> PropertyAmenityFactory:
     return PropertyAmenityFactory()
@@ -128,15 +251,22 @@ def get_property_service(
     property_repo: PropertyRepository = Depends(get_property_repo),
     property_amenity_factory: PropertyAmenityFactory = Depends(get_property_amenity_factory), 
     amenity_repo: PropertyAmenityRepository = Depends(get_property_amenity_repo),
-    media_repo: MediaRepository = Depends(get_media_repo)
+    media_repo: MediaRepository = Depends(get_media_repo),
+    search_cache: Optional[SearchResultCache] = Depends(get_search_cache),
+    suggestions: SuggestIndex = Depends(get_suggest_index)
 ) -> PropertyService:
-    return PropertyService(property_repo, property_amenity_factory, amenity_repo, media_repo)
+    return PropertyService(property_repo, property_amenity_factory, amenity_repo, media_repo, search_cache, suggestions)
+
+def get_async_property_service(db = Depends(get_async_read_db)) -> AsyncPropertyService:
+    return AsyncPropertyService(AsyncPropertyRepository(db))
 
 ## ROOM
 
 def get_room_repo(db: Session = Depends(get_db), 
-                  storage: IMediaStorage = Depends(get_s3_media_storage)):
-    return RoomRepository(db, storage)
+                  storage: IMediaStorage = Depends(get_s3_media_storage),
+                  index: Optional[AmenityBitmapIndex] = Depends(get_amenity_index),
+                  search_cards: SearchCardRepository = Depends(get_search_card_repo)):
+    return RoomRepository(db, storage, index, search_cards)
 
 def get_room_amenity_factory() -> RoomAmenityFactory:
     return RoomAmenityFactory()
@@ -146,18 +276,45 @@ def get_room_service(
     room_amenity_factory: RoomAmenityFactory = Depends(get_room_amenity_factory),
     amenity_repo: RoomAmenityRepository = Depends(get_room_amenity_repo),
     property_repo: PropertyRepository = Depends(get_property_repo),
-    media_repo: MediaRepository = Depends(get_media_repo)
+    media_repo: MediaRepository = Depends(get_media_repo),
+    search_cache: Optional[SearchResultCache] = Depends(get_search_cache)
 ) -> RoomService:
     return RoomService(
         room_repo=room_repo,
         property_repo=property_repo,
         media_repo=media_repo,
         room_amenity_factory=room_amenity_factory,
-        amenity_repo=amenity_repo
+        amenity_repo=amenity_repo,
+        search_cache=search_cache
+    )
+
+def get_async_room_service(db = Depends(get_async_read_db)) -> AsyncRoomService:
+    return AsyncRoomService(AsyncRoomRepository(db))
+
+## IMPORT
+
+def get_import_service(
+    db: Session = Depends(get_db),
+    index: Optional[AmenityBitmapIndex] = Depends(get_amenity_index),
+    search_cards: SearchCardRepository = Depends(get_search_card_repo),
+    property_amenity_repo: PropertyAmenityRepository = Depends(get_property_amenity_repo),
+    room_amenity_repo: RoomAmenityRepository = Depends(get_room_amenity_repo),
+    property_amenity_factory: PropertyAmenityFactory = Depends(get_property_amenity_factory),
+    room_amenity_factory: RoomAmenityFactory = Depends(get_room_amenity_factory)
+) -> ImportService:
+    return ImportService(
+        BulkImportRepository(db, index, search_cards),
+        property_amenity_repo,
+        room_amenity_repo,
+        property_amenity_factory,
+        room_amenity_factory
     )
 
-def get_property_amenity_repo(db: Session = Depends(get_db)) -> PropertyAmenityRepository:
-    return PropertyAmenityRepository(db)
+## EXPORT
 
-def get_room_amenity_repo(db: Session = Depends(get_db)) -> RoomAmenityRepository:
-    return RoomAmenityRepository(db)
\ No newline at end of file
+# Letture lunghe: vanno su una replica (se configurata)
+def get_export_service(
+    db: Session = Depends(get_read_db),
+    storage: IMediaStorage = Depends(get_s3_media_storage)
+) -> ExportService:
+    return ExportService(PropertyRepository(db, storage))
@@ -169,6 +169,9 @@ class Property:
     city: str
     country: str
     
+    # Posizione (gradi decimali), opzionale
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     
     owner_id: Optional[str] = None
     owner: Optional[User] = None
@@ -0,0 +1,54 @@
+from enum import Enum
+from typing import Any, Dict, FrozenSet, List, Optional
+from dataclasses import dataclass, field
+from app.domain.entities import RoomType
+
+## SEARCH (lato lettura: criteri di ricerca e pagina di risultati)
+
+# Collezioni figlie di una property che si possono chiedere con include=
+# (None = tutte; "media" e "amenities" valgono anche dentro le stanze)
+PROPERTY_INCLUDES: FrozenSet[str] = frozenset({"rooms", "media", "amenities"})
+
+class SearchSort(str, Enum):
+    RELEVANCE = 'relevance'   # miglior match sul testo (richiede location)
+    NEWEST = 'newest'         # ultime pubblicate
+    PRICE = 'price'           # prezzo della stanza più economica, crescente
+    CAPACITY = 'capacity'     # capienza della stanza più grande, decrescente
+    DISTANCE = 'distance'     # più vicine al punto indicato (richiede lat/lng)
+
+@dataclass
+class SearchCriteria:
+    location: Optional[str] = None
+    sort: Optional[SearchSort] = None
+    cursor: Optional[str] = None  # token opaco ricevuto nella pagina precedente
+    limit: Optional[int] = None   # None = default della repository
+    include: Optional[FrozenSet[str]] = None  # sottoinsieme di PROPERTY_INCLUDES, None = tutto
+
+    # Facet (filtri applicati in SQL)
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_capacity: Optional[int] = None     # numero di ospiti
+    room_type: Optional[RoomType] = None
+    property_amenity_ids: List[str] = field(default_factory=list)  # la property deve averle tutte
+    room_amenity_ids: List[str] = field(default_factory=list)      # almeno una stanza deve averle tutte
+
+    # Geo: punto di riferimento (per raggio e distanza) e bounding box della mappa
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_km: Optional[float] = None
+    bbox_west: Optional[float] = None
+    bbox_south: Optional[float] = None
+    bbox_east: Optional[float] = None
+    bbox_north: Optional[float] = None
+
+@dataclass(frozen=True)
+class ChildLimits:
+    # Massimo di figli per risultato (None = nessun limite)
+    rooms: Optional[int] = None       # stanze più economiche della property
+    media: Optional[int] = None       # prime foto della property
+    room_media: Optional[int] = None  # prime foto di ogni stanza
+
+@dataclass
+class SearchPage:
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    next_cursor: Optional[str] = None  # None = non ci sono altre pagine
@@ -1,9 +1,69 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Header
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import search, properties, rooms, media, amenity
+from app.routers import search, properties, rooms, media, amenity, internal
 from app.config import settings
+from app.compression import CompressionMiddleware
+from app.db import SessionLocal, dispose_async_engine
+from app.db_replicas import LAST_WRITE_HEADER, read_your_writes_middleware, replica_router
+from app.search.amenity_index import amenity_index
+from app.search.suggest import suggest_index
+from app.search.engine import search_engine
+from app.repositories.search_repository import SearchRepository
+from app.repositories.search_card_repository import SearchCardRepository
 
-app = FastAPI(title="HotelManager API")
+def load_search_indexes():
+    # Se il DB non risponde l'API parte lo stesso: la search usa le query SQL
+    # e l'autocompletamento si carica alla prima richiesta
+    db = SessionLocal()
+    try:
+        if settings.AMENITY_INDEX_ENABLED:
+            if settings.AMENITY_INDEX_REFRESH_SECONDS <= 0 and settings.WEB_CONCURRENCY > 1:
+                # Senza refresh ogni worker vedrebbe solo i propri link: restano i filtri SQL
+                print("Amenity index disabled: AMENITY_INDEX_REFRESH_SECONDS=0 with more than one worker")
+            else:
+                amenity_index.rebuild(db)
+                print(f"Amenity index loaded: {amenity_index.stats()}")
+        suggest_index.rebuild(SearchRepository(db).published_suggest_rows())
+        print(f"Suggest index loaded: {suggest_index.stats()}")
+        if settings.SEARCH_SOURCE == "cards":
+            # Card mancanti (es. properties inserite dal seed SQL): si creano una volta sola
+            created = SearchCardRepository(db).refresh_missing()
+            db.commit()
+            print(f"Search cards created at startup: {created}")
+        if settings.SEARCH_ENGINE_ENABLED:
+            if settings.SEARCH_ENGINE_REFRESH_SECONDS <= 0 and settings.WEB_CONCURRENCY > 1:
+                # Senza refresh ogni worker vedrebbe solo i propri commit: resta la search SQL
+                print("Search engine disabled: SEARCH_ENGINE_REFRESH_SECONDS=0 with more than one worker")
+            else:
+                search_engine.rebuild(db)
+                print(f"Search engine loaded: {search_engine.stats()}")
+    except Exception as e:
+        print(f"Search indexes not loaded: {e}")
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_search_indexes()
+    replica_router.start()
+    # Properties pubblicate / ritirate dagli altri worker (carica l'indice anche se all'avvio non è riuscito)
+    suggest_index.start_refresh(SessionLocal, settings.SUGGEST_INDEX_REFRESH_SECONDS)
+    if settings.AMENITY_INDEX_ENABLED:
+        # Link scritti dagli altri worker / task (riprova anche il caricamento se all'avvio non è riuscito)
+        amenity_index.start_refresh(SessionLocal, settings.AMENITY_INDEX_REFRESH_SECONDS)
+    if settings.SEARCH_ENGINE_ENABLED:
+        # Commit degli altri worker / task (riprova anche lo snapshot se all'avvio non è riuscito)
+        search_engine.start_refresh(SessionLocal, settings.SEARCH_ENGINE_REFRESH_SECONDS)
+    yield
+    search_engine.stop_refresh()
+    amenity_index.stop_refresh()
+    suggest_index.stop_refresh()
+    replica_router.stop()
+    await replica_router.dispose()
+    await dispose_async_engine()
+
+app = FastAPI(title="HotelManager API", lifespan=lifespan)
 
 # Lista degli indirizzi autorizzati (il tuo frontend)
 origins = [
@@ -17,14 +77,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Autorizza tutti i metodi (GET, POST, etc.)
     allow_headers=["*"], # Autorizza tutti gli header
+    expose_headers=["X-Next-Cursor", LAST_WRITE_HEADER], # Il frontend deve poter leggere il cursore della search
 )
 
+# Read-your-writes con le repliche (vedi app/db_replicas.py)
+app.middleware("http")(read_your_writes_middleware)
+
+# Compressione delle risposte (search e liste di properties sono JSON grandi e ripetitivi)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.GZIP_LEVEL,
+        brotli_quality=settings.BROTLI_QUALITY
+    )
+
 # Includiamo slo il router della ricerca per ora
 app.include_router(search.router)
 app.include_router(properties.router)
 app.include_router(rooms.router)
 app.include_router(media.router)
 app.include_router(amenity.router)
+if settings.INTERNAL_API_TOKEN:
+    # Metriche e rebuild per processo: senza token le rotte non esistono proprio
+    app.include_router(internal.router)
 
 @app.get("/health")
 def health():
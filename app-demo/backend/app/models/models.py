@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Integer, Text, Boolean, Float, ForeignKey, DateTime, Index, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, Text, Boolean, Float, ForeignKey, DateTime, Index, func, text
+from sqlalchemy.dialects.postgresql import TSVECTOR, ARRAY, JSONB
+from sqlalchemy.orm import relationship, deferred
 import uuid
 from app.db import Base
 
@@ -22,6 +23,11 @@ class PropertyAmenityLinkModel(Base):
     property = relationship("PropertyModel", back_populates="amenity_links")
     amenity = relationship("PropertyAmenityModel") # Accesso diretto all'amenity dal link
 
+    # Indice inverso (amenity -> properties) per i filtri facet della search
+    __table_args__ = (
+        Index('idx_prop_amenities_link_aid_pid', 'amenity_id', 'property_id'),
+    )
+
 
 class RoomAmenityLinkModel(Base):
     __tablename__ = 'room_amenities_link'
@@ -38,6 +44,11 @@ class RoomAmenityLinkModel(Base):
     room = relationship("RoomModel", back_populates="amenity_links")
     amenity = relationship("RoomAmenityModel") # Accesso diretto all'amenity dal link
 
+    # Indice inverso (amenity -> rooms) per i filtri facet della search
+    __table_args__ = (
+        Index('idx_room_amenities_link_aid_rid', 'amenity_id', 'room_id'),
+    )
+
 # ==========================================
 # MODELLI ORM PRINCIPALI
 # ==========================================
@@ -91,6 +102,20 @@ class PropertyModel(Base):
     status = Column(String, default="DRAFT") 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Documento di ricerca: lo scrive il trigger trg_properties_search_document (vedi schema.sql),
+    # mai l'ORM. Deferred per non caricarlo nelle get_by_id.
+    search_document = deferred(Column(Text))
+    search_vector = deferred(Column(TSVECTOR))
+
+    # Statistiche delle stanze: le aggiorna il trigger trg_rooms_property_stats (vedi schema.sql).
+    # Servono agli ordinamenti per prezzo/capienza della search.
+    min_room_price = deferred(Column(Float))
+    max_room_capacity = deferred(Column(Integer))
+
+    # Coordinate (gradi decimali). NULL = nessuna posizione: esclusa dai filtri geografici
+    latitude = Column(Float)
+    longitude = Column(Float)
+
     # Relazioni
     owner = relationship("UserModel", back_populates="properties")
     rooms = relationship("RoomModel", back_populates="property", cascade="all, delete-orphan")
@@ -103,7 +128,20 @@ class PropertyModel(Base):
     __table_args__ = (
         Index('idx_properties_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
         Index('idx_properties_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index('idx_properties_address_trgm', 'address', postgresql_using='gin', postgresql_ops={'address': 'gin_trgm_ops'}),
+        Index('idx_properties_description_trgm', 'description', postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'}),
         Index('idx_properties_status', 'status'),
+        Index('idx_properties_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('idx_properties_search_document_trgm', 'search_document', postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'}),
+        # Indici parziali (solo PUBLISHED) per la keyset pagination della search
+        Index('idx_properties_published_newest', created_at.desc(), id.desc(), postgresql_where=text("status = 'PUBLISHED'")),
+        Index('idx_properties_published_price', 'min_room_price', 'id', postgresql_where=text("status = 'PUBLISHED'")),
+        Index('idx_properties_published_capacity', text('max_room_capacity DESC'), id.desc(), postgresql_where=text("status = 'PUBLISHED'")),
+        # Ricerca geografica (estensioni cube + earthdistance): raggio e bounding box
+        Index('idx_properties_published_earth', text('ll_to_earth(latitude, longitude)'), postgresql_using='gist', postgresql_where=text("status = 'PUBLISHED'")),
+        Index('idx_properties_published_lat_lng', 'latitude', 'longitude', postgresql_where=text("status = 'PUBLISHED'")),
+        # Pagine keyset dell'export per owner (e /mine)
+        Index('idx_properties_owner_id', 'owner_id', 'id'),
     )
 
 
@@ -128,13 +166,20 @@ class RoomModel(Base):
     # MODIFICA IMPORTANTE: Relazione verso il LINK
     amenity_links = relationship("RoomAmenityLinkModel", back_populates="room", cascade="all, delete-orphan")
 
+    # Indici composti per i filtri facet della search (EXISTS per property su prezzo/capienza/tipo)
+    __table_args__ = (
+        Index('idx_rooms_property_price', 'property_id', 'price'),
+        Index('idx_rooms_property_capacity', 'property_id', 'capacity'),
+        Index('idx_rooms_type_price', 'type', 'price'),
+    )
+
 
 class MediaModel(Base):
     __tablename__ = "media"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     property_id = Column(String, ForeignKey("properties.id", ondelete="CASCADE"), nullable=True, index=True)
-    room_id = Column(String, ForeignKey("rooms.id", ondelete="CASCADE"), nullable=True)
+    room_id = Column(String, ForeignKey("rooms.id", ondelete="CASCADE"), nullable=True, index=True)
     
     file_name = Column(String, nullable=False)
     file_type = Column(String)
@@ -144,4 +189,51 @@ class MediaModel(Base):
 
     # Relazioni
     property = relationship("PropertyModel", back_populates="media")
-    room = relationship("RoomModel", back_populates="media")
\ No newline at end of file
+    room = relationship("RoomModel", back_populates="media")
+
+
+class PropertySearchCardModel(Base):
+    """
+    Read model della search (proiezione CQRS): una riga per property, già unita.
+    La scrive solo SearchCardRepository nella stessa transazione delle scritture
+    sulle tabelle normalizzate; nessuna relazione ORM (la cancellazione è il CASCADE del DB).
+    """
+    __tablename__ = "property_search_cards"
+
+    id = Column(String, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True))
+    name = Column(String, nullable=False)
+    address = Column(String)
+    city = Column(String)
+    country = Column(String)
+    description = Column(Text)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    search_document = Column(Text)
+    search_vector = Column(TSVECTOR)
+
+    min_room_price = Column(Float)
+    max_room_price = Column(Float)
+    max_room_capacity = Column(Integer)
+    room_count = Column(Integer, nullable=False, default=0)
+    room_types = Column(ARRAY(String), nullable=False, default=list)
+    amenity_ids = Column(ARRAY(String), nullable=False, default=list)
+    amenity_names = Column(ARRAY(String), nullable=False, default=list)
+    owner_id = Column(String, nullable=False)
+    owner_name = Column(String)
+    cover_media = Column(JSONB)
+
+    document = Column(JSONB, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_search_cards_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('idx_search_cards_search_document_trgm', 'search_document', postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'}),
+        Index('idx_search_cards_amenity_ids', 'amenity_ids', postgresql_using='gin'),
+        Index('idx_search_cards_published_newest', created_at.desc(), id.desc(), postgresql_where=text("status = 'PUBLISHED'")),
+        Index('idx_search_cards_published_price', 'min_room_price', 'id', postgresql_where=text("status = 'PUBLISHED'")),
+        Index('idx_search_cards_published_capacity', max_room_capacity.desc(), id.desc(), postgresql_where=text("status = 'PUBLISHED'")),
+        Index('idx_search_cards_published_earth', text('ll_to_earth(latitude, longitude)'), postgresql_using='gist', postgresql_where=text("status = 'PUBLISHED'")),
+        Index('idx_search_cards_updated_at', 'updated_at'),
+    )
@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
 from ast import List
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.domain import entities
 from app.models import models
+from app.repositories.search_card_repository import SearchCardRepository
+from app.catalog_cache import CatalogCache
+from app.search.amenity_index import AmenityBitmapIndex
 
 class AmenityRepository(ABC):
     @abstractmethod
@@ -20,8 +24,18 @@ class AmenityRepository(ABC):
     
 
 class PropertyAmenityRepository(AmenityRepository):
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        search_cards: Optional[SearchCardRepository] = None,
+        catalogs: Optional[CatalogCache] = None,
+        amenity_index: Optional[AmenityBitmapIndex] = None
+    ):
         self.db = db
+        self.search_cards = search_cards
+        # Cataloghi globali in memoria: invalidati dopo il commit di una amenity globale
+        self.catalogs = catalogs
+        self.amenity_index = amenity_index
 
     def save(self, entity: entities.PropertyAmenity) -> entities.PropertyAmenity:
         # Check se esiste già (per ID)
@@ -43,15 +57,31 @@ class PropertyAmenityRepository(AmenityRepository):
             model.name = entity.name
             model.category = entity.category
             model.description = entity.description
+            # Il nome compare nelle card delle properties che la usano
+            if self.search_cards:
+                self.search_cards.refresh(self.search_cards.property_ids_for_property_amenity(model.id))
         
+        is_global = model.is_global
         self.db.commit()
+        if is_global and self.catalogs is not None:
+            self.catalogs.invalidate("property")
         return entity
     
     def delete(self, amenity_id: str):
         model = self.db.query(models.PropertyAmenityModel).get(amenity_id)
         if model:
+            # Properties da riallineare, lette prima che il CASCADE tolga i link
+            affected = self.search_cards.property_ids_for_property_amenity(amenity_id) if self.search_cards else []
+            is_global = model.is_global
             self.db.delete(model)
+            if self.search_cards:
+                self.search_cards.refresh(affected)
             self.db.commit()
+            if is_global and self.catalogs is not None:
+                self.catalogs.invalidate("property")
+            # Bitmap aggiornate solo a commit riuscito, come i link scritti dalle altre repository
+            if self.amenity_index:
+                self.amenity_index.remove_property_amenity(amenity_id)
             
     def get_by_id(self, amenity_id: str) -> Optional[entities.PropertyAmenity]:
         model = self.db.query(models.PropertyAmenityModel).get(amenity_id)
@@ -80,6 +110,29 @@ class PropertyAmenityRepository(AmenityRepository):
             description=model.description,
             is_global=model.is_global
         )
+
+    # Risoluzione in blocco (import): nome in minuscolo -> amenity, una query per tutti i nomi.
+    # A parità di nome vince quella del catalogo globale.
+    def get_by_names(self, names: Iterable[str]) -> Dict[str, entities.PropertyAmenity]:
+        keys = {n.strip().lower() for n in names if n and n.strip()}
+        if not keys:
+            return {}
+        models_list = (
+            self.db.query(models.PropertyAmenityModel)
+            .filter(func.lower(models.PropertyAmenityModel.name).in_(keys))
+            .order_by(models.PropertyAmenityModel.is_global.desc(), models.PropertyAmenityModel.id)
+            .all()
+        )
+        found: Dict[str, entities.PropertyAmenity] = {}
+        for m in models_list:
+            found.setdefault(m.name.strip().lower(), entities.PropertyAmenity(
+                id=m.id,
+                name=m.name,
+                category=m.category,
+                description=m.description,
+                is_global=m.is_global
+            ))
+        return found
         
     # fetch all global amenities (for dropdowns, etc.)
     def get_all(self) -> List[entities.PropertyAmenity]:
@@ -87,6 +140,8 @@ class PropertyAmenityRepository(AmenityRepository):
         models_list = (
             self.db.query(models.PropertyAmenityModel)
             .filter(models.PropertyAmenityModel.is_global == True) 
+            # Ordine stabile: il catalogo in cache ha un ETag calcolato sul contenuto
+            .order_by(models.PropertyAmenityModel.category, models.PropertyAmenityModel.name, models.PropertyAmenityModel.id)
             .all()
         )
         
@@ -101,8 +156,18 @@ class PropertyAmenityRepository(AmenityRepository):
         ]
 
 class RoomAmenityRepository(AmenityRepository):
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        search_cards: Optional[SearchCardRepository] = None,
+        catalogs: Optional[CatalogCache] = None,
+        amenity_index: Optional[AmenityBitmapIndex] = None
+    ):
         self.db = db
+        self.search_cards = search_cards
+        # Cataloghi globali in memoria: invalidati dopo il commit di una amenity globale
+        self.catalogs = catalogs
+        self.amenity_index = amenity_index
 
     def save(self, entity: entities.RoomAmenity) -> entities.RoomAmenity:
         model = self.db.query(models.RoomAmenityModel).get(entity.id)
@@ -121,15 +186,30 @@ class RoomAmenityRepository(AmenityRepository):
             model.name = entity.name
             model.category = entity.category
             model.description = entity.description
+            if self.search_cards:
+                self.search_cards.refresh(self.search_cards.property_ids_for_room_amenity(model.id))
             
+        is_global = model.is_global
         self.db.commit()
+        if is_global and self.catalogs is not None:
+            self.catalogs.invalidate("room")
         return entity
     
     def delete(self, amenity_id: str):
         model = self.db.query(models.RoomAmenityModel).get(amenity_id)
         if model:
+            # Properties da riallineare, lette prima che il CASCADE tolga i link
+            affected = self.search_cards.property_ids_for_room_amenity(amenity_id) if self.search_cards else []
+            is_global = model.is_global
             self.db.delete(model)
+            if self.search_cards:
+                self.search_cards.refresh(affected)
             self.db.commit()
+            if is_global and self.catalogs is not None:
+                self.catalogs.invalidate("room")
+            # Bitmap aggiornate solo a commit riuscito, come i link scritti dalle altre repository
+            if self.amenity_index:
+                self.amenity_index.remove_room_amenity(amenity_id)
             
     def get_by_id(self, amenity_id: str) -> Optional[entities.RoomAmenity]:
         model = self.db.query(models.RoomAmenityModel).get(amenity_id)
@@ -158,6 +238,45 @@ class RoomAmenityRepository(AmenityRepository):
             description=model.description,
             is_global=model.is_global
         )
+
+    # Risoluzione in blocco (batch di stanze): una query, gli id sconosciuti mancano dal risultato
+    def get_by_ids(self, amenity_ids: Iterable[str]) -> Dict[str, entities.RoomAmenity]:
+        ids = set(amenity_ids)
+        if not ids:
+            return {}
+        models_list = self.db.query(models.RoomAmenityModel).filter(models.RoomAmenityModel.id.in_(ids)).all()
+        return {
+            m.id: entities.RoomAmenity(
+                id=m.id,
+                name=m.name,
+                category=m.category,
+                description=m.description,
+                is_global=m.is_global
+            ) for m in models_list
+        }
+
+    # Risoluzione in blocco (import): nome in minuscolo -> amenity, una query per tutti i nomi.
+    # A parità di nome vince quella del catalogo globale.
+    def get_by_names(self, names: Iterable[str]) -> Dict[str, entities.RoomAmenity]:
+        keys = {n.strip().lower() for n in names if n and n.strip()}
+        if not keys:
+            return {}
+        models_list = (
+            self.db.query(models.RoomAmenityModel)
+            .filter(func.lower(models.RoomAmenityModel.name).in_(keys))
+            .order_by(models.RoomAmenityModel.is_global.desc(), models.RoomAmenityModel.id)
+            .all()
+        )
+        found: Dict[str, entities.RoomAmenity] = {}
+        for m in models_list:
+            found.setdefault(m.name.strip().lower(), entities.RoomAmenity(
+                id=m.id,
+                name=m.name,
+                category=m.category,
+                description=m.description,
+                is_global=m.is_global
+            ))
+        return found
         
     # fetch all global amenities (for dropdowns, etc.)
     def get_all(self) -> List[entities.RoomAmenity]:
@@ -165,6 +284,8 @@ class RoomAmenityRepository(AmenityRepository):
         models_list = (
             self.db.query(models.RoomAmenityModel)
             .filter(models.RoomAmenityModel.is_global == True) 
+            # Ordine stabile: il catalogo in cache ha un ETag calcolato sul contenuto
+            .order_by(models.RoomAmenityModel.category, models.RoomAmenityModel.name, models.RoomAmenityModel.id)
             .all()
         )
         
@@ -0,0 +1,132 @@
+import io
+from typing import Any, Dict, List, Optional
+from sqlalchemy import Table, insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.domain import entities
+from app.models import models
+from app.repositories.search_card_repository import SearchCardRepository
+from app.search.amenity_index import AmenityBitmapIndex
+
+
+class BulkImportRepository:
+    """
+    Scritture dell'import massivo: un chunk di properties (stanze, link alle amenities e amenities
+    nuove comprese) in una sola transazione, senza passare dall'ORM riga per riga.
+
+    - Con psycopg2 le righe entrano con COPY ... FROM STDIN (una per tabella);
+      con altri driver con INSERT multi-riga (executemany / insertmanyvalues).
+    - I trigger (documento di ricerca, statistiche delle stanze) scattano anche con COPY.
+    - Card della search nella stessa transazione, indice amenities aggiornato solo a commit riuscito.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        amenity_index: Optional[AmenityBitmapIndex] = None,
+        search_cards: Optional[SearchCardRepository] = None
+    ):
+        self.db = db
+        self.amenity_index = amenity_index
+        self.search_cards = search_cards
+
+    def insert_chunk(
+        self,
+        properties: List[entities.Property],
+        new_property_amenities: List[entities.PropertyAmenity],
+        new_room_amenities: List[entities.RoomAmenity]
+    ):
+        try:
+            # Prima le amenities nuove, poi properties e stanze, infine i link (ordine delle FK)
+            self._copy(models.PropertyAmenityModel.__table__, [_amenity_row(a) for a in new_property_amenities])
+            self._copy(models.RoomAmenityModel.__table__, [_amenity_row(a) for a in new_room_amenities])
+            self._copy(models.PropertyModel.__table__, [_property_row(p) for p in properties])
+            self._copy(models.RoomModel.__table__, [_room_row(r) for p in properties for r in p.rooms])
+            self._copy(models.PropertyAmenityLinkModel.__table__, [
+                {"property_id": p.id, "amenity_id": a.id, "custom_description": a.custom_description}
+                for p in properties for a in p.amenities
+            ])
+            self._copy(models.RoomAmenityLinkModel.__table__, [
+                {"room_id": r.id, "amenity_id": a.id, "custom_description": a.custom_description}
+                for p in properties for r in p.rooms for a in r.amenities
+            ])
+
+            if self.search_cards:
+                self.search_cards.refresh([p.id for p in properties])
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        # Indice amenities aggiornato solo a commit riuscito
+        if self.amenity_index:
+            for p in properties:
+                self.amenity_index.set_property_amenities(p.id, [a.id for a in p.amenities])
+                for r in p.rooms:
+                    self.amenity_index.set_room_amenities(r.id, p.id, [a.id for a in r.amenities])
+
+    def rollback(self):
+        # Dopo un errore del DB fuori da insert_chunk (es. nella risoluzione delle amenities)
+        self.db.rollback()
+
+    # =================================================================
+    # HELPER PRIVATI
+    # =================================================================
+
+    def _copy(self, table: Table, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        # Stessa connessione (e transazione) della sessione
+        connection = self.db.connection()
+        cursor = connection.connection.cursor()
+        try:
+            if not hasattr(cursor, "copy_expert"):
+                self.db.execute(insert(table), rows)
+                return
+            columns = list(rows[0])
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write("\t".join(_copy_value(row[c]) for c in columns))
+                buffer.write("\n")
+            buffer.seek(0)
+            statement = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN"
+            dbapi_error = connection.dialect.loaded_dbapi.Error
+            try:
+                cursor.copy_expert(statement, buffer)
+            except dbapi_error as e:
+                # Il cursore grezzo salta la traduzione degli errori di SQLAlchemy: la si fa qui,
+                # così il chunk viene segnalato come quelli falliti con INSERT e l'import prosegue
+                raise DBAPIError.instance(statement, None, e, dbapi_error) from e
+        finally:
+            cursor.close()
+
+
+def _copy_value(value: Any) -> str:
+    # Formato testo di COPY: \N = NULL; backslash, tab e a capo vanno escapati
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+def _amenity_row(amenity: entities.IAmenity) -> Dict[str, Any]:
+    return {
+        "id": amenity.id, "name": amenity.name, "category": amenity.category,
+        "description": amenity.description, "is_global": amenity.is_global,
+    }
+
+def _property_row(prop: entities.Property) -> Dict[str, Any]:
+    return {
+        "id": prop.id, "owner_id": prop.owner_id, "name": prop.name, "address": prop.address,
+        "city": prop.city, "country": prop.country, "latitude": prop.latitude, "longitude": prop.longitude,
+        "description": prop.description, "status": prop.status.value,
+    }
+
+def _room_row(room: entities.Room) -> Dict[str, Any]:
+    return {
+        "id": room.id, "property_id": room.property_id, "type": room.type.value, "price": room.price,
+        "capacity": room.capacity, "description": room.description, "is_available": room.is_available,
+    }
@@ -162,6 +162,8 @@ def to_domain_property(model: models.PropertyModel) -> entities.Property:
         address=model.address,
         city=model.city,
         country=model.country,
+        latitude=model.latitude,
+        longitude=model.longitude,
         description=model.description,
         status=entities.PropertyStatus(model.status) if model.status else entities.PropertyStatus.DRAFT,
         
@@ -180,6 +182,8 @@ def to_model_property(entity: entities.Property) -> models.PropertyModel:
         address=entity.address,
         city=entity.city,
         country=entity.country,
+        latitude=entity.latitude,
+        longitude=entity.longitude,
         description=entity.description,
         status=entity.status.value
     )
@@ -1,14 +1,16 @@
-from typing import Optional
+from typing import Dict, Iterable, Optional
 from sqlalchemy.orm import Session
 from app.domain import entities
 from app.models import models
 from app.repositories import mappers
 from app.storage.media_storage_interface import IMediaStorage
+from app.repositories.search_card_repository import SearchCardRepository
 
 class MediaRepository:
-    def __init__(self, db: Session, storage: IMediaStorage):
+    def __init__(self, db: Session, storage: IMediaStorage, search_cards: Optional[SearchCardRepository] = None):
         self.db = db
         self.storage = storage
+        self.search_cards = search_cards
 
     def get_by_id(self, media_id: str) -> Optional[entities.Media]:
         model = self.db.query(models.MediaModel).get(media_id)
@@ -42,6 +44,8 @@ class MediaRepository:
                 room_id=room_id
             )
             self.db.add(model)
+
+        self._refresh_search_card(model.property_id, model.room_id)
         
         self.db.commit()
 
@@ -50,14 +54,24 @@ class MediaRepository:
         if model:
             
             path_to_delete = model.storage_path
+            property_id, room_id = model.property_id, model.room_id
             
             self.db.delete(model)
+            self._refresh_search_card(property_id, room_id)
             self.db.commit()
             
             if path_to_delete:
                 self.storage.delete_media(path_to_delete)
             
             
+    # Risoluzione in blocco (batch di stanze): una query, gli id sconosciuti mancano dal risultato
+    def get_by_ids(self, media_ids: Iterable[str]) -> Dict[str, entities.Media]:
+        ids = set(media_ids)
+        if not ids:
+            return {}
+        models_list = self.db.query(models.MediaModel).filter(models.MediaModel.id.in_(ids)).all()
+        return {m.id: mappers.to_domain_media(m) for m in models_list}
+
     def list_by_property(self, property_id: str) -> list[entities.Media]:
         models_list = self.db.query(models.MediaModel).filter_by(property_id=property_id).all()
         return [mappers.to_domain_media(m) for m in models_list]
@@ -69,4 +83,13 @@ class MediaRepository:
     def list_all(self) -> list[entities.Media]:
         models_list = self.db.query(models.MediaModel).all()
         return [mappers.to_domain_media(m) for m in models_list]
-    
\ No newline at end of file
+    
+
+    def _refresh_search_card(self, property_id: Optional[str], room_id: Optional[str]):
+        # I media compaiono nel documento della card (copertina, foto di property e stanze)
+        if not self.search_cards:
+            return
+        if property_id:
+            self.search_cards.refresh([property_id])
+        elif room_id:
+            self.search_cards.refresh_for_rooms([room_id])
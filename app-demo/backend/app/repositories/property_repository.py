@@ -1,47 +1,82 @@
-from sqlalchemy import delete, exists
-from sqlalchemy.orm import Session, selectinload, joinedload
-from typing import List, Optional
+from sqlalchemy import delete, exists, select
+from sqlalchemy.orm import Session, selectinload, joinedload, noload
+from typing import AbstractSet, Iterator, List, Optional, TYPE_CHECKING
 from app.domain import entities
+from app.domain.search import PROPERTY_INCLUDES
 from app.models import models
 from app.repositories import mappers
 from app.storage.media_storage_interface import IMediaStorage
+from app.search.amenity_index import AmenityBitmapIndex
+from app.repositories.search_card_repository import SearchCardRepository
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 class PropertyRepository:
-    def __init__(self, db: Session, storage: IMediaStorage):
+    def __init__(
+        self,
+        db: Session,
+        storage: IMediaStorage,
+        amenity_index: Optional[AmenityBitmapIndex] = None,
+        search_cards: Optional[SearchCardRepository] = None
+    ):
         self.db = db
         self.storage = storage
+        self.amenity_index = amenity_index
+        # Proiezione della search aggiornata nella stessa transazione (la card sparisce col CASCADE sulla delete)
+        self.search_cards = search_cards
 
-    def get_by_id(self, property_id: str) -> Optional[entities.Property]:
+    # include: collezioni figlie da caricare (rooms, media, amenities), None = tutte.
+    # Solo per le letture: un'entity caricata parzialmente non va passata a save().
+    def get_by_id(self, property_id: str, include: Optional[AbstractSet[str]] = None) -> Optional[entities.Property]:
         stmt = (
             self.db.query(models.PropertyModel)
-            .options(
-                selectinload(models.PropertyModel.amenity_links).joinedload(models.PropertyAmenityLinkModel.amenity),
-                selectinload(models.PropertyModel.media),
-                selectinload(models.PropertyModel.rooms).options(
-                    selectinload(models.RoomModel.amenity_links).joinedload(models.RoomAmenityLinkModel.amenity),
-                    selectinload(models.RoomModel.media)
-                )
-            )
+            .options(*self._load_options(include))
             .filter(models.PropertyModel.id == property_id)
         )
         model = stmt.first()
         return mappers.to_domain_property(model) if model else None
     
-    def get_by_owner_id(self, owner_id: str) -> List[entities.Property]:
+    def get_by_owner_id(self, owner_id: str, include: Optional[AbstractSet[str]] = None) -> List[entities.Property]:
         stmt = (
             self.db.query(models.PropertyModel)
             .filter(models.PropertyModel.owner_id == owner_id)
-            .options(
-                selectinload(models.PropertyModel.amenity_links).joinedload(models.PropertyAmenityLinkModel.amenity),
-                selectinload(models.PropertyModel.media),
-                selectinload(models.PropertyModel.rooms).options(
-                    selectinload(models.RoomModel.amenity_links).joinedload(models.RoomAmenityLinkModel.amenity),
-                    selectinload(models.RoomModel.media)
-                )
-            )
+            .options(*self._load_options(include))
         )
         models_list = stmt.all()
         return [mappers.to_domain_property(m) for m in models_list]
+
+    def iter_pages(self, owner_id: Optional[str] = None, page_size: int = 200) -> Iterator[List[entities.Property]]:
+        """
+        Properties complete (di un owner, o tutto il catalogo con None) a pagine keyset per id.
+        Ogni pagina è una query (collezioni in selectin, righe dal cursore con yield_per),
+        mappata in entities e poi staccata dalla sessione: la memoria resta quella di una pagina.
+        """
+        last_id = None
+        while True:
+            stmt = (
+                select(models.PropertyModel)
+                .options(*self._load_options(None), joinedload(models.PropertyModel.owner))
+                .order_by(models.PropertyModel.id)
+                .limit(page_size)
+                .execution_options(yield_per=page_size)
+            )
+            if owner_id is not None:
+                stmt = stmt.where(models.PropertyModel.owner_id == owner_id)
+            if last_id is not None:
+                stmt = stmt.where(models.PropertyModel.id > last_id)
+
+            page = [mappers.to_domain_property(m) for m in self.db.scalars(stmt)]
+            # Niente ORM tra una pagina e l'altra; la transazione di lettura si chiude
+            # e la connessione torna al pool mentre il client scarica la pagina
+            self.db.expunge_all()
+            self.db.rollback()
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last_id = page[-1].id
     
     def delete(self, property_id: str):
         model = self.db.query(models.PropertyModel).get(property_id)
@@ -60,7 +95,9 @@ class PropertyRepository:
             for r in model.rooms:
                 room_custom_ids.extend([l.amenity_id for l in r.amenity_links if not l.amenity.is_global])
 
-            # DELETE Principale (Cascade cancellerà rooms, media rows, amenity_links)
+            # DELETE Principale (Cascade cancellerà rooms, media rows, amenity_links, search card)
+            if self.search_cards:
+                self.search_cards.forget(property_id)
             self.db.delete(model)
             self.db.flush() 
 
@@ -84,6 +121,9 @@ class PropertyRepository:
 
             # COMMIT DEL DB
             self.db.commit()
+
+            if self.amenity_index:
+                self.amenity_index.remove_property(property_id)
         
         # CANCELLAZIONE FISICA (Solo se commit è andato a buon fine)
         for path in paths_to_delete_on_success:
@@ -108,6 +148,8 @@ class PropertyRepository:
             existing_model.address = entity.address
             existing_model.city = entity.city
             existing_model.country = entity.country
+            existing_model.latitude = entity.latitude
+            existing_model.longitude = entity.longitude
             existing_model.status = entity.status.value
 
             self._sync_amenities(existing_model, entity.amenities)
@@ -116,8 +158,15 @@ class PropertyRepository:
             deleted_paths = self._sync_media_update(existing_model, entity.media)
             files_to_delete_on_success.extend(deleted_paths)
 
+        if self.search_cards:
+            self.search_cards.refresh([entity.id])
+
         # COMMIT
         self.db.commit()
+
+        # Indice amenities aggiornato solo a commit riuscito
+        if self.amenity_index:
+            self.amenity_index.set_property_amenities(entity.id, [a.id for a in entity.amenities])
         
         # CANCELLAZIONE FISICA
         for path in files_to_delete_on_success:
@@ -129,6 +178,30 @@ class PropertyRepository:
     # HELPER PRIVATI
     # =================================================================
 
+    @staticmethod
+    def _load_options(include: Optional[AbstractSet[str]]) -> list:
+        """
+        Eager loading delle sole collezioni richieste; le altre con noload
+        (nessuna query, il mapper vede liste vuote).
+        """
+        include = PROPERTY_INCLUDES if include is None else include
+        options = []
+        if "amenities" in include:
+            options.append(selectinload(models.PropertyModel.amenity_links).joinedload(models.PropertyAmenityLinkModel.amenity))
+        else:
+            options.append(noload(models.PropertyModel.amenity_links))
+        options.append(selectinload(models.PropertyModel.media) if "media" in include else noload(models.PropertyModel.media))
+        if "rooms" in include:
+            room_options = [
+                selectinload(models.RoomModel.amenity_links).joinedload(models.RoomAmenityLinkModel.amenity)
+                if "amenities" in include else noload(models.RoomModel.amenity_links),
+                selectinload(models.RoomModel.media) if "media" in include else noload(models.RoomModel.media),
+            ]
+            options.append(selectinload(models.PropertyModel.rooms).options(*room_options))
+        else:
+            options.append(noload(models.PropertyModel.rooms))
+        return options
+
     def _sync_amenities(self, model: models.PropertyModel, property_amenity_entities: List[entities.PropertyAmenity]):
         current_linked_ids = {link.amenity_id for link in model.amenity_links}
         incoming_ids = {entity.id for entity in property_amenity_entities}
@@ -195,4 +268,32 @@ class PropertyRepository:
         model.media = updated_media_list
         
         # Ritorniamo la lista per cancellazione differita
-        return paths_to_delete
\ No newline at end of file
+        return paths_to_delete
+
+
+class AsyncPropertyRepository:
+    """
+    Letture delle properties su AsyncSession (rotte GET async). Stesso eager loading della
+    versione sync, più l'owner: con AsyncSession il lazy load non è permesso (MissingGreenlet).
+    Le scritture restano su PropertyRepository.
+    """
+
+    def __init__(self, db: "AsyncSession"):
+        self.db = db
+
+    async def get_by_id(self, property_id: str, include: Optional[AbstractSet[str]] = None) -> Optional[entities.Property]:
+        stmt = self._select(include).where(models.PropertyModel.id == property_id)
+        model = (await self.db.execute(stmt)).scalars().first()
+        return mappers.to_domain_property(model) if model else None
+
+    async def get_by_owner_id(self, owner_id: str, include: Optional[AbstractSet[str]] = None) -> List[entities.Property]:
+        stmt = self._select(include).where(models.PropertyModel.owner_id == owner_id)
+        models_list = (await self.db.execute(stmt)).scalars().all()
+        return [mappers.to_domain_property(m) for m in models_list]
+
+    @staticmethod
+    def _select(include: Optional[AbstractSet[str]]):
+        return select(models.PropertyModel).options(
+            *PropertyRepository._load_options(include),
+            selectinload(models.PropertyModel.owner),
+        )
@@ -1,5 +1,5 @@
-from typing import Optional, List
-from sqlalchemy import delete, exists
+from typing import Optional, List, TYPE_CHECKING
+from sqlalchemy import bindparam, delete, exists, null, or_, select, update
 from sqlalchemy.orm import Session
 
 from app.domain import entities
@@ -7,12 +7,25 @@ from app.models import models
 from app.repositories import mappers
 from sqlalchemy.orm import selectinload
 from app.storage.media_storage_interface import IMediaStorage
+from app.search.amenity_index import AmenityBitmapIndex
+from app.repositories.search_card_repository import SearchCardRepository
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 
 class RoomRepository:
-    def __init__(self, db: Session, storage: IMediaStorage):
+    def __init__(
+        self,
+        db: Session,
+        storage: IMediaStorage,
+        amenity_index: Optional[AmenityBitmapIndex] = None,
+        search_cards: Optional[SearchCardRepository] = None
+    ):
         self.db = db
         self.storage = storage
+        self.amenity_index = amenity_index
+        self.search_cards = search_cards
 
     def get_by_id(self, room_id: str) -> Optional[entities.Room]:
         stmt = (
@@ -56,6 +69,80 @@ class RoomRepository:
         models_list = stmt.all()
         return [mappers.to_domain_room(m) for m in models_list]
 
+    def get_by_ids(self, room_ids: List[str]) -> List[entities.Room]:
+        # Una query per le stanze + selectinload (link/amenities, media), nell'ordine di room_ids
+        stmt = (
+            self.db.query(models.RoomModel)
+            .options(
+                selectinload(models.RoomModel.amenity_links).joinedload(models.RoomAmenityLinkModel.amenity),
+                selectinload(models.RoomModel.media)
+            )
+            .filter(models.RoomModel.id.in_(room_ids))
+        )
+        by_id = {m.id: mappers.to_domain_room(m) for m in stmt.all()}
+        return [by_id[i] for i in room_ids if i in by_id]
+
+    def insert_many(
+        self, rooms: List[entities.Room], new_amenities: List[entities.RoomAmenity] = ()
+    ) -> List[entities.Room]:
+        """
+        Inserisce molte stanze nuove in una transazione, con le amenities create per l'occasione.
+        I media (già caricati) si collegano con un solo UPDATE in executemany: solo quelli
+        non ancora collegati a una stanza e liberi o della stessa property (gli altri si ignorano).
+        Ritorna le stanze ricaricate con una sola query.
+        """
+        try:
+            for amenity in new_amenities:
+                self.db.add(models.RoomAmenityModel(
+                    id=amenity.id,
+                    name=amenity.name,
+                    category=amenity.category,
+                    description=amenity.description,
+                    is_global=amenity.is_global
+                ))
+            for room in rooms:
+                model = mappers.to_model_room(room)
+                model.amenity_links = [
+                    models.RoomAmenityLinkModel(room_id=room.id, amenity_id=a.id, custom_description=a.custom_description)
+                    for a in room.amenities
+                ]
+                self.db.add(model)
+            # Le stanze devono esistere prima di collegarci i media
+            self.db.flush()
+
+            media_links = [
+                {"b_media_id": m.id, "b_room_id": room.id, "b_property_id": room.property_id}
+                for room in rooms for m in room.media
+            ]
+            if media_links:
+                media = models.MediaModel.__table__
+                stmt = (
+                    update(media)
+                    .where(
+                        media.c.id == bindparam("b_media_id"),
+                        media.c.room_id.is_(None),
+                        or_(media.c.property_id.is_(None), media.c.property_id == bindparam("b_property_id")),
+                    )
+                    # Un media è della property oppure di una stanza, non di entrambe
+                    .values(room_id=bindparam("b_room_id"), property_id=null())
+                )
+                self.db.execute(stmt, media_links)
+
+            if self.search_cards:
+                self.search_cards.refresh({room.property_id for room in rooms})
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        # Indice amenities aggiornato solo a commit riuscito
+        if self.amenity_index:
+            for room in rooms:
+                self.amenity_index.set_room_amenities(room.id, room.property_id, [a.id for a in room.amenities])
+
+        return self.get_by_ids([room.id for room in rooms])
+
     def save(self, entity: entities.Room) -> entities.Room:
         # Recupera il modello esistente
         existing_model = self.db.query(models.RoomModel).get(entity.id)
@@ -90,7 +177,15 @@ class RoomRepository:
             
             self.db.add(new_model)
 
+        # La card della property riassume le stanze (prezzi, capienza, tipi)
+        if self.search_cards:
+            self.search_cards.refresh([entity.property_id])
+
         self.db.commit()
+
+        # Indice amenities aggiornato solo a commit riuscito
+        if self.amenity_index:
+            self.amenity_index.set_room_amenities(entity.id, entity.property_id, [a.id for a in entity.amenities])
         
         for path in files_to_delete_on_success:
             self.storage.delete_media(path)
@@ -112,6 +207,7 @@ class RoomRepository:
             ]
 
             # DB DELETE
+            property_id = model.property_id
             self.db.delete(model)
             self.db.flush()
 
@@ -129,8 +225,14 @@ class RoomRepository:
                 )
                 self.db.execute(stmt)
 
+            if self.search_cards:
+                self.search_cards.refresh([property_id])
+
             self.db.commit()
 
+            if self.amenity_index:
+                self.amenity_index.remove_room(room_id)
+
             # CLEANUP FILE FISICI
             for path in paths_to_delete:
                 if path:
@@ -234,4 +336,29 @@ class RoomRepository:
         model.media = updated_media_list
         
         # NON cancelliamo qui. Ritorniamo la lista al chiamante.
-        return paths_to_delete
\ No newline at end of file
+        return paths_to_delete
+
+
+class AsyncRoomRepository:
+    """Letture delle stanze su AsyncSession (rotte GET async); le scritture restano su RoomRepository."""
+
+    def __init__(self, db: "AsyncSession"):
+        self.db = db
+
+    async def get_by_id(self, room_id: str) -> Optional[entities.Room]:
+        stmt = self._select().where(models.RoomModel.id == room_id)
+        model = (await self.db.execute(stmt)).scalars().first()
+        return mappers.to_domain_room(model) if model else None
+
+    async def get_by_property_id(self, property_id: str) -> List[entities.Room]:
+        # Stesso selectinload della versione sync: 3 query invece di N+1
+        stmt = self._select().where(models.RoomModel.property_id == property_id)
+        models_list = (await self.db.execute(stmt)).scalars().all()
+        return [mappers.to_domain_room(m) for m in models_list]
+
+    @staticmethod
+    def _select():
+        return select(models.RoomModel).options(
+            selectinload(models.RoomModel.amenity_links).joinedload(models.RoomAmenityLinkModel.amenity),
+            selectinload(models.RoomModel.media),
+        )
@@ -0,0 +1,150 @@
+from typing import Any, Dict, Iterable, List, Optional, TYPE_CHECKING
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.repositories.search_repository import COVER_MEDIA_SQL, property_document_sql
+
+if TYPE_CHECKING:
+    from app.search.engine import SearchEngine
+
+# =================================================================
+# PROIEZIONE property_search_cards (read model della search)
+# =================================================================
+# Ricalcola le card delle properties scelte da {where} (alias "p") con un solo INSERT ... ON CONFLICT:
+# - "hotels": le colonne della property + owner (stessa forma usata da PROPERTY_DOCUMENT_SQL);
+#   distanza e score dipendono dalla richiesta, nella card restano NULL
+# - "docs": il documento completo, costruito dallo stesso SQL della search "json"
+# - LATERAL per i riassunti (stanze, amenities); la copertina è la stessa del documento
+CARD_UPSERT_SQL = """
+    WITH hotels AS (
+        SELECT p.id, p.name, p.address, p.city, p.country, p.description, p.status, p.created_at,
+               p.latitude, p.longitude, NULL::numeric AS distance_km, NULL::float8 AS score,
+               p.min_room_price AS min_price, {cover} AS cover,
+               p.search_document, p.search_vector, p.min_room_price, p.max_room_capacity,
+               u.id AS owner_id, u.name AS owner_name, u.email AS owner_email
+        FROM properties p
+        JOIN users u ON u.id = p.owner_id
+        WHERE {where}
+    ),
+    docs AS (
+        SELECT h.id AS doc_id, {document}
+    )
+    INSERT INTO property_search_cards (
+        id, status, created_at, name, address, city, country, description, latitude, longitude,
+        search_document, search_vector, min_room_price, max_room_price, max_room_capacity,
+        room_count, room_types, amenity_ids, amenity_names, owner_id, owner_name, cover_media, document
+    )
+    SELECT h.id, h.status, h.created_at, h.name, h.address, h.city, h.country, h.description,
+           h.latitude, h.longitude, h.search_document, h.search_vector, h.min_room_price,
+           rs.max_price, h.max_room_capacity, rs.room_count, COALESCE(rs.room_types, '{{}}'),
+           COALESCE(am.ids, '{{}}'), COALESCE(am.names, '{{}}'), h.owner_id, h.owner_name,
+           h.cover::jsonb, d.doc::jsonb
+    FROM hotels h
+    JOIN docs d ON d.doc_id = h.id
+    LEFT JOIN LATERAL (
+        SELECT count(*) AS room_count, max(r.price) AS max_price, array_agg(DISTINCT r.type) AS room_types
+        FROM rooms r
+        WHERE r.property_id = h.id
+    ) rs ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT array_agg(a.id ORDER BY a.name) AS ids, array_agg(a.name ORDER BY a.name) AS names
+        FROM property_amenities_link l
+        JOIN property_amenities a ON a.id = l.amenity_id
+        WHERE l.property_id = h.id
+    ) am ON TRUE
+    ON CONFLICT (id) DO UPDATE SET
+        status = EXCLUDED.status, created_at = EXCLUDED.created_at, name = EXCLUDED.name,
+        address = EXCLUDED.address, city = EXCLUDED.city, country = EXCLUDED.country,
+        description = EXCLUDED.description, latitude = EXCLUDED.latitude, longitude = EXCLUDED.longitude,
+        search_document = EXCLUDED.search_document, search_vector = EXCLUDED.search_vector,
+        min_room_price = EXCLUDED.min_room_price, max_room_price = EXCLUDED.max_room_price,
+        max_room_capacity = EXCLUDED.max_room_capacity, room_count = EXCLUDED.room_count,
+        room_types = EXCLUDED.room_types, amenity_ids = EXCLUDED.amenity_ids,
+        amenity_names = EXCLUDED.amenity_names, owner_id = EXCLUDED.owner_id,
+        owner_name = EXCLUDED.owner_name, cover_media = EXCLUDED.cover_media,
+        document = EXCLUDED.document, updated_at = now()
+    RETURNING id, status, created_at, document
+"""
+
+
+class SearchCardRepository:
+    """
+    Mantiene la proiezione property_search_cards.
+    Non fa commit: le altre repository la chiamano prima del proprio commit,
+    così card e tabelle normalizzate cambiano nella stessa transazione.
+
+    Se c'è il motore in memoria (SearchEngine), le card scritte (RETURNING) gli vengono
+    passate solo dopo il commit della sessione; un rollback le scarta.
+    """
+
+    def __init__(self, db: Session, engine: Optional["SearchEngine"] = None):
+        self.db = db
+        self.engine = engine
+        self._written: Dict[str, Any] = {}
+        self._deleted: List[str] = []
+        if engine is not None:
+            event.listen(db, "after_commit", self._publish)
+            event.listen(db, "after_rollback", self._discard)
+
+    def refresh(self, property_ids: Iterable[str]):
+        ids = [i for i in set(property_ids) if i]
+        if ids:
+            self._refresh_where("p.id = ANY(:property_ids)", {"property_ids": ids})
+
+    def refresh_for_rooms(self, room_ids: Iterable[str]):
+        ids = [i for i in set(room_ids) if i]
+        if ids:
+            self._refresh_where(
+                "p.id IN (SELECT property_id FROM rooms WHERE id = ANY(:room_ids))", {"room_ids": ids}
+            )
+
+    def refresh_all(self):
+        self._refresh_where("TRUE", {})
+
+    def refresh_missing(self) -> int:
+        """Crea le card delle properties che non ne hanno una (es. dopo il seed). Ritorna quante."""
+        missing = self.db.execute(text(
+            "SELECT count(*) FROM properties p WHERE NOT EXISTS (SELECT 1 FROM property_search_cards c WHERE c.id = p.id)"
+        )).scalar()
+        if missing:
+            self._refresh_where("NOT EXISTS (SELECT 1 FROM property_search_cards c WHERE c.id = p.id)", {})
+        return missing
+
+    def forget(self, property_id: str):
+        """La property viene cancellata: la card sparisce col CASCADE, il motore va avvisato."""
+        self._written.pop(property_id, None)
+        self._deleted.append(property_id)
+
+    # Properties toccate da un'amenity (per rinomine / cancellazioni del catalogo)
+    def property_ids_for_property_amenity(self, amenity_id: str) -> List[str]:
+        sql = "SELECT property_id FROM property_amenities_link WHERE amenity_id = :amenity_id"
+        return list(self.db.execute(text(sql), {"amenity_id": amenity_id}).scalars().all())
+
+    def property_ids_for_room_amenity(self, amenity_id: str) -> List[str]:
+        sql = """
+            SELECT DISTINCT r.property_id
+            FROM room_amenities_link l JOIN rooms r ON r.id = l.room_id
+            WHERE l.amenity_id = :amenity_id
+        """
+        return list(self.db.execute(text(sql), {"amenity_id": amenity_id}).scalars().all())
+
+    # =================================================================
+    # HELPER PRIVATI
+    # =================================================================
+
+    def _refresh_where(self, where: str, params: Dict[str, Any]):
+        # La sessione non fa autoflush: le modifiche pendenti devono arrivare al DB prima della proiezione
+        self.db.flush()
+        sql = CARD_UPSERT_SQL.format(where=where, document=property_document_sql(), cover=COVER_MEDIA_SQL)
+        rows = self.db.execute(text(sql), params).mappings().all()
+        if self.engine is not None:
+            for row in rows:
+                self._written[row["id"]] = dict(row)
+
+    def _publish(self, session: Session):
+        written, deleted = list(self._written.values()), self._deleted
+        self._written, self._deleted = {}, []
+        if self.engine is not None and (written or deleted):
+            self.engine.apply(written, deleted)
+
+    def _discard(self, session: Session):
+        self._written, self._deleted = {}, []
@@ -1,172 +1,1029 @@
+import base64
+import dataclasses
+import json
+import unicodedata
+from datetime import datetime
+from decimal import Decimal
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Dict, Any, Optional
+from typing import AbstractSet, List, Dict, Any, Generator, Iterator, Optional, Sequence, Tuple, TYPE_CHECKING
+from app.config import settings
+from app.domain.search import PROPERTY_INCLUDES, ChildLimits, SearchCriteria, SearchPage, SearchSort
+from app.search.amenity_index import AmenityBitmapIndex
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+SEARCH_TEXT_MODES = ("fulltext", "ilike", "trigram")
+
+# Generatore che produce (sql, params), riceve le righe (mappings) e ritorna il risultato: vedi _run
+QueryPlan = Generator[Tuple[str, Dict[str, Any]], Sequence[Any], Any]
+
+# Modalità "trigram": peso di ogni campo nello score di rilevanza.
+# word_similarity cerca il testo come parola/e dentro il campo ("roma" in "Grand Hotel Roma" = 1).
+# Ogni campo ha il suo indice gin_trgm_ops, usato dall'operatore <% nel WHERE.
+TRIGRAM_WEIGHTS: Tuple[Tuple[str, float], ...] = (
+    ("name", 1.0),
+    ("city", 0.8),
+    ("address", 0.4),
+    ("description", 0.2),
+)
+SEARCH_ASSEMBLY_MODES = ("python", "json")
+SEARCH_SOURCES = ("cards", "live")
+
+def normalize_search_term(value: str) -> str:
+    """
+    Normalizza il testo cercato come fa il trigger del documento di ricerca:
+    minuscolo, senza accenti, spazi compattati ('  Città ' -> 'citta').
+    """
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.lower().split())
+
+def escape_like(value: str) -> str:
+    # I caratteri jolly digitati dall'utente vanno presi alla lettera
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# =================================================================
+# KEYSET PAGINATION
+# =================================================================
+# Ogni ordinamento è una chiave (colonne + direzione) che termina sempre con p.id,
+# così l'ordine è totale e la pagina successiva si ottiene con un confronto tra tuple:
+#   WHERE (p.created_at, p.id) < (:cursor_0, :cursor_1) ORDER BY ... LIMIT n
+# Costa come la prima pagina (nessun OFFSET da scorrere) ed è servito dagli indici
+# idx_properties_published_newest / _price / _capacity (vedi schema.sql).
+# Le chiavi RELEVANCE e DISTANCE iniziano con il rank / la distanza, aggiunti in _build_hotels_query.
+SORT_KEYS: Dict[SearchSort, Tuple[List[str], str]] = {
+    SearchSort.NEWEST: (["p.created_at", "p.id"], "DESC"),
+    SearchSort.PRICE: (["p.min_room_price", "p.id"], "ASC"),
+    SearchSort.CAPACITY: (["p.max_room_capacity", "p.id"], "DESC"),
+    SearchSort.RELEVANCE: (["p.created_at", "p.id"], "DESC"),
+    SearchSort.DISTANCE: (["p.id"], "ASC"),
+}
+
+# =================================================================
+# GEO (estensioni cube + earthdistance, vedi schema.sql)
+# =================================================================
+# Distanza in metri tra il punto cercato (:geo_lat, :geo_lng) e l'hotel.
+# La calcola Postgres per tutte le righe candidate in un colpo solo, insieme al resto della query.
+GEO_POINT_SQL = "ll_to_earth(:geo_lat, :geo_lng)"
+DISTANCE_SQL = f"earth_distance({GEO_POINT_SQL}, ll_to_earth(p.latitude, p.longitude))"
+
+CURSOR_COLUMN_PREFIX = "cursor_"
+
+# Tipo di ogni colonna della chiave keyset, per ordinamento (stesso ordine di SORT_KEYS, rank / distanza
+# in testa). Il cursore è JSON: in decodifica i valori tornano al loro tipo, così si possono passare
+# come parametri tipizzati (asyncpg non converte una stringa in timestamp / numeric) e confrontare
+# nel motore in memoria. Lo stesso cursore vale per SearchRepository e SearchEngine,
+# tranne che per gli ordinamenti di BACKEND_SPECIFIC_SORTS.
+CURSOR_KEY_TYPES: Dict[SearchSort, Tuple[str, ...]] = {
+    SearchSort.NEWEST: ("datetime", "id"),
+    SearchSort.PRICE: ("number", "id"),
+    SearchSort.CAPACITY: ("int", "id"),
+    SearchSort.RELEVANCE: ("float", "datetime", "id"),
+    SearchSort.DISTANCE: ("float", "id"),
+}
+
+# Chiavi calcolate in modo diverso dai due backend: il motore in memoria misura la distanza in km
+# (haversine) e lo score come somma dei pesi dei campi, la SQL in metri (earth_distance) e con ts_rank_cd.
+# Questi cursori portano il backend che li ha emessi e sull'altro danno 400 (si riparte dalla prima pagina).
+BACKEND_SPECIFIC_SORTS = frozenset({SearchSort.RELEVANCE, SearchSort.DISTANCE})
+CURSOR_BACKEND_SQL = "sql"
+CURSOR_BACKEND_ENGINE = "engine"
+
+def encode_cursor(sort: SearchSort, values: Sequence[Any], backend: str = CURSOR_BACKEND_SQL) -> str:
+    payload = [sort.value, [_cursor_json(v) for v in values]]
+    if sort in BACKEND_SPECIFIC_SORTS:
+        payload.append(backend)
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(sort: SearchSort, token: str, size: int, backend: str = CURSOR_BACKEND_SQL) -> List[Any]:
+    """
+    Decodifica un cursore prodotto da encode_cursor, con i valori di nuovo tipizzati
+    (datetime, Decimal, float, int, str secondo CURSOR_KEY_TYPES).
+    Solleva ValueError se il token è malformato, manomesso, appartiene a un altro ordinamento
+    o (solo BACKEND_SPECIFIC_SORTS) è stato emesso dall'altro backend.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor_sort, values, *issued_by = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    kinds = CURSOR_KEY_TYPES[sort]
+    if cursor_sort != sort.value or not isinstance(values, list) or len(values) != size or len(values) != len(kinds):
+        raise ValueError("Cursor does not match the requested sort")
+    # Senza tag: cursore emesso prima del motore in memoria, quindi dalla SQL
+    issued = issued_by[0] if issued_by else CURSOR_BACKEND_SQL
+    if sort in BACKEND_SPECIFIC_SORTS and issued != backend:
+        raise ValueError("Cursor was issued by another search backend; restart from the first page")
+    try:
+        return [_cursor_value(kind, value) for kind, value in zip(kinds, values)]
+    except (ValueError, TypeError, ArithmeticError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _cursor_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)  # esatto, niente arrotondamenti del float
+    return value
+
+def _cursor_value(kind: str, value: Any) -> Any:
+    if kind == "datetime" and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if kind == "number" and isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        number = Decimal(str(value))
+        if not number.is_finite():
+            raise ValueError("Invalid number")
+        return number
+    if kind == "float" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if kind == "int" and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if kind == "id" and isinstance(value, str):
+        return value
+    raise TypeError(f"Unexpected cursor value for {kind}")
+
+
+# =================================================================
+# DOCUMENTO JSON (property -> rooms -> media/amenities)
+# =================================================================
+# Postgres costruisce l'intero documento di ogni hotel con json_build_object/json_agg.
+# Parte da una relazione "h" con le colonne della query hotel
+# (id, name, address, city, country, description, status, latitude, longitude, distance_km, score,
+#  min_price, cover, owner_id, owner_name, owner_email).
+# Ogni LATERAL lavora su un solo hotel (o una sola stanza) usando gli indici su property_id/room_id.
+# Le collezioni figlie (e i loro LATERAL) entrano solo se richieste: vedi property_document_sql.
+PROPERTY_DOCUMENT_SQL = """
+    json_build_object(
+        'id', h.id, 'name', h.name, 'address', h.address, 'city', h.city,
+        'country', h.country, 'description', h.description, 'status', h.status,
+        'latitude', h.latitude, 'longitude', h.longitude, 'distance_km', h.distance_km,
+        'score', h.score, 'min_price', h.min_price, 'cover', h.cover,
+        'owner', json_build_object('id', h.owner_id, 'name', h.owner_name, 'email', h.owner_email){children}
+    ) AS doc
+    FROM hotels h{laterals}
+"""
+
+AMENITIES_LATERAL = """
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+                   'id', a.id, 'name', a.name, 'category', a.category, 'is_global', a.is_global,
+                   'description', a.description, 'custom_description', l.custom_description
+               )) AS items
+        FROM {owner}_amenities_link l
+        JOIN {owner}_amenities a ON a.id = l.amenity_id
+        WHERE l.{owner}_id = {parent}.id
+    ) {alias} ON TRUE"""
+
+# Foto in ordine di caricamento. Con un limite la subquery restituisce solo le prime N
+# (Limit su una scansione dell'indice property_id/room_id) e il totale si conta a parte.
+MEDIA_LATERAL = """
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+                   'id', m.id, 'file_name', m.file_name, 'file_type', m.file_type,
+                   'storage_path', m.storage_path, 'description', m.description
+               ) ORDER BY m.inserted_at, m.id) AS items,
+               {total} AS total
+        FROM (
+            SELECT * FROM media m
+            WHERE {where}
+            ORDER BY m.inserted_at, m.id{limit}
+        ) m
+    ) {alias} ON TRUE"""
+
+# Stanze dalla più economica; stesso schema (prime N + totale) delle foto
+ROOMS_LATERAL = """
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+                   'id', r.id, 'property_id', r.property_id, 'type', r.type, 'description', r.description,
+                   'price', r.price, 'capacity', r.capacity, 'is_available', r.is_available{children}
+               ) ORDER BY r.price, r.id) AS items,
+               {total} AS total
+        FROM (
+            SELECT * FROM rooms r
+            WHERE {where}
+            ORDER BY r.price, r.id{limit}
+        ) r{laterals}
+    ) pr ON TRUE"""
+
+# Copertina della property: la prima foto caricata (subquery correlata sull'indice media.property_id)
+COVER_MEDIA_SQL = """(
+    SELECT json_build_object(
+               'id', m.id, 'file_name', m.file_name, 'file_type', m.file_type,
+               'storage_path', m.storage_path, 'description', m.description
+           )
+    FROM media m
+    WHERE m.property_id = p.id AND m.room_id IS NULL
+    ORDER BY m.inserted_at, m.id
+    LIMIT 1
+)"""
+
+def child_limits_from_settings() -> ChildLimits:
+    # SEARCH_MAX_* = 0 vuol dire nessun limite
+    return ChildLimits(
+        rooms=settings.SEARCH_MAX_ROOMS or None,
+        media=settings.SEARCH_MAX_MEDIA or None,
+        room_media=settings.SEARCH_MAX_ROOM_MEDIA or None,
+    )
+
+def _limited(template: str, table: str, where: str, limit: Optional[int], **fields: str) -> str:
+    # Senza limite il totale è il count(*) dello stesso aggregato; con il limite serve un count a parte
+    if limit is None:
+        return template.format(where=where, limit="", total="count(*)", **fields)
+    total = f"(SELECT count(*) FROM {table} WHERE {where})"
+    return template.format(where=where, limit=f" LIMIT {int(limit)}", total=total, **fields)
+
+def property_document_sql(
+    room_conditions: Sequence[str] = (),
+    include: Optional[AbstractSet[str]] = None,
+    limits: Optional[ChildLimits] = None
+) -> str:
+    """
+    SELECT del documento dalla CTE "hotels". include: collezioni figlie da costruire
+    (None = tutte); quelle escluse non hanno né chiave né LATERAL, quindi non si leggono.
+    room_conditions: filtri sulle stanze (alias "r"), solo le stanze che li rispettano finiscono nel documento.
+    limits: quante stanze / foto per hotel (None = tutte); room_count / media_count hanno sempre il totale.
+    """
+    include = PROPERTY_INCLUDES if include is None else include
+    limits = limits or ChildLimits()
+    children, laterals = [], []
+    if "amenities" in include:
+        children.append("'amenities', COALESCE(pa.items, '[]'::json)")
+        laterals.append(AMENITIES_LATERAL.format(owner="property", parent="h", alias="pa"))
+    if "media" in include:
+        children.append("'media', COALESCE(pm.items, '[]'::json), 'media_count', pm.total")
+        laterals.append(_limited(
+            MEDIA_LATERAL, "media m", "m.property_id = h.id AND m.room_id IS NULL", limits.media, alias="pm"
+        ))
+    if "rooms" in include:
+        room_children, room_laterals = [], []
+        if "amenities" in include:
+            room_children.append("'amenities', COALESCE(ra.items, '[]'::json)")
+            room_laterals.append(AMENITIES_LATERAL.format(owner="room", parent="r", alias="ra"))
+        if "media" in include:
+            room_children.append("'media', COALESCE(rm.items, '[]'::json), 'media_count', rm.total")
+            room_laterals.append(_limited(MEDIA_LATERAL, "media m", "m.room_id = r.id", limits.room_media, alias="rm"))
+        children.append("'rooms', COALESCE(pr.items, '[]'::json), 'room_count', pr.total")
+        room_where = "r.property_id = h.id" + "".join(f" AND {c}" for c in room_conditions)
+        laterals.append(_limited(
+            ROOMS_LATERAL, "rooms r", room_where, limits.rooms,
+            children="".join(f",\n                   {c}" for c in room_children),
+            laterals="".join(l.replace("\n", "\n    ") for l in room_laterals),
+        ))
+    return PROPERTY_DOCUMENT_SQL.format(
+        children="".join(f",\n        {c}" for c in children),
+        laterals="".join(laterals),
+    )
 
 # Questa repository si occupa delle query.
 class SearchRepository:
-    def __init__(self, db: Session):
+    BASE_LIMIT = 20
+    SEARCH_LIMIT = 50
+    # Righe lette dal cursore lato server per ogni round trip durante l'export
+    EXPORT_BATCH_SIZE = 200
+
+    def __init__(
+        self,
+        db: Session,
+        text_mode: Optional[str] = None,
+        assembly: Optional[str] = None,
+        amenity_index: Optional[AmenityBitmapIndex] = None,
+        source: Optional[str] = None,
+        limits: Optional[ChildLimits] = None
+    ):
         self.db = db
+        # Stanze / foto per risultato (l'export restituisce sempre tutto)
+        self.limits = limits or child_limits_from_settings()
+        self.source = source or settings.SEARCH_SOURCE
+        if self.source not in SEARCH_SOURCES:
+            raise ValueError(f"Invalid search source: {self.source}")
+        # Se l'indice è caricato, i filtri sulle amenities non toccano le tabelle di link
+        self.amenity_index = amenity_index
+        self.text_mode = text_mode or settings.SEARCH_TEXT_MODE
+        self.assembly = assembly or settings.SEARCH_ASSEMBLY
+        if self.text_mode not in SEARCH_TEXT_MODES:
+            raise ValueError(f"Invalid search text mode: {self.text_mode}")
+        if self.assembly not in SEARCH_ASSEMBLY_MODES:
+            raise ValueError(f"Invalid search assembly mode: {self.assembly}")
 
     # CQRS (Command Query Responsibility Segregation)
     # Cqrs vuol dire che le operazioni di lettura (Query) sono separate
     # dalle operazioni di scrittura (Command). Qui abbiamo solo Query.
-    
-    # Ritorna una lista di dizionari con i dati assemblati
-    # facciamo esattamente 5 query per ogni hotel (hotel, rooms, media, property amenities, room amenities)
-    def search_properties(self, location: Optional[str] = None) -> List[Dict[str, Any]]:
+
+    # Ritorna una pagina di dizionari con i dati assemblati (stessa forma di PropertySearchResponse).
+    # Due strategie, scelte con SEARCH_ASSEMBLY (utile per i benchmark):
+    # - "python": 5 query (hotel, rooms, media, property amenities, room amenities) + assemblaggio in Python
+    # - "json":   1 sola query, il documento annidato lo costruisce Postgres
+    # La paginazione è keyset: la pagina contiene il cursore per chiedere la successiva.
+    def search_properties(self, criteria: Optional[SearchCriteria] = None) -> SearchPage:
         try:
-            BASE_LIMIT = 20
-            SEARCH_LIMIT = 50
+            return self._run(self._search_plan(criteria or SearchCriteria()))
+        except Exception as e:
+            print(f"Database Error in SearchRepository: {e}")
+            raise e
 
-            # -----------------------------
-            # Properties + Owner info
-            # -----------------------------
-            sql_hotels = """
-                SELECT p.id, p.name, p.address, p.city, p.country, p.description, p.created_at, p.status,
-                       u.id AS owner_id, u.name AS owner_name, u.email AS owner_email
-                FROM properties p
-                JOIN users u ON p.owner_id = u.id
-                WHERE p.status = 'PUBLISHED'
+    # Export di tutti i risultati (niente paginazione, cursor/limit ignorati), un documento alla volta.
+    # I documenti sono interi: i limiti SEARCH_MAX_* valgono solo per le pagine della search.
+    # Il documento di ogni hotel lo costruisce Postgres (card o strategia "json") e le righe arrivano
+    # da un cursore lato server a blocchi di EXPORT_BATCH_SIZE: la memoria non cresce con i risultati.
+    # La query si prepara subito (errori sui filtri = ValueError qui), le righe si leggono iterando.
+    def stream_properties(self, criteria: Optional[SearchCriteria] = None) -> Iterator[Dict[str, Any]]:
+        criteria = dataclasses.replace(criteria or SearchCriteria(), cursor=None, limit=None)
+        cards = self._use_cards(criteria)
+        if cards:
+            sql, order_by, params, _ = self._build_hotels_query(criteria, cards=True)
+            sql += f" ORDER BY {', '.join(order_by)}"
+        else:
+            sql_hotels, order_by, params, _ = self._build_hotels_query(criteria)
+            sql = f"""
+                WITH hotels AS ({sql_hotels})
+                SELECT {property_document_sql(self._room_conditions(criteria, params), criteria.include)}
+                ORDER BY {', '.join(f"h.{o}" for o in order_by)}
             """
-            params = {}
-
-            if location:
-                location = location.strip()
-                # Logica di ricerca semplice
-                params["loc"] = f"%{location}%"
-                sql_hotels += " AND (p.city ILIKE :loc OR p.name ILIKE :loc OR p.address ILIKE :loc OR p.country ILIKE :loc OR p.description ILIKE :loc)"
-                sql_hotels += " ORDER BY p.created_at DESC LIMIT :limit"
-                params["limit"] = SEARCH_LIMIT
+        params.pop("limit")
+
+        def documents() -> Iterator[Dict[str, Any]]:
+            result = self.db.execute(
+                text(sql), params,
+                execution_options={"stream_results": True, "yield_per": self.EXPORT_BATCH_SIZE}
+            )
+            try:
+                for row in result.mappings():
+                    yield self._card_document(row) if cards else row["doc"]
+            finally:
+                # Se il client si disconnette a metà, il cursore lato server va chiuso comunque
+                result.close()
+
+        return documents()
+
+    # Conteggi per facet calcolati sull'intero insieme dei risultati (non sulla pagina):
+    # quanti hotel per tipo di stanza / amenity e il range di prezzo delle stanze che rispettano i filtri.
+    def facet_counts(self, criteria: Optional[SearchCriteria] = None) -> Dict[str, Any]:
+        try:
+            return self._run(self._facets_plan(criteria or SearchCriteria()))
+        except Exception as e:
+            print(f"Database Error in SearchRepository: {e}")
+            raise e
+
+    # Righe leggere (id, name, city, country) delle properties pubblicate: sorgente dell'indice di autocompletamento
+    def published_suggest_rows(self) -> List[Dict[str, Any]]:
+        return self._run(self._suggest_rows_plan())
+
+    # =================================================================
+    # PIANI DI QUERY
+    # =================================================================
+    # Ogni operazione è un generatore che produce (sql, params), riceve le righe e alla fine
+    # ritorna il risultato. Così le stesse query servono sia con Session (_run, qui sotto)
+    # sia con AsyncSession (AsyncSearchRepository._run_async).
+
+    def _run(self, plan: QueryPlan) -> Any:
+        try:
+            sql, params = next(plan)
+            while True:
+                rows = self.db.execute(text(sql), params).mappings().all()
+                sql, params = plan.send(rows)
+        except StopIteration as done:
+            return done.value
+
+    def _search_plan(self, criteria: SearchCriteria) -> QueryPlan:
+        if self._use_cards(criteria):
+            return self._search_cards(criteria)
+        if self.assembly == "json":
+            return self._search_json(criteria)
+        return self._search_python(criteria)
+
+    def _suggest_rows_plan(self) -> QueryPlan:
+        rows = yield "SELECT id, name, city, country FROM properties WHERE status = 'PUBLISHED'", {}
+        return [dict(r) for r in rows]
+
+    def _facets_plan(self, criteria: SearchCriteria) -> QueryPlan:
+        params: Dict[str, Any] = {}
+        conditions, _ = self._match_conditions(criteria, params)
+        room_conditions = self._room_conditions(criteria, params)
+        hotel_filter = "".join(f" AND {c}" for c in conditions)
+        room_filter = " WHERE " + " AND ".join(room_conditions) if room_conditions else ""
+
+        sql = f"""
+            WITH matched AS (
+                SELECT p.id FROM properties p
+                WHERE p.status = 'PUBLISHED'{hotel_filter}
+            ),
+            matched_rooms AS (
+                SELECT r.id, r.property_id, r.type, r.price
+                FROM rooms r JOIN matched m ON m.id = r.property_id{room_filter}
+            )
+            SELECT 'total' AS facet, NULL AS value, count(*) AS count, NULL::numeric AS min_price, NULL::numeric AS max_price
+            FROM matched
+            UNION ALL
+            SELECT 'price', NULL, count(DISTINCT property_id), min(price), max(price)
+            FROM matched_rooms
+            UNION ALL
+            SELECT 'room_type', type, count(DISTINCT property_id), NULL, NULL
+            FROM matched_rooms GROUP BY type
+            UNION ALL
+            SELECT 'property_amenity', l.amenity_id, count(*), NULL, NULL
+            FROM property_amenities_link l JOIN matched m ON m.id = l.property_id
+            GROUP BY l.amenity_id
+            UNION ALL
+            SELECT 'room_amenity', l.amenity_id, count(DISTINCT mr.property_id), NULL, NULL
+            FROM room_amenities_link l JOIN matched_rooms mr ON mr.id = l.room_id
+            GROUP BY l.amenity_id
+        """
+        rows = yield sql, params
+
+        facets: Dict[str, Any] = {
+            "total": 0,
+            "price": {"min": None, "max": None},
+            "room_types": [],
+            "property_amenities": [],
+            "room_amenities": [],
+        }
+        lists = {"room_type": "room_types", "property_amenity": "property_amenities", "room_amenity": "room_amenities"}
+        for row in rows:
+            if row["facet"] == "total":
+                facets["total"] = row["count"]
+            elif row["facet"] == "price":
+                facets["price"] = {"min": row["min_price"], "max": row["max_price"]}
             else:
-                sql_hotels += " ORDER BY p.created_at DESC LIMIT :limit"
-                params["limit"] = BASE_LIMIT
-
-            # Esecuzione Query Hotel
-            hotels = self.db.execute(text(sql_hotels), params).mappings().all()
-            if not hotels:
-                return []
-
-            hotel_ids = [h["id"] for h in hotels]
-
-            # -----------------------------
-            # Rooms
-            # -----------------------------
-            sql_rooms = """
-                SELECT id, property_id, type, description, price, capacity, is_available, created_at
-                FROM rooms
-                WHERE property_id = ANY(:hotel_ids)
+                facets[lists[row["facet"]]].append({"value": row["value"], "count": row["count"]})
+
+        for key in lists.values():
+            facets[key].sort(key=lambda f: (-f["count"], f["value"]))
+        return facets
+
+    # =================================================================
+    # STRATEGIE DI ESECUZIONE
+    # =================================================================
+
+    def _search_python(self, criteria: SearchCriteria) -> QueryPlan:
+        # -----------------------------
+        # Properties + Owner info
+        # -----------------------------
+        sql_hotels, order_by, params, sort = self._build_hotels_query(criteria)
+        sql_hotels += f" ORDER BY {', '.join(order_by)} LIMIT :limit"
+
+        # Esecuzione Query Hotel
+        hotels = yield sql_hotels, params
+        hotels, next_cursor = self._paginate(hotels, params["limit"] - 1, sort)
+        if not hotels:
+            return SearchPage()
+
+        hotel_ids = [h["id"] for h in hotels]
+        # Le collezioni non richieste (include=) non vengono interrogate
+        include = PROPERTY_INCLUDES if criteria.include is None else criteria.include
+        rooms, media, h_amenities, r_amenities = [], [], [], []
+
+        # -----------------------------
+        # Rooms
+        # -----------------------------
+        # Le più economiche per hotel (window function: il DB non restituisce le stanze oltre il limite),
+        # ognuna con il totale delle stanze dell'hotel che rispettano i filtri
+        if "rooms" in include:
+            room_params: Dict[str, Any] = {"hotel_ids": hotel_ids}
+            # Solo le stanze che rispettano i filtri (prezzo, capienza, tipo, amenities)
+            room_filter = "".join(f" AND {c}" for c in self._room_conditions(criteria, room_params))
+            position_filter = ""
+            if self.limits.rooms is not None:
+                room_params["max_rooms"] = self.limits.rooms
+                position_filter = "WHERE r.position <= :max_rooms"
+            sql_rooms = f"""
+                SELECT r.id, r.property_id, r.type, r.description, r.price, r.capacity, r.is_available, r.created_at, r.total
+                FROM (
+                    SELECT r.*,
+                           row_number() OVER (PARTITION BY r.property_id ORDER BY r.price, r.id) AS position,
+                           count(*) OVER (PARTITION BY r.property_id) AS total
+                    FROM rooms r
+                    WHERE r.property_id = ANY(:hotel_ids){room_filter}
+                ) r
+                {position_filter}
+                ORDER BY r.price, r.id
             """
-            rooms = self.db.execute(text(sql_rooms), {"hotel_ids": hotel_ids}).mappings().all()
-
-            # -----------------------------
-            # Media (Property + Rooms)
-            # -----------------------------
-            # Nota: Recuperiamo tutto ciò che riguarda questi hotel.
-            sql_media = """
-                SELECT id, property_id, room_id, file_name, file_type, storage_path, description, inserted_at
-                FROM media
-                WHERE property_id = ANY(:hotel_ids)
+            rooms = yield sql_rooms, room_params
+        room_ids = [r["id"] for r in rooms]
+
+        # -----------------------------
+        # Media (Property + Rooms)
+        # -----------------------------
+        # Nota: i media delle stanze hanno solo room_id valorizzato, quindi li cerchiamo anche per stanza.
+        # Prime foto per hotel / per stanza in ordine di caricamento, con il totale (come per le stanze)
+        if "media" in include:
+            media_params: Dict[str, Any] = {"hotel_ids": hotel_ids, "room_ids": room_ids}
+            position_filters = []
+            if self.limits.media is not None:
+                media_params["max_media"] = self.limits.media
+                position_filters.append("(m.room_id IS NOT NULL OR m.position <= :max_media)")
+            if self.limits.room_media is not None:
+                media_params["max_room_media"] = self.limits.room_media
+                position_filters.append("(m.room_id IS NULL OR m.position <= :max_room_media)")
+            position_filter = "WHERE " + " AND ".join(position_filters) if position_filters else ""
+            sql_media = f"""
+                SELECT m.id, m.property_id, m.room_id, m.file_name, m.file_type, m.storage_path, m.description,
+                       m.inserted_at, m.total
+                FROM (
+                    SELECT m.*,
+                           row_number() OVER (PARTITION BY m.property_id, m.room_id ORDER BY m.inserted_at, m.id) AS position,
+                           count(*) OVER (PARTITION BY m.property_id, m.room_id) AS total
+                    FROM media m
+                    WHERE (m.property_id = ANY(:hotel_ids) AND m.room_id IS NULL) OR m.room_id = ANY(:room_ids)
+                ) m
+                {position_filter}
+                ORDER BY m.inserted_at, m.id
             """
-            media = self.db.execute(text(sql_media), {"hotel_ids": hotel_ids}).mappings().all()
+            media = yield sql_media, media_params
 
-            # -----------------------------
-            # Property Amenities
-            # -----------------------------
-            # Qui estraiamo anche description (catalogo) e custom_description (link)
+        # -----------------------------
+        # Property Amenities
+        # -----------------------------
+        # Qui estraiamo anche description (catalogo) e custom_description (link)
+        if "amenities" in include:
             sql_h_amenities = """
-                SELECT l.property_id, a.id, a.name, a.category, a.is_global, 
-                       a.description,          
-                       l.custom_description    
+                SELECT l.property_id, a.id, a.name, a.category, a.is_global,
+                       a.description,
+                       l.custom_description
                 FROM property_amenities a
                 JOIN property_amenities_link l ON a.id = l.amenity_id
                 WHERE l.property_id = ANY(:hotel_ids)
             """
-            h_amenities = self.db.execute(text(sql_h_amenities), {"hotel_ids": hotel_ids}).mappings().all()
-            
-            print(f"Hotel Amenities: {h_amenities}")
-            
-            # -----------------------------
-            # Room Amenities
-            # -----------------------------
-            room_ids = [r["id"] for r in rooms]
-            r_amenities = []
-            if room_ids:
-                sql_r_amenities = """
-                    SELECT l.room_id, a.id, a.name, a.category, a.is_global,
-                           a.description,          
-                           l.custom_description    
-                    FROM room_amenities a
-                    JOIN room_amenities_link l ON a.id = l.amenity_id
-                    WHERE l.room_id = ANY(:room_ids)
-                """
-            r_amenities = self.db.execute(text(sql_r_amenities), {"room_ids": room_ids}).mappings().all()
-            # -----------------------------
-            # Data Assembly (Manual Mapping)
-            # -----------------------------
-            
-            # Mappa Hotel
-            hotels_map = {}
-            for h in hotels:
-                h_dict = dict(h)
-                h_dict["rooms"] = []
-                h_dict["media"] = []
-                h_dict["amenities"] = []
-                # Struttura Owner
-                h_dict["owner"] = {
-                    "id": h_dict.pop("owner_id"),
-                    "name": h_dict.pop("owner_name"),
-                    "email": h_dict.pop("owner_email")
-                }
-                hotels_map[h_dict["id"]] = h_dict
-
-            # Mappa Stanze
-            rooms_map = {}
-            for r in rooms:
-                r_dict = dict(r)
-                r_dict["amenities"] = []
-                r_dict["media"] = [] # Inizializza lista media per la stanza
-                rooms_map[r_dict["id"]] = r_dict
-
-                # Collega stanza all'hotel
-                if r_dict["property_id"] in hotels_map:
-                    hotels_map[r_dict["property_id"]]["rooms"].append(r_dict)
-
-            # Mappa Media
-            for m in media:
-                m_dict = dict(m)
-                # Se il media ha un room_id ed esiste nella mappa stanze, mettilo lì
-                if m_dict.get("room_id") and m_dict["room_id"] in rooms_map:
-                    rooms_map[m_dict["room_id"]]["media"].append(m_dict)
-                # Altrimenti, se appartiene alla property, mettilo lì
-                elif m_dict["property_id"] in hotels_map:
-                    hotels_map[m_dict["property_id"]]["media"].append(m_dict)
-
-            # Mappa Amenities Property (Con i nuovi campi)
-            for a in h_amenities:
-                if a["property_id"] in hotels_map:
-                    hotels_map[a["property_id"]]["amenities"].append({
-                        "id": a["id"], 
-                        "name": a["name"],
-                        "category": a["category"],
-                        "description": a["description"],       
-                        "custom_description": a["custom_description"],
-                        "is_global": a["is_global"]
-                    })
-
-            # Mappa Amenities Rooms (Con i nuovi campi)
-            for a in r_amenities:
-                if a["room_id"] in rooms_map:
-                    rooms_map[a["room_id"]]["amenities"].append({
-                        "id": a["id"],
-                        "name": a["name"],
-                        "category": a["category"],
-                        "description": a["description"],          
-                        "custom_description": a["custom_description"],
-                        "is_global": a["is_global"]
-                    })
-
-            return list(hotels_map.values())
+            h_amenities = yield sql_h_amenities, {"hotel_ids": hotel_ids}
+
+        # -----------------------------
+        # Room Amenities
+        # -----------------------------
+        if room_ids and "amenities" in include:
+            sql_r_amenities = """
+                SELECT l.room_id, a.id, a.name, a.category, a.is_global,
+                       a.description,
+                       l.custom_description
+                FROM room_amenities a
+                JOIN room_amenities_link l ON a.id = l.amenity_id
+                WHERE l.room_id = ANY(:room_ids)
+            """
+            r_amenities = yield sql_r_amenities, {"room_ids": room_ids}
 
+        items = self._assemble(hotels, rooms, media, h_amenities, r_amenities, include)
+        return SearchPage(items=items, next_cursor=next_cursor)
+
+    def _search_json(self, criteria: SearchCriteria) -> QueryPlan:
+        sql_hotels, order_by, params, sort = self._build_hotels_query(criteria)
+        cursor_columns = [o.split()[0] for o in order_by]
+        outer_order = ", ".join(f"h.{o}" for o in order_by)
+        sql = f"""
+            WITH hotels AS (
+                {sql_hotels}
+                ORDER BY {', '.join(order_by)}
+                LIMIT :limit
+            )
+            SELECT {', '.join(f"h.{c}" for c in cursor_columns)},
+            {property_document_sql(self._room_conditions(criteria, params), criteria.include, self.limits)}
+            ORDER BY {outer_order}
+        """
+        rows = yield sql, params
+        rows, next_cursor = self._paginate(rows, params["limit"] - 1, sort)
+        # Il driver decodifica già il json: i documenti vanno diretti in PropertySearchResponse
+        return SearchPage(items=[r["doc"] for r in rows], next_cursor=next_cursor)
+
+    def _search_cards(self, criteria: SearchCriteria) -> QueryPlan:
+        # Read model: una sola tabella (property_search_cards) con il documento già pronto
+        sql_cards, order_by, params, sort = self._build_hotels_query(criteria, cards=True, limits=self.limits)
+        sql_cards += f" ORDER BY {', '.join(order_by)} LIMIT :limit"
+        rows = yield sql_cards, params
+        rows, next_cursor = self._paginate(rows, params["limit"] - 1, sort)
+        return SearchPage(items=[self._card_document(r) for r in rows], next_cursor=next_cursor)
+
+    # =================================================================
+    # HELPER PRIVATI
+    # =================================================================
+
+    def _use_cards(self, criteria: SearchCriteria) -> bool:
+        """
+        La card contiene tutte le stanze: se l'utente filtra sulle stanze (prezzo, ospiti, tipo,
+        amenities di stanza) servono solo quelle che rispettano i filtri, quindi si legge dalle tabelle.
+        """
+        if self.source != "cards":
+            return False
+        # La modalità trigram usa gli indici per colonna di properties (name, city, address, description)
+        if self.text_mode == "trigram" and criteria.location and criteria.location.strip():
+            return False
+        return not self._room_conditions(criteria, {})
+
+    @staticmethod
+    def _card_document(row: Any) -> Dict[str, Any]:
+        doc = dict(row["doc"])
+        # Distanza e score dipendono dalla richiesta, non stanno nella card
+        doc["distance_km"] = row["distance_km"]
+        doc["score"] = row["score"]
+        return doc
+
+    @staticmethod
+    def _card_document_sql(include: Optional[AbstractSet[str]], limits: Optional[ChildLimits]) -> str:
+        """
+        Documento della card con al massimo limits.media foto e limits.rooms stanze (ciascuna con
+        limits.room_media foto). Nella card le liste sono già ordinate (foto per caricamento, stanze per prezzo)
+        e i totali (media_count, room_count) ci sono già: basta tenere i primi N elementi, in Postgres.
+        """
+        include = PROPERTY_INCLUDES if include is None else include
+        if limits is None:
+            return "p.document"
+
+        def first(array: str, n: Optional[int], value: str, alias: str) -> str:
+            # Primi n elementi dell'array jsonb (tutti se n è None), nello stesso ordine
+            where = f" WHERE {alias}_pos <= {int(n)}" if n is not None else ""
+            return (f"(SELECT COALESCE(jsonb_agg({value} ORDER BY {alias}_pos), '[]'::jsonb) "
+                    f"FROM jsonb_array_elements({array}) WITH ORDINALITY AS {alias}_list({alias}, {alias}_pos){where})")
+
+        patches = []
+        if "media" in include and limits.media is not None:
+            patches.append("'media', " + first("p.document->'media'", limits.media, "pm", "pm"))
+        limit_room_media = "media" in include and limits.room_media is not None
+        if "rooms" in include and (limits.rooms is not None or limit_room_media):
+            room = "pr"
+            if limit_room_media:
+                room = "pr || jsonb_build_object('media', " + first("pr->'media'", limits.room_media, "rm", "rm") + ")"
+            patches.append("'rooms', " + first("p.document->'rooms'", limits.rooms, room, "pr"))
+        if not patches:
+            return "p.document"
+        return f"(p.document || jsonb_build_object({', '.join(patches)}))"
+
+    def _build_hotels_query(
+        self, criteria: SearchCriteria, cards: bool = False, limits: Optional[ChildLimits] = None
+    ) -> Tuple[str, List[str], Dict[str, Any], SearchSort]:
+        """
+        Ritorna (SELECT senza ORDER BY/LIMIT, ordinamento sugli alias di output, parametri, ordinamento effettivo).
+        Con cards=True legge property_search_cards (alias "p", stesse colonne di properties) e seleziona il documento,
+        tagliato in Postgres secondo limits (None = documento intero).
+        L'ordinamento usa solo alias di output (le colonne cursor_N della chiave keyset)
+        così vale sia sulla query diretta che sulla CTE "hotels" della strategia json.
+        params["limit"] è la dimensione pagina + 1: la riga in più dice se esiste una pagina successiva.
+        """
+        sql_hotels = """
+            SELECT p.id, p.name, p.address, p.city, p.country, p.description, p.created_at, p.status,
+                   p.latitude, p.longitude, {distance_column}, {score_column},
+                   p.min_room_price AS min_price, {cover_column} AS cover,
+                   u.id AS owner_id, u.name AS owner_name, u.email AS owner_email, {cursor_columns}
+            FROM properties p
+            JOIN users u ON p.owner_id = u.id
+            WHERE p.status = 'PUBLISHED'
+        """
+        if cards:
+            sql_hotels = """
+                SELECT {document_column} AS doc, {distance_column}, {score_column}, {cursor_columns}
+                FROM property_search_cards p
+                WHERE p.status = 'PUBLISHED'
+            """
+        params: Dict[str, Any] = {}
+
+        location = criteria.location.strip() if criteria.location else None
+        default_limit = self.SEARCH_LIMIT if location else self.BASE_LIMIT
+        params["limit"] = min(criteria.limit or default_limit, self.SEARCH_LIMIT) + 1
+
+        filters, rank = self._match_conditions(criteria, params, cards=cards)
+        has_point = "geo_lat" in params
+
+        # Il rank esiste solo con location in modalità full-text o trigram; con un punto di riferimento
+        # il default è la distanza, altrimenti si ripiega su NEWEST
+        default_sort = SearchSort.RELEVANCE if rank else SearchSort.DISTANCE if has_point else SearchSort.NEWEST
+        sort = criteria.sort or default_sort
+        if sort == SearchSort.RELEVANCE and not rank:
+            sort = SearchSort.NEWEST
+        if sort == SearchSort.DISTANCE and not has_point:
+            raise ValueError("Sorting by distance requires lat and lng")
+        key_columns, direction = SORT_KEYS[sort]
+        if sort == SearchSort.RELEVANCE:
+            key_columns = [rank] + key_columns
+        if sort == SearchSort.DISTANCE:
+            key_columns = [DISTANCE_SQL] + key_columns
+
+        # Le property senza stanze non hanno prezzo/capienza: non compaiono in questi ordinamenti
+        if sort in (SearchSort.PRICE, SearchSort.CAPACITY):
+            filters.append(f"{key_columns[0]} IS NOT NULL")
+        # ...e quelle senza coordinate non hanno distanza
+        if sort == SearchSort.DISTANCE:
+            filters.append("p.latitude IS NOT NULL AND p.longitude IS NOT NULL")
+
+        # KEYSET: riparte subito dopo l'ultima riga della pagina precedente
+        if criteria.cursor:
+            values = decode_cursor(sort, criteria.cursor, len(key_columns))
+            placeholders = []
+            for i, value in enumerate(values):
+                params[f"{CURSOR_COLUMN_PREFIX}{i}"] = value
+                placeholders.append(f":{CURSOR_COLUMN_PREFIX}{i}")
+            operator = "<" if direction == "DESC" else ">"
+            filters.append(f"({', '.join(key_columns)}) {operator} ({', '.join(placeholders)})")
+
+        for condition in filters:
+            sql_hotels += f" AND {condition}"
+
+        aliases = [f"{CURSOR_COLUMN_PREFIX}{i}" for i in range(len(key_columns))]
+        cursor_columns = ", ".join(f"{expr} AS {alias}" for expr, alias in zip(key_columns, aliases))
+        order_by = [f"{alias} {direction}" for alias in aliases]
+        distance_column = (
+            f"round(({DISTANCE_SQL} / 1000)::numeric, 2) AS distance_km" if has_point
+            else "NULL::numeric AS distance_km"
+        )
+        score_column = f"round(({rank})::numeric, 4)::float8 AS score" if rank else "NULL::float8 AS score"
+        # Card: il documento è già pronto, le collezioni non richieste si tolgono in Postgres (jsonb - text[])
+        document_column = self._card_document_sql(criteria.include, limits) if cards else "p.document"
+        if cards and criteria.include is not None:
+            params["document_exclude"] = sorted(PROPERTY_INCLUDES - criteria.include)
+            document_column = f"({document_column} - CAST(:document_exclude AS text[]))"
+        sql = sql_hotels.format(
+            cursor_columns=cursor_columns, distance_column=distance_column, score_column=score_column,
+            cover_column=COVER_MEDIA_SQL, document_column=document_column
+        )
+        return sql, order_by, params, sort
+
+    def _match_conditions(
+        self, criteria: SearchCriteria, params: Dict[str, Any], cards: bool = False
+    ) -> Tuple[List[str], Optional[str]]:
+        """
+        Condizioni (sulla tabella properties, alias "p") che decidono se un hotel è un risultato:
+        testo cercato + filtri facet. Ritorna anche l'espressione di rank (None senza testo o in modalità ilike).
+        Con cards=True "p" è property_search_cards: le amenities si filtrano sull'array amenity_ids.
+        """
+        conditions: List[str] = []
+        rank: Optional[str] = None
+        location = criteria.location.strip() if criteria.location else None
+
+        if location and self.text_mode == "ilike":
+            # Logica di ricerca semplice (seq scan: solo city e name hanno un indice)
+            params["loc"] = f"%{location}%"
+            conditions.append("(p.city ILIKE :loc OR p.name ILIKE :loc OR p.address ILIKE :loc OR p.country ILIKE :loc OR p.description ILIKE :loc)")
+
+        elif location and self.text_mode == "trigram":
+            # TRIGRAM: candidati dagli indici GIN dei 4 campi (BitmapOr, soglia pg_trgm.word_similarity_threshold),
+            # poi score = media pesata delle similarità. Con ORDER BY score LIMIT k Postgres tiene
+            # solo i k migliori (top-N heapsort) invece di ordinare tutti i candidati.
+            params["q"] = location
+            conditions.append("(" + " OR ".join(f":q <% p.{column}" for column, _ in TRIGRAM_WEIGHTS) + ")")
+            total = sum(weight for _, weight in TRIGRAM_WEIGHTS)
+            weighted = " + ".join(
+                f"{weight} * coalesce(word_similarity(:q, p.{column}), 0)" for column, weight in TRIGRAM_WEIGHTS
+            )
+            rank = f"(({weighted}) / {total:g})"
+
+        elif location:
+            # FULL-TEXT: un match vale se
+            # - le parole (con stemming italiano o inglese) sono nel tsvector (idx_properties_search_vector)
+            # - oppure il testo compare come sottostringa nel documento normalizzato (idx_properties_search_document_trgm),
+            #   così le ricerche parziali ("Rom", "Stars Ho") continuano a funzionare come con ILIKE.
+            # Postgres combina i due indici GIN con un BitmapOr.
+            tsquery = "(websearch_to_tsquery('italian', unaccent(:q)) || websearch_to_tsquery('english', unaccent(:q)))"
+            params["q"] = location
+            params["pattern"] = f"%{escape_like(normalize_search_term(location))}%"
+            conditions.append(f"(p.search_vector @@ {tsquery} OR p.search_document LIKE :pattern)")
+            rank = f"ts_rank_cd(p.search_vector, {tsquery})"
+
+        # GEO: raggio attorno al punto e/o bounding box della mappa
+        conditions.extend(self._geo_conditions(criteria, params))
+
+        # FACET: amenities della property (tutte quelle richieste)
+        # Con l'indice bitmap è un AND tra interi in memoria; altrimenti semi-join
+        # sull'indice (amenity_id, property_id) del link: niente join sull'intero grafo.
+        if criteria.property_amenity_ids and self._use_amenity_index():
+            params["property_amenity_ids"] = self.amenity_index.properties_with_all(criteria.property_amenity_ids)
+            conditions.append("p.id = ANY(:property_amenity_ids)")
+        elif criteria.property_amenity_ids and cards:
+            # Contenimento tra array, servito da idx_search_cards_amenity_ids (GIN)
+            params["property_amenity_ids"] = list(set(criteria.property_amenity_ids))
+            conditions.append("p.amenity_ids @> CAST(:property_amenity_ids AS text[])")
+        elif criteria.property_amenity_ids:
+            params["property_amenity_ids"] = list(set(criteria.property_amenity_ids))
+            params["property_amenity_count"] = len(params["property_amenity_ids"])
+            conditions.append("""p.id IN (
+                SELECT pal.property_id FROM property_amenities_link pal
+                WHERE pal.amenity_id = ANY(:property_amenity_ids)
+                GROUP BY pal.property_id
+                HAVING count(*) = :property_amenity_count
+            )""")
+
+        # FACET: almeno una stanza che rispetta tutti i filtri di stanza
+        room_conditions = self._room_conditions(criteria, params)
+        if room_conditions:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM rooms r WHERE r.property_id = p.id AND "
+                + " AND ".join(room_conditions) + ")"
+            )
+
+        return conditions, rank
+
+    def _geo_conditions(self, criteria: SearchCriteria, params: Dict[str, Any]) -> List[str]:
+        """
+        Filtri geografici sulla property (alias "p"). Un punto (lat/lng) serve a raggio e distanza.
+        Solleva ValueError se i parametri sono incompleti.
+        """
+        conditions: List[str] = []
+        if (criteria.latitude is None) != (criteria.longitude is None):
+            raise ValueError("lat and lng must be given together")
+        if criteria.latitude is not None:
+            params["geo_lat"] = criteria.latitude
+            params["geo_lng"] = criteria.longitude
+
+        if criteria.radius_km is not None:
+            if "geo_lat" not in params:
+                raise ValueError("radius_km requires lat and lng")
+            params["radius_m"] = float(criteria.radius_km) * 1000
+            # earth_box usa l'indice GiST (idx_properties_published_earth) ma è un cubo:
+            # earth_distance scarta gli angoli fuori dal cerchio
+            conditions.append(
+                f"earth_box({GEO_POINT_SQL}, :radius_m) @> ll_to_earth(p.latitude, p.longitude)"
+                f" AND {DISTANCE_SQL} <= :radius_m"
+            )
+
+        bbox = (criteria.bbox_west, criteria.bbox_south, criteria.bbox_east, criteria.bbox_north)
+        if any(v is not None for v in bbox):
+            if any(v is None for v in bbox):
+                raise ValueError("bbox needs west, south, east and north")
+            params["bbox_west"], params["bbox_south"], params["bbox_east"], params["bbox_north"] = bbox
+            conditions.append("p.latitude BETWEEN :bbox_south AND :bbox_north")
+            # Box a cavallo dell'antimeridiano (west > east): due intervalli di longitudine
+            if criteria.bbox_west <= criteria.bbox_east:
+                conditions.append("p.longitude BETWEEN :bbox_west AND :bbox_east")
+            else:
+                conditions.append("(p.longitude >= :bbox_west OR p.longitude <= :bbox_east)")
+        return conditions
+
+    def _room_conditions(self, criteria: SearchCriteria, params: Dict[str, Any]) -> List[str]:
+        """
+        Filtri facet sulla singola stanza (alias "r"). Servono sia per scegliere gli hotel (EXISTS)
+        sia per restituire solo le stanze che l'utente vedrà davvero.
+        """
+        conditions: List[str] = []
+        if criteria.min_price is not None:
+            params["min_price"] = criteria.min_price
+            conditions.append("r.price >= :min_price")
+        if criteria.max_price is not None:
+            params["max_price"] = criteria.max_price
+            conditions.append("r.price <= :max_price")
+        if criteria.min_capacity is not None:
+            params["min_capacity"] = criteria.min_capacity
+            conditions.append("r.capacity >= :min_capacity")
+        if criteria.room_type is not None:
+            params["room_type"] = criteria.room_type.value
+            conditions.append("r.type = :room_type")
+        if criteria.room_amenity_ids and self._use_amenity_index():
+            params["room_amenity_ids"] = self.amenity_index.rooms_with_all(criteria.room_amenity_ids)
+            conditions.append("r.id = ANY(:room_amenity_ids)")
+        elif criteria.room_amenity_ids:
+            params["room_amenity_ids"] = list(set(criteria.room_amenity_ids))
+            params["room_amenity_count"] = len(params["room_amenity_ids"])
+            conditions.append("""r.id IN (
+                SELECT ral.room_id FROM room_amenities_link ral
+                WHERE ral.amenity_id = ANY(:room_amenity_ids)
+                GROUP BY ral.room_id
+                HAVING count(*) = :room_amenity_count
+            )""")
+        return conditions
+
+    def _use_amenity_index(self) -> bool:
+        return self.amenity_index is not None and self.amenity_index.loaded
+
+    def _paginate(self, rows: Sequence[Any], page_size: int, sort: SearchSort) -> Tuple[Sequence[Any], Optional[str]]:
+        """
+        Taglia la riga in più chiesta alla query e, se c'era, costruisce il cursore
+        dalla chiave keyset dell'ultima riga della pagina.
+        """
+        if len(rows) <= page_size:
+            return rows, None
+        rows = rows[:page_size]
+        last = rows[-1]
+        values = [last[k] for k in last.keys() if k.startswith(CURSOR_COLUMN_PREFIX)]
+        return rows, encode_cursor(sort, values)
+
+    def _assemble(
+        self,
+        hotels: Sequence[Any],
+        rooms: Sequence[Any],
+        media: Sequence[Any],
+        h_amenities: Sequence[Any],
+        r_amenities: Sequence[Any],
+        include: AbstractSet[str] = PROPERTY_INCLUDES
+    ) -> List[Dict[str, Any]]:
+        # -----------------------------
+        # Data Assembly (Manual Mapping)
+        # -----------------------------
+
+        # Mappa Hotel
+        hotels_map = {}
+        for h in hotels:
+            # Le colonne cursor_N servono solo per l'ordinamento/paginazione
+            h_dict = {k: v for k, v in h.items() if not k.startswith(CURSOR_COLUMN_PREFIX)}
+            h_dict["rooms"] = []
+            h_dict["media"] = []
+            h_dict["amenities"] = []
+            # Totali (le liste possono esserne solo una parte, vedi SEARCH_MAX_*)
+            h_dict["room_count"] = 0
+            h_dict["media_count"] = 0
+            # Struttura Owner
+            h_dict["owner"] = {
+                "id": h_dict.pop("owner_id"),
+                "name": h_dict.pop("owner_name"),
+                "email": h_dict.pop("owner_email")
+            }
+            hotels_map[h_dict["id"]] = h_dict
+
+        # Mappa Stanze
+        rooms_map = {}
+        for r in rooms:
+            r_dict = dict(r)
+            total = r_dict.pop("total")
+            r_dict["amenities"] = []
+            r_dict["media"] = [] # Inizializza lista media per la stanza
+            r_dict["media_count"] = 0
+            rooms_map[r_dict["id"]] = r_dict
+
+            # Collega stanza all'hotel
+            if r_dict["property_id"] in hotels_map:
+                hotels_map[r_dict["property_id"]]["rooms"].append(r_dict)
+                hotels_map[r_dict["property_id"]]["room_count"] = total
+
+        # Mappa Media
+        for m in media:
+            m_dict = dict(m)
+            total = m_dict.pop("total")
+            # Se il media ha un room_id ed esiste nella mappa stanze, mettilo lì
+            if m_dict.get("room_id") and m_dict["room_id"] in rooms_map:
+                rooms_map[m_dict["room_id"]]["media"].append(m_dict)
+                rooms_map[m_dict["room_id"]]["media_count"] = total
+            # Altrimenti, se appartiene alla property, mettilo lì
+            elif m_dict["property_id"] in hotels_map:
+                hotels_map[m_dict["property_id"]]["media"].append(m_dict)
+                hotels_map[m_dict["property_id"]]["media_count"] = total
+
+        # Mappa Amenities Property (Con i nuovi campi)
+        for a in h_amenities:
+            if a["property_id"] in hotels_map:
+                hotels_map[a["property_id"]]["amenities"].append({
+                    "id": a["id"],
+                    "name": a["name"],
+                    "category": a["category"],
+                    "description": a["description"],
+                    "custom_description": a["custom_description"],
+                    "is_global": a["is_global"]
+                })
+
+        # Mappa Amenities Rooms (Con i nuovi campi)
+        for a in r_amenities:
+            if a["room_id"] in rooms_map:
+                rooms_map[a["room_id"]]["amenities"].append({
+                    "id": a["id"],
+                    "name": a["name"],
+                    "category": a["category"],
+                    "description": a["description"],
+                    "custom_description": a["custom_description"],
+                    "is_global": a["is_global"]
+                })
+
+        # Via le chiavi delle collezioni non richieste (stessa forma della strategia json)
+        excluded = PROPERTY_INCLUDES - include
+        if "media" in excluded:
+            excluded = excluded | {"media_count"}
+        if "rooms" in excluded:
+            excluded = excluded | {"room_count"}
+        for r_dict in rooms_map.values():
+            for key in excluded:
+                r_dict.pop(key, None)
+        for h_dict in hotels_map.values():
+            for key in excluded:
+                h_dict.pop(key, None)
+
+        return list(hotels_map.values())
+
+
+class AsyncSearchRepository(SearchRepository):
+    """
+    Stessa SearchRepository su AsyncSession (asyncpg): stesse query (i piani di query sono condivisi),
+    ma l'attesa del DB non occupa un thread del threadpool. Usata dalle rotte GET async;
+    l'export (cursore lato server + StreamingResponse) resta su SearchRepository.
+    """
+
+    def __init__(self, db: "AsyncSession", **kwargs):
+        super().__init__(db, **kwargs)
+
+    async def search_properties(self, criteria: Optional[SearchCriteria] = None) -> SearchPage:
+        try:
+            return await self._run_async(self._search_plan(criteria or SearchCriteria()))
         except Exception as e:
             print(f"Database Error in SearchRepository: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    async def facet_counts(self, criteria: Optional[SearchCriteria] = None) -> Dict[str, Any]:
+        try:
+            return await self._run_async(self._facets_plan(criteria or SearchCriteria()))
+        except Exception as e:
+            print(f"Database Error in SearchRepository: {e}")
+            raise e
+
+    async def published_suggest_rows(self) -> List[Dict[str, Any]]:
+        return await self._run_async(self._suggest_rows_plan())
+
+    async def _run_async(self, plan: QueryPlan) -> Any:
+        try:
+            sql, params = next(plan)
+            while True:
+                result = await self.db.execute(text(sql), params)
+                sql, params = plan.send(result.mappings().all())
+        except StopIteration as done:
+            return done.value
@@ -1,4 +1,5 @@
 import uuid
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from app.models import models
 from app.domain import entities
@@ -13,17 +14,23 @@ class UserRepository:
         return mappers.to_domain_user(model) if model else None
 
     def create_from_cognito(self, cognito_uuid: str, email: str, name: str) -> entities.User:
+        """
+        Upsert in un solo statement: INSERT ... ON CONFLICT (cognito_uuid) DO NOTHING RETURNING.
+        Due richieste concorrenti dello stesso utente nuovo non falliscono più sul vincolo UNIQUE:
+        quella che perde non riceve righe e rilegge l'utente creato dall'altra.
+        """
         # Generiamo un ID interno per il DB
         internal_id = str(uuid.uuid4())
-        
-        user_model = models.UserModel(
-            id=internal_id,
-            cognito_uuid=cognito_uuid,
-            email=email,
-            name=name
+
+        stmt = (
+            insert(models.UserModel)
+            .values(id=internal_id, cognito_uuid=cognito_uuid, email=email, name=name)
+            .on_conflict_do_nothing(index_elements=[models.UserModel.cognito_uuid])
+            .returning(models.UserModel.id, models.UserModel.name, models.UserModel.email, models.UserModel.cognito_uuid)
         )
-        self.db.add(user_model)
+        row = self.db.execute(stmt).mappings().first()
         self.db.commit()
-        self.db.refresh(user_model)
-        
-        return mappers.to_domain_user(user_model)
\ No newline at end of file
+
+        if row is None:
+            return self.get_by_cognito_id(cognito_uuid)
+        return entities.User(**row)
@@ -1,28 +1,56 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
+from pydantic import TypeAdapter
 from typing import List
 from app import schemas
 from app import dependencies as deps
+from app.catalog_cache import CatalogCache, CatalogSnapshot, etag_matches
+from app.config import settings
 from app.repositories.amenity_repository import PropertyAmenityRepository, RoomAmenityRepository
 
 router = APIRouter(prefix="/api/amenities", tags=["amenities"])
 
+# Serializzazione del catalogo (una volta per versione, poi si serve il JSON in cache)
+AMENITY_LIST = TypeAdapter(List[schemas.AmenityOutput])
+
 # dovremmo usare un service, ma per ora sono solo letture semplici
 @router.get("/property", response_model=List[schemas.AmenityOutput])
 def get_property_amenities_catalog(
-    repo: PropertyAmenityRepository = Depends(deps.get_property_amenity_repo)
+    request: Request,
+    repo: PropertyAmenityRepository = Depends(deps.get_property_amenity_repo),
+    catalogs: CatalogCache = Depends(deps.get_amenity_catalogs)
 ):
     """
     Returns the global catalog of property amenities (e.g., WiFi, Pool).
     Used in property management.
+    Served from memory with an ETag: send If-None-Match to get a 304 when unchanged.
     """
-    return repo.get_all()
+    snapshot = catalogs.get("property", lambda: AMENITY_LIST.dump_json(repo.get_all()))
+    return _catalog_response(request, snapshot)
 
 @router.get("/room", response_model=List[schemas.AmenityOutput])
 def get_room_amenities_catalog(
-    repo: RoomAmenityRepository = Depends(deps.get_room_amenity_repo)
+    request: Request,
+    repo: RoomAmenityRepository = Depends(deps.get_room_amenity_repo),
+    catalogs: CatalogCache = Depends(deps.get_amenity_catalogs)
 ):
     """
     Returns the global catalog of room amenities (e.g., TV, Mini-bar).
     Used in room management.
+    Served from memory with an ETag: send If-None-Match to get a 304 when unchanged.
     """
-    return repo.get_all()
\ No newline at end of file
+    snapshot = catalogs.get("room", lambda: AMENITY_LIST.dump_json(repo.get_all()))
+    return _catalog_response(request, snapshot)
+
+# =================================================================
+# HELPER PRIVATI
+# =================================================================
+
+def _catalog_response(request: Request, snapshot: CatalogSnapshot) -> Response:
+    # I client tengono il catalogo max-age secondi, poi rivalidano: se non è cambiato 304 senza corpo
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": f"public, max-age={settings.AMENITY_CATALOG_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.db import engine, get_db
+from app.db_pool import pool_metrics
+from app.db_replicas import replica_router
+from app.search.cache import search_cache
+from app.dependencies import require_internal_token, user_cache
+from app.catalog_cache import amenity_catalogs
+from app.search.amenity_index import amenity_index
+from app.search.suggest import suggest_index
+from app.search.engine import search_engine
+
+# Endpoint interni di osservabilità (metriche per processo).
+# Montati solo con INTERNAL_API_TOKEN impostato e accessibili solo con l'header X-Internal-Token.
+router = APIRouter(prefix="/internal", tags=["internal"], dependencies=[Depends(require_internal_token)])
+
+@router.get("/db-pool")
+def get_db_pool_stats():
+    """
+    Connection pool state (size, checked out, overflow) and checkout counters since start
+    or last reset: connection wait time histogram and QueuePool timeouts (this worker only).
+    """
+    return pool_metrics.stats(engine.pool)
+
+@router.post("/db-pool/reset")
+def reset_db_pool_stats():
+    """
+    Reset the checkout counters and the wait time histogram (e.g. before a load test).
+    """
+    pool_metrics.reset()
+    return pool_metrics.stats(engine.pool)
+
+@router.get("/db-replicas")
+def get_db_replicas_stats():
+    """
+    Read replicas: last measured lag, health, connection pool stats, and how many reads
+    went to a replica or fell back to the primary (none healthy / too soon after a write).
+    """
+    return replica_router.stats()
+
+@router.get("/search-cache")
+def get_search_cache_stats():
+    """
+    Hit/miss counters, size and evictions of the search result cache (this worker only).
+    """
+    return search_cache.stats()
+
+@router.get("/user-cache")
+def get_user_cache_stats():
+    """
+    Hit/miss counters and size of the authenticated user cache (this worker only).
+    """
+    return user_cache.stats()
+
+@router.get("/amenity-catalogs")
+def get_amenity_catalogs_stats():
+    """
+    Versions, ETags and sizes of the in-memory amenity catalogs (this worker only).
+    """
+    return amenity_catalogs.stats()
+
+@router.get("/amenity-index")
+def get_amenity_index_stats():
+    """
+    Size, memory usage and last rebuild timing of the amenity bitmap index (this worker only).
+    """
+    return amenity_index.stats()
+
+@router.post("/amenity-index/rebuild")
+def rebuild_amenity_index(db: Session = Depends(get_db)):
+    """
+    Rebuild the amenity bitmap index from the link tables and compact freed slots.
+    """
+    amenity_index.rebuild(db)
+    return amenity_index.stats()
+
+@router.get("/suggest-index")
+def get_suggest_index_stats():
+    """
+    Size and last rebuild timing of the autocomplete index (this worker only).
+    """
+    return suggest_index.stats()
+
+@router.get("/search-engine")
+def get_search_engine_stats():
+    """
+    Size, memory usage per structure, rebuild timing and incremental updates of the
+    in-process search engine (this worker only).
+    """
+    return search_engine.stats()
+
+@router.post("/search-engine/rebuild")
+def rebuild_search_engine(db: Session = Depends(get_db)):
+    """
+    Rebuild the in-process search engine from a snapshot of property_search_cards.
+    """
+    search_engine.rebuild(db)
+    return search_engine.stats()
+
+@router.get("/search-engine/check")
+def check_search_engine(db: Session = Depends(get_db)):
+    """
+    Compare the documents held by this worker's search engine with property_search_cards.
+    """
+    return search_engine.check(db)
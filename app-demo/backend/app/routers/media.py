@@ -2,19 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from app.schemas import MediaInput, MediaData
 from app.services.media_service import MediaService
 from app import dependencies as deps
+from app.serialization import json_response
 from app.domain.entities import User
 
 router = APIRouter(prefix="/api/media", tags=["media"])
 
 @router.get("/all", response_model=list[MediaData])
 def list_all_media(
-    service: MediaService = Depends(deps.get_media_service)
+    service: MediaService = Depends(deps.get_read_media_service)
 ):
     """
     List all media in the system.
     Does not require authentication.
     """
-    return service.list_all_media()
+    return json_response(list[MediaData], service.list_all_media())
 
 @router.post("/", response_model=MediaData, status_code=status.HTTP_201_CREATED)
 def upload_media(
@@ -61,7 +62,7 @@ def delete_media(
 @router.get("/{media_id}", response_model=MediaData)
 def get_media(
     media_id: str,
-    service: MediaService = Depends(deps.get_media_service)
+    service: MediaService = Depends(deps.get_read_media_service)
 ):
     """
     Fetch media details by ID.
@@ -75,22 +76,22 @@ def get_media(
 @router.get("/property/{property_id}", response_model=list[MediaData])
 def list_media_by_property(
     property_id: str,
-    service: MediaService = Depends(deps.get_media_service)
+    service: MediaService = Depends(deps.get_read_media_service)
 ):
     """
     List all media linked to a specific Property.
     Does not require authentication.
     """
-    return service.list_media_by_property(property_id)
+    return json_response(list[MediaData], service.list_media_by_property(property_id))
 
 @router.get("/room/{room_id}", response_model=list[MediaData])
 def list_media_by_room(
     room_id: str,
-    service: MediaService = Depends(deps.get_media_service)
+    service: MediaService = Depends(deps.get_read_media_service)
 ):
     """
     List all media linked to a specific Room.
     Does not require authentication.
     """
-    return service.list_media_by_room(room_id)
+    return json_response(list[MediaData], service.list_media_by_room(room_id))
 
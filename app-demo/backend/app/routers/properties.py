@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from app.schemas import PropertyInput, PropertyData, RoomInput, RoomData
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from typing import FrozenSet, List, Literal, Optional
+from app.schemas import ImportProgress, PropertyInput, PropertyData, RoomInput, RoomData, include_exclude
 from app import dependencies as deps
+from app.config import settings
+from app.serialization import dump_json, negotiated_response
 from app.domain.entities import User
-from app.services.property_service import PropertyService
-from app.services.room_service import RoomService
+from app.services.property_service import AsyncPropertyService, PropertyService
+from app.services.room_service import AsyncRoomService, RoomService
+from app.services.import_service import ImportService, read_source
+from app.services.export_service import EXPORT_MEDIA_TYPES, ExportService
 
 router = APIRouter(prefix="/api/properties", tags=["properties"])
 
@@ -21,50 +26,104 @@ def create_property(
     
     return service.create_property(data=payload, owner=current_user)
 
+@router.post("/import", response_class=StreamingResponse)
+async def import_properties(
+    request: Request,
+    service: ImportService = Depends(deps.get_import_service),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Bulk import of properties (with rooms and amenities) owned by the current user, created as DRAFT.
+    Body: NDJSON, one PropertyImport per line, or CSV (Content-Type: text/csv), one room per row
+    with the property columns repeated; consecutive rows with the same ref are one property.
+    Amenities are given by name: existing ones are linked, missing ones are created.
+    Rows are validated and saved in chunks, one transaction per chunk. The response streams one
+    ImportProgress per chunk as NDJSON (with the rejected rows and why), then a final one with done=true.
+    """
+    fmt = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    rows = read_source(await request.body(), fmt)
+    progress = service.import_rows(rows, current_user, max_rows=settings.IMPORT_MAX_ROWS)
+
+    # Il lavoro avviene mentre si scrive la risposta: il client vede l'avanzamento chunk per chunk
+    def lines():
+        for item in progress:
+            yield dump_json(ImportProgress, item) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.get("/mine", response_model=List[PropertyData])
-def get_my_properties(
-    service: PropertyService = Depends(deps.get_property_service),
+async def get_my_properties(
+    request: Request,
+    include: Optional[FrozenSet[str]] = Depends(deps.get_include),
+    service: AsyncPropertyService = Depends(deps.get_async_property_service),
     current_user: User = Depends(deps.get_current_user)
 ):
     
     """
     Returns all properties owned by the current user.
+    include limits the child collections (rooms, media, amenities) that are loaded and returned.
     """
     
-    return service.get_user_properties(owner=current_user)
+    properties = await service.get_user_properties(owner=current_user, include=include)
+    return negotiated_response(request, List[PropertyData], properties, exclude=include_exclude(include))
+
+@router.get("/mine/export", response_class=StreamingResponse)
+def export_my_properties(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="ndjson: one PropertyData per line; csv: one row per room"),
+    service: ExportService = Depends(deps.get_export_service),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Download every property of the current user with rooms, amenities and media, as NDJSON or CSV.
+    Properties are read in keyset-ordered pages and written as they are loaded, so memory stays flat
+    whatever the portfolio size. Both formats can be loaded back with POST /api/properties/import.
+    """
+    return StreamingResponse(
+        service.export(current_user.id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="properties.{format}"'}
+    )
 
 @router.get("/{property_id}", response_model=PropertyData)
-def get_property_details(
+async def get_property_details(
+    request: Request,
     property_id: str,
-    service: PropertyService = Depends(deps.get_property_service)
+    include: Optional[FrozenSet[str]] = Depends(deps.get_include),
+    service: AsyncPropertyService = Depends(deps.get_async_property_service)
 ):
     
     """
     Returns the details of a specific property by its ID.
+    include limits the child collections (rooms, media, amenities) that are loaded and returned.
     """
     
-    return service.get_property_by_id(property_id)
+    prop = await service.get_property_by_id(property_id, include=include)
+    return negotiated_response(request, PropertyData, prop, exclude=include_exclude(include))
 
 # get by owner_id. useful for testing via /docs
 @router.get("/owner/{owner_id}", response_model=List[PropertyData])
-def get_properties_by_owner(
+async def get_properties_by_owner(
+    request: Request,
     owner_id: str,
-    service: PropertyService = Depends(deps.get_property_service)
+    service: AsyncPropertyService = Depends(deps.get_async_property_service)
 ):
     """
     Returns all properties owned by a specific owner ID.
     """
-    return service.get_user_properties(owner_id=owner_id, owner=None)
+    properties = await service.get_user_properties(owner_id=owner_id, owner=None)
+    return negotiated_response(request, List[PropertyData], properties)
 
 @router.get("/{property_id}/rooms", response_model=List[RoomData])
-def get_rooms_for_property(
+async def get_rooms_for_property(
+    request: Request,
     property_id: str,
-    service: RoomService = Depends(deps.get_room_service)
+    service: AsyncRoomService = Depends(deps.get_async_room_service)
 ):
     """
     Fetch all rooms for a specific property.
     """
-    return service.get_rooms_by_property_id(property_id=property_id)
+    rooms = await service.get_rooms_by_property_id(property_id=property_id)
+    return negotiated_response(request, List[RoomData], rooms)
 
 @router.post("/{property_id}/publish", response_model=PropertyData)
 def publish_property(
@@ -140,4 +199,19 @@ def add_room_to_property(
     2. Create the room associated with that property.
     3. Return the created room data.
     """
-    return room_service.add_room(property_id=property_id, data=payload, owner=current_user)
\ No newline at end of file
+    return room_service.add_room(property_id=property_id, data=payload, owner=current_user)
+
+@router.post("/{property_id}/rooms/batch", response_model=List[RoomData], status_code=status.HTTP_201_CREATED)
+def add_rooms_to_property(
+    property_id: str,
+    payload: List[RoomInput],
+    room_service: RoomService = Depends(deps.get_room_service),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Add many rooms to a property owned by the current user, in one transaction.
+    Same body as the single-room endpoint, as a list. Existing amenities are checked in one
+    query; new amenities reuse an existing one with the same name. Media ids that are unknown
+    or already attached elsewhere are ignored. Returns the created rooms in request order.
+    """
+    return room_service.add_rooms(property_id=property_id, data=payload, owner=current_user)
@@ -2,21 +2,21 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from app import schemas
 from app import dependencies as deps
 from app.domain.entities import User
-from app.services.room_service import RoomService 
+from app.services.room_service import AsyncRoomService, RoomService
 
 # gli URL saranno tipo: PUT /api/rooms/{room_id}
 router = APIRouter(prefix="/api/rooms", tags=["rooms"])
 
 @router.get("/{room_id}", response_model=schemas.RoomData)
-def get_room_details(
+async def get_room_details(
     room_id: str,
-    service: RoomService = Depends(deps.get_room_service)
+    service: AsyncRoomService = Depends(deps.get_async_room_service)
 ):
     """
     Fetch room details by ID.
     Does not require authentication.
     """
-    return service.get_room(room_id)
+    return await service.get_room(room_id)
 
 
 @router.put("/{room_id}", response_model=schemas.RoomData)
@@ -1,27 +1,138 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+import dataclasses
+from typing import FrozenSet, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.params import Header
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import Session
 from app.config import settings
 from app.domain import entities
 from app import dependencies as deps
-from app.services.search_service import SearchService
-from app.schemas import PropertySearchResponse
+from app.domain.search import SearchCriteria, SearchSort
+from app.domain.entities import RoomType
+from app.services.search_service import AsyncSearchService, SearchService
+from app.schemas import PropertySearchResponse, SearchFacetsResponse, SearchSuggestion, include_exclude
+from app.serialization import dump_json, negotiated_response
 
 router = APIRouter(prefix="/api/search", tags=["search"])
-        
-@router.get("/", response_model=List[PropertySearchResponse])
-def search_properties(
+
+# Filtri comuni a risultati e facet
+def search_filters(
     location: Optional[str] = Query(None),
-    service: SearchService = Depends(deps.get_search_service),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    guests: Optional[int] = Query(None, ge=1, description="At least one room with this capacity"),
+    room_type: Optional[RoomType] = Query(None),
+    property_amenities: List[str] = Query([], description="Property amenity ids (all required)"),
+    room_amenities: List[str] = Query([], description="Room amenity ids (all required on the same room)"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Reference point latitude (radius and distance sort)"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="Reference point longitude"),
+    radius_km: Optional[float] = Query(None, gt=0, le=20000, description="Only properties within this distance from lat/lng"),
+    bbox: Optional[str] = Query(None, description="Map bounding box: west,south,east,north (decimal degrees)")
+) -> SearchCriteria:
+    bbox_values = [None] * 4
+    if bbox:
+        try:
+            bbox_values = [float(v) for v in bbox.split(",")]
+        except ValueError:
+            bbox_values = []
+        if len(bbox_values) != 4:
+            raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+
+    return SearchCriteria(
+        location=location,
+        min_price=min_price,
+        max_price=max_price,
+        min_capacity=guests,
+        room_type=room_type,
+        property_amenity_ids=property_amenities,
+        room_amenity_ids=room_amenities,
+        latitude=lat,
+        longitude=lng,
+        radius_km=radius_km,
+        bbox_west=bbox_values[0],
+        bbox_south=bbox_values[1],
+        bbox_east=bbox_values[2],
+        bbox_north=bbox_values[3]
+    )
+
+@router.get("/", response_model=List[PropertySearchResponse])
+async def search_properties(
+    request: Request,
+    filters: SearchCriteria = Depends(search_filters),
+    sort: Optional[SearchSort] = Query(None, description="relevance (default with location), distance (default with lat/lng), newest, price, capacity"),
+    cursor: Optional[str] = Query(None, description="Opaque token from the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=50, description="Page size"),
+    include: Optional[FrozenSet[str]] = Depends(deps.get_include),
+    service: AsyncSearchService = Depends(deps.get_async_search_service),
     user: Optional[entities.User] = Depends(deps.get_optional_user)
 ):
+    """
+    Search published properties.
+    Facet filters are applied in the database and only matching rooms are returned.
+    With lat/lng each result carries distance_km; radius_km and bbox restrict the area.
+    Results are paginated with a keyset cursor: when more results exist,
+    the X-Next-Cursor response header carries the token for the next page.
+    include limits the child collections (rooms, media, amenities): the others are neither
+    queried nor returned. min_price and cover are always there for result cards.
+    Send Accept: application/msgpack for a MessagePack body with the same content.
+    """
     # Log opzionale
     caller = user.email if user else "Guest"
-    print(f"Search performed by: {caller} [Location: {location}]")
+    print(f"Search performed by: {caller} [Location: {filters.location}]")
 
     # Chiamata al service (che chiama il repo SQL)
-    results = service.search(location)
-    
-    return results
\ No newline at end of file
+    criteria = dataclasses.replace(filters, sort=sort, cursor=cursor, limit=limit, include=include)
+    page = await service.search(criteria)
+
+    headers = {"X-Next-Cursor": page.next_cursor} if page.next_cursor else {}
+
+    # Serializzazione in un passaggio (TypeAdapter in cache); con include= le collezioni
+    # escluse non vanno nemmeno serializzate (niente liste vuote)
+    return negotiated_response(request, List[PropertySearchResponse], page.items, exclude=include_exclude(include), headers=headers)
+
+@router.get("/export", response_class=StreamingResponse)
+def export_properties(
+    filters: SearchCriteria = Depends(search_filters),
+    sort: Optional[SearchSort] = Query(None, description="Same as the search; newest when omitted"),
+    include: Optional[FrozenSet[str]] = Depends(deps.get_include),
+    service: SearchService = Depends(deps.get_search_service)
+):
+    """
+    Export every matching published property as NDJSON (one PropertySearchResponse per line),
+    for partner feeds and admin exports. Not paginated: rows are read from a server-side cursor
+    and written as they arrive, so memory stays bounded whatever the result size.
+    """
+    documents = service.export(dataclasses.replace(filters, sort=sort, include=include))
+    exclude = include_exclude(include)
+
+    # Validazione e serializzazione un hotel alla volta (stesso schema della search)
+    def lines():
+        for doc in documents:
+            yield dump_json(PropertySearchResponse, doc, exclude) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/facets", response_model=SearchFacetsResponse)
+async def search_facets(
+    filters: SearchCriteria = Depends(search_filters),
+    service: AsyncSearchService = Depends(deps.get_async_search_service)
+):
+    """
+    Facet counts for the same filters as the search: total matching properties,
+    price range of matching rooms and number of properties per room type / amenity.
+    """
+    return await service.facets(filters)
+
+@router.get("/suggest", response_model=List[SearchSuggestion])
+async def search_suggest(
+    q: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far"),
+    limit: int = Query(8, ge=1, le=20),
+    service: AsyncSearchService = Depends(deps.get_async_search_service)
+):
+    """
+    Autocomplete for the search box: ranked completions over city, country and name
+    of published properties, with a fuzzy (trigram) fallback for typos.
+    Served from an in-memory index, without querying the database.
+    """
+    return await service.suggest(q, limit)
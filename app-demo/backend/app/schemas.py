@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import AbstractSet, Any, Dict, List, Optional
 from enum import Enum
 from datetime import date
 from app.domain.entities import PropertyStatus, RoomType, MediaType
@@ -81,6 +81,9 @@ class _PropertyBase(BaseModel):
     city: str
     country: str
     description: str
+    # Posizione (gradi decimali): serve alla ricerca per raggio / mappa
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class PropertyInput(_PropertyBase):
     amenities: List[AmenityLinkInput] = []
@@ -98,18 +101,112 @@ class PropertyData(_PropertyBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# ==========================================
+# IMPORT MASSIVO
+# ==========================================
+class AmenityImport(BaseModel):
+    # Amenity per nome: "WiFi" oppure {"name": "Sauna", "category": "Wellness"}
+    name: str = Field(..., min_length=1)
+    category: Optional[str] = None
+    description: Optional[str] = None
+    custom_description: Optional[str] = None
+
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_name(cls, value: Any) -> Any:
+        return {"name": value} if isinstance(value, str) else value
+
+class RoomImport(_RoomBase):
+    amenities: List[AmenityImport] = []
+
+class PropertyImport(_PropertyBase):
+    # Riferimento libero della riga (es. codice dell'hotel nel gestionale), ripetuto negli errori
+    ref: Optional[str] = None
+    amenities: List[AmenityImport] = []
+    rooms: List[RoomImport] = []
+
+class ImportRowError(BaseModel):
+    line: int
+    ref: Optional[str] = None
+    errors: List[Dict[str, Any]]
+
+class ImportProgress(BaseModel):
+    chunk: int
+    processed: int              # righe lette finora
+    imported: int               # properties salvate finora
+    rooms: int                  # stanze salvate finora
+    failed: int                 # righe scartate finora
+    created_amenities: int      # amenities create finora (nomi non trovati nel catalogo)
+    property_ids: List[str] = []            # properties salvate da questo chunk
+    errors: List[ImportRowError] = []       # righe scartate da questo chunk
+    done: bool = False
+
 class OwnerSummary(BaseModel):
     id: str
     name: str
     email: str
 
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceRange(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class SearchFacetsResponse(BaseModel):
+    total: int
+    price: PriceRange
+    room_types: List[FacetCount] = []
+    property_amenities: List[FacetCount] = []
+    room_amenities: List[FacetCount] = []
+
+class SearchSuggestion(BaseModel):
+    value: str
+    kind: str                          # city | country | property
+    property_id: Optional[str] = None  # solo per kind = property
+    count: int                         # properties pubblicate con quel valore
+
+class SearchRoomData(RoomData):
+    media_count: Optional[int] = None    # foto della stanza in totale (media può esserne solo una parte)
+
 class PropertySearchResponse(_PropertyBase):
     id: str
     status: PropertyStatus
     owner: OwnerSummary 
+    distance_km: Optional[float] = None  # solo se la ricerca ha un punto di riferimento (lat/lng)
+    score: Optional[float] = None        # rilevanza rispetto al testo cercato (solo con location)
+    # Riassunto per le card dei risultati: sempre presenti, anche senza rooms/media in include
+    min_price: Optional[float] = None    # prezzo della stanza più economica
+    cover: Optional[MediaData] = None    # prima foto della property
+    # La search restituisce al massimo SEARCH_MAX_ROOMS stanze e SEARCH_MAX_MEDIA foto:
+    # i totali dicono alla UI se c'è altro da caricare
+    room_count: Optional[int] = None     # stanze che rispettano i filtri
+    media_count: Optional[int] = None
     
     amenities: List[AmenityOutput] = [] 
-    rooms: List[RoomData] = []
+    rooms: List[SearchRoomData] = []
     media: List[MediaData] = []
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+def include_exclude(include: Optional[AbstractSet[str]]) -> Optional[Dict[str, Any]]:
+    """
+    Spec di exclude (pydantic) per le collezioni figlie non richieste con include=
+    (PropertyData / PropertySearchResponse). None = include tutto, niente da escludere.
+    """
+    if include is None:
+        return None
+    exclude: Dict[str, Any] = {name: True for name in ("rooms", "media", "amenities") if name not in include}
+    room_exclude = {name for name in ("media", "amenities") if name not in include}
+    # I totali delle collezioni escluse (solo nella search) spariscono con loro
+    if "rooms" not in include:
+        exclude["room_count"] = True
+    if "media" not in include:
+        exclude["media_count"] = True
+        room_exclude.add("media_count")
+    if "rooms" in include and room_exclude:
+        exclude["rooms"] = {"__all__": room_exclude}
+    return exclude
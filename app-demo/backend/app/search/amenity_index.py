@@ -0,0 +1,278 @@
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def _iter_bits(bitmap: int) -> Iterable[int]:
+    # Posizioni dei bit a 1, dal meno significativo
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+class _OrdinalMap:
+    """
+    Assegna a ogni id (stringa) un intero progressivo: la sua posizione nelle bitmap.
+    Gli id cancellati lasciano un buco (None) finché non si fa un rebuild.
+    """
+
+    def __init__(self):
+        self.ordinals: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = []
+
+    def get_or_add(self, item_id: str) -> int:
+        ordinal = self.ordinals.get(item_id)
+        if ordinal is None:
+            ordinal = len(self.ids)
+            self.ordinals[item_id] = ordinal
+            self.ids.append(item_id)
+        return ordinal
+
+    def remove(self, item_id: str) -> Optional[int]:
+        ordinal = self.ordinals.pop(item_id, None)
+        if ordinal is not None:
+            self.ids[ordinal] = None
+        return ordinal
+
+    def nbytes(self) -> int:
+        return (sys.getsizeof(self.ordinals) + sys.getsizeof(self.ids)
+                + sum(sys.getsizeof(i) for i in self.ordinals))
+
+
+class AmenityBitmapIndex:
+    """
+    Indice in memoria (per processo): amenity id -> bitmap degli hotel / delle stanze che la offrono.
+    Le bitmap sono interi Python (un bit per ordinale), quindi
+    "ha tutte queste amenities" = AND tra interi, senza toccare le tabelle di link.
+
+    Si carica all'avvio (rebuild) e si aggiorna dopo ogni commit dalle repository
+    che scrivono i link (PropertyRepository / RoomRepository, amenities cancellate comprese).
+    I commit degli altri processi non passano di qui: un thread rifà il rebuild ogni
+    AMENITY_INDEX_REFRESH_SECONDS, e fino ad allora un worker può filtrare su link vecchi.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.loaded = False
+        self.last_rebuild_seconds: Optional[float] = None
+        self.last_rebuild_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _reset(self):
+        self._properties = _OrdinalMap()
+        self._rooms = _OrdinalMap()
+        self._room_property: Dict[int, int] = {}           # ordinale stanza -> ordinale property
+        self._property_bitmaps: Dict[str, int] = {}        # amenity id -> bitmap properties
+        self._room_bitmaps: Dict[str, int] = {}            # amenity id -> bitmap stanze
+        self._property_amenities: Dict[int, List[str]] = {}  # per poter togliere i bit vecchi
+        self._room_amenities: Dict[int, List[str]] = {}
+
+    # =================================================================
+    # CARICAMENTO
+    # =================================================================
+
+    def rebuild(self, db: Session):
+        """
+        Ricostruisce l'indice da zero leggendo le tabelle di link (2 query).
+        Le strutture nuove sostituiscono le vecchie solo alla fine, sotto lock.
+        """
+        started = time.perf_counter()
+        property_links = db.execute(text(
+            "SELECT property_id, amenity_id FROM property_amenities_link"
+        )).all()
+        room_links = db.execute(text("""
+            SELECT r.id, r.property_id, l.amenity_id
+            FROM rooms r
+            LEFT JOIN room_amenities_link l ON l.room_id = r.id
+        """)).all()
+
+        fresh = AmenityBitmapIndex.__new__(AmenityBitmapIndex)
+        fresh._reset()
+        grouped_properties: Dict[str, List[str]] = {}
+        for property_id, amenity_id in property_links:
+            grouped_properties.setdefault(property_id, []).append(amenity_id)
+        for property_id, amenity_ids in grouped_properties.items():
+            fresh._set_property(property_id, amenity_ids)
+
+        grouped_rooms: Dict[tuple, List[str]] = {}
+        for room_id, property_id, amenity_id in room_links:
+            amenity_ids = grouped_rooms.setdefault((room_id, property_id), [])
+            if amenity_id is not None:
+                amenity_ids.append(amenity_id)
+        for (room_id, property_id), amenity_ids in grouped_rooms.items():
+            fresh._set_room(room_id, property_id, amenity_ids)
+
+        with self._lock:
+            self._properties = fresh._properties
+            self._rooms = fresh._rooms
+            self._room_property = fresh._room_property
+            self._property_bitmaps = fresh._property_bitmaps
+            self._room_bitmaps = fresh._room_bitmaps
+            self._property_amenities = fresh._property_amenities
+            self._room_amenities = fresh._room_amenities
+            self.loaded = True
+            self.last_rebuild_seconds = time.perf_counter() - started
+            self.last_rebuild_at = time.time()
+
+    def start_refresh(self, session_factory: Callable[[], Session], seconds: float):
+        """Thread che rifà il rebuild ogni `seconds` (stesso schema del refresh del motore di ricerca)."""
+        if seconds > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._refresh_loop, args=(session_factory, seconds), name="amenity-index-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def stop_refresh(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def _refresh_loop(self, session_factory: Callable[[], Session], seconds: float):
+        while not self._stop.wait(seconds):
+            db = session_factory()
+            try:
+                self.rebuild(db)
+            except Exception as e:
+                # L'indice resta com'era: ci si riprova al giro successivo
+                print(f"Amenity index refresh failed: {e}")
+            finally:
+                db.close()
+
+    # =================================================================
+    # AGGIORNAMENTI INCREMENTALI (dopo il commit)
+    # =================================================================
+
+    def set_property_amenities(self, property_id: str, amenity_ids: Iterable[str]):
+        with self._lock:
+            self._set_property(property_id, list(amenity_ids))
+
+    def set_room_amenities(self, room_id: str, property_id: str, amenity_ids: Iterable[str]):
+        with self._lock:
+            self._set_room(room_id, property_id, list(amenity_ids))
+
+    def remove_room(self, room_id: str):
+        with self._lock:
+            ordinal = self._rooms.ordinals.get(room_id)
+            if ordinal is None:
+                return
+            self._clear_bits(self._room_bitmaps, self._room_amenities.pop(ordinal, []), ordinal)
+            self._room_property.pop(ordinal, None)
+            self._rooms.remove(room_id)
+
+    def remove_property(self, property_id: str):
+        """Toglie la property e tutte le sue stanze (come il CASCADE del DB)."""
+        with self._lock:
+            ordinal = self._properties.ordinals.get(property_id)
+            if ordinal is None:
+                return
+            self._clear_bits(self._property_bitmaps, self._property_amenities.pop(ordinal, []), ordinal)
+            for room_ordinal in [r for r, p in self._room_property.items() if p == ordinal]:
+                self.remove_room(self._rooms.ids[room_ordinal])
+            self._properties.remove(property_id)
+
+    def remove_property_amenity(self, amenity_id: str):
+        """Amenity cancellata: il CASCADE del DB ha tolto i suoi link da tutte le properties."""
+        with self._lock:
+            self._drop_amenity(self._property_bitmaps, self._property_amenities, amenity_id)
+
+    def remove_room_amenity(self, amenity_id: str):
+        """Amenity cancellata: il CASCADE del DB ha tolto i suoi link da tutte le stanze."""
+        with self._lock:
+            self._drop_amenity(self._room_bitmaps, self._room_amenities, amenity_id)
+
+    # =================================================================
+    # QUERY
+    # =================================================================
+
+    def properties_with_all(self, amenity_ids: Iterable[str]) -> List[str]:
+        """Id delle properties che offrono tutte le amenities indicate."""
+        with self._lock:
+            bitmap = self._intersect(self._property_bitmaps, amenity_ids)
+            return [self._properties.ids[o] for o in _iter_bits(bitmap)]
+
+    def rooms_with_all(self, amenity_ids: Iterable[str]) -> List[str]:
+        """Id delle stanze che offrono tutte le amenities indicate."""
+        with self._lock:
+            bitmap = self._intersect(self._room_bitmaps, amenity_ids)
+            return [self._rooms.ids[o] for o in _iter_bits(bitmap)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            bitmap_bytes = sum(sys.getsizeof(b) for b in self._property_bitmaps.values()) \
+                + sum(sys.getsizeof(b) for b in self._room_bitmaps.values())
+            return {
+                "loaded": self.loaded,
+                "properties": len(self._properties.ordinals),
+                "rooms": len(self._rooms.ordinals),
+                "property_amenities": len(self._property_bitmaps),
+                "room_amenities": len(self._room_bitmaps),
+                # Buchi lasciati dalle cancellazioni: un rebuild li compatta
+                "free_slots": (len(self._properties.ids) - len(self._properties.ordinals))
+                    + (len(self._rooms.ids) - len(self._rooms.ordinals)),
+                "bitmap_bytes": bitmap_bytes,
+                "memory_bytes": bitmap_bytes + self._properties.nbytes() + self._rooms.nbytes()
+                    + sys.getsizeof(self._room_property) + sys.getsizeof(self._property_amenities)
+                    + sys.getsizeof(self._room_amenities),
+                "last_rebuild_seconds": self.last_rebuild_seconds,
+                "last_rebuild_at": self.last_rebuild_at,
+            }
+
+    # =================================================================
+    # HELPER PRIVATI (da chiamare con il lock preso)
+    # =================================================================
+
+    def _set_property(self, property_id: str, amenity_ids: List[str]):
+        ordinal = self._properties.get_or_add(property_id)
+        self._clear_bits(self._property_bitmaps, self._property_amenities.get(ordinal, []), ordinal)
+        self._set_bits(self._property_bitmaps, amenity_ids, ordinal)
+        self._property_amenities[ordinal] = amenity_ids
+
+    def _set_room(self, room_id: str, property_id: str, amenity_ids: List[str]):
+        ordinal = self._rooms.get_or_add(room_id)
+        self._room_property[ordinal] = self._properties.get_or_add(property_id)
+        self._clear_bits(self._room_bitmaps, self._room_amenities.get(ordinal, []), ordinal)
+        self._set_bits(self._room_bitmaps, amenity_ids, ordinal)
+        self._room_amenities[ordinal] = amenity_ids
+
+    @staticmethod
+    def _set_bits(bitmaps: Dict[str, int], amenity_ids: List[str], ordinal: int):
+        bit = 1 << ordinal
+        for amenity_id in amenity_ids:
+            bitmaps[amenity_id] = bitmaps.get(amenity_id, 0) | bit
+
+    @staticmethod
+    def _clear_bits(bitmaps: Dict[str, int], amenity_ids: List[str], ordinal: int):
+        mask = ~(1 << ordinal)
+        for amenity_id in amenity_ids:
+            remaining = bitmaps.get(amenity_id, 0) & mask
+            if remaining:
+                bitmaps[amenity_id] = remaining
+            else:
+                bitmaps.pop(amenity_id, None)
+
+    @staticmethod
+    def _drop_amenity(bitmaps: Dict[str, int], amenities_of: Dict[int, List[str]], amenity_id: str):
+        for ordinal in _iter_bits(bitmaps.pop(amenity_id, 0)):
+            amenities_of[ordinal] = [a for a in amenities_of.get(ordinal, []) if a != amenity_id]
+
+    @staticmethod
+    def _intersect(bitmaps: Dict[str, int], amenity_ids: Iterable[str]) -> int:
+        result: Optional[int] = None
+        for amenity_id in set(amenity_ids):
+            bitmap = bitmaps.get(amenity_id, 0)
+            result = bitmap if result is None else result & bitmap
+            if not result:
+                return 0
+        return result or 0
+
+
+# Istanza unica per processo
+amenity_index = AmenityBitmapIndex()
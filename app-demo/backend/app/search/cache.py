@@ -0,0 +1,87 @@
+import dataclasses
+from enum import Enum
+from typing import Any, Dict, Hashable, Optional, Set
+from app.cache import TTLCache
+from app.config import settings
+from app.domain.search import SearchCriteria, SearchPage
+
+def canonical_key(criteria: SearchCriteria) -> Hashable:
+    """
+    Chiave canonica di una ricerca: richieste equivalenti devono dare la stessa chiave.
+    - location: trim, spazi compattati, case-folding (" ROMA " == "roma")
+    - liste (es. id di amenities): ordinate, senza duplicati
+    - enum: il loro valore
+    Scorre tutti i campi di SearchCriteria, così i nuovi filtri entrano da soli nella chiave.
+    """
+    parts = []
+    for f in dataclasses.fields(criteria):
+        value = getattr(criteria, f.name)
+        if f.name == "location" and value:
+            value = " ".join(value.casefold().split()) or None
+        elif isinstance(value, Enum):
+            value = value.value
+        elif isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(set(value)))
+        parts.append((f.name, value))
+    return tuple(parts)
+
+
+class SearchResultCache(TTLCache):
+    """
+    Cache dei risultati di SearchService.search (una SearchPage per chiave canonica).
+    Tiene anche un indice property_id -> chiavi, così una scrittura su una property
+    invalida solo le pagine che la contengono.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, **kwargs):
+        super().__init__(maxsize, ttl, **kwargs)
+        self._keys_by_property: Dict[str, Set[Hashable]] = {}
+
+    def get_page(self, criteria: SearchCriteria) -> Optional[SearchPage]:
+        return self.get(canonical_key(criteria))
+
+    def set_page(self, criteria: SearchCriteria, page: SearchPage):
+        self.set(canonical_key(criteria), page)
+
+    def set(self, key: Hashable, value: SearchPage):
+        with self._lock:
+            super().set(key, value)
+            if key in self._data:
+                for item in value.items:
+                    self._keys_by_property.setdefault(item["id"], set()).add(key)
+
+    def invalidate_property(self, property_id: str):
+        """
+        Scarta le pagine che contengono la property.
+        Da usare quando cambia (o sparisce) una property già visibile nei risultati.
+        """
+        with self._lock:
+            for key in list(self._keys_by_property.get(property_id, ())):
+                self.pop(key)
+
+    def invalidate_all(self):
+        """
+        Scarta tutto. Da usare quando una property può entrare in risultati
+        che oggi non la contengono (es. pubblicazione).
+        """
+        self.clear()
+
+    def _on_remove(self, key: Hashable, value: SearchPage):
+        for item in value.items:
+            keys = self._keys_by_property.get(item["id"])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_property[item["id"]]
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["indexed_properties"] = len(self._keys_by_property)
+        return stats
+
+
+# Istanza unica per processo (come `settings`)
+search_cache = SearchResultCache(
+    maxsize=settings.SEARCH_CACHE_MAX_ENTRIES,
+    ttl=settings.SEARCH_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,31 @@
+"""
+Manutenzione della proiezione property_search_cards da riga di comando.
+
+    python -m app.search.cards rebuild   # ricalcola tutte le card
+    python -m app.search.cards missing   # crea solo quelle mancanti
+"""
+import sys
+from app.db import SessionLocal
+from app.repositories.search_card_repository import SearchCardRepository
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "rebuild"
+    if command not in ("rebuild", "missing"):
+        print(__doc__)
+        return 2
+
+    db = SessionLocal()
+    try:
+        cards = SearchCardRepository(db)
+        if command == "rebuild":
+            cards.refresh_all()
+            print("Search cards rebuilt")
+        else:
+            print(f"Search cards created: {cards.refresh_missing()}")
+        db.commit()
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
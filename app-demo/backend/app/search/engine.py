@@ -0,0 +1,587 @@
+"""
+Motore di ricerca in memoria (per processo), opzionale: SEARCH_ENGINE_ENABLED=true.
+
+- Indice invertito: token -> {ordinale property: peso del campo migliore}
+- Colonne delle stanze in array compatti (prezzo, capienza, property di appartenenza)
+- Snapshot iniziale dalla proiezione property_search_cards, poi aggiornamenti incrementali
+  con le stesse righe che SearchCardRepository scrive (RETURNING) a ogni commit.
+- I commit degli altri processi (altri worker uvicorn, altre task) non passano di qui: un thread
+  rilegge ogni SEARCH_ENGINE_REFRESH_SECONDS le card con updated_at recente (refresh). Fino al
+  refresh successivo un processo può quindi non vedere le scritture fatte da un altro.
+
+Verifica rispetto al DB (confronta i risultati con la search SQL sulle tabelle):
+
+    python -m app.search.engine check
+"""
+import array
+import bisect
+import heapq
+import math
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import AbstractSet, Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.domain.entities import RoomType
+from app.domain.search import PROPERTY_INCLUDES, ChildLimits, SearchCriteria, SearchPage, SearchSort
+from app.repositories.search_repository import (
+    CURSOR_BACKEND_ENGINE, SearchRepository, child_limits_from_settings, normalize_search_term,
+    encode_cursor, decode_cursor
+)
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Stessi pesi di ts_rank (A/B/C/D) usati dal search_vector in schema.sql
+FIELD_WEIGHTS = (("name", 1.0), ("city", 0.4), ("country", 0.4), ("address", 0.2), ("description", 0.1))
+
+# Raggio terrestre di earthdistance (earth()), così le distanze coincidono con quelle SQL
+EARTH_RADIUS_KM = 6378.168
+
+# Colonne della card che servono al motore (anche RETURNING di SearchCardRepository)
+SNAPSHOT_COLUMNS = "id, status, created_at, document"
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return WORD_RE.findall(normalize_search_term(value or ""))
+
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    # Haversine
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def _deep_sizeof(obj: Any, seen: Set[int]) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(v, seen) for v in obj)
+    return size
+
+
+class SearchEngine:
+    """
+    Serve SearchService.search senza toccare Postgres, con gli stessi criteri
+    (testo, facet, geo), ordinamenti e cursori keyset della SearchRepository.
+    Il testo si cerca per prefisso di parola ("rom" trova "Roma"), senza stemming.
+    """
+
+    # Strutture ricostruite da _reset / rebuild (tutto tranne lock e metriche)
+    STATE_ATTRIBUTES = (
+        "_ordinals", "_ids", "_docs", "_created", "_min_price", "_max_capacity", "_lat", "_lng",
+        "_amenities", "_tokens", "_postings", "_sorted_tokens", "_room_property", "_room_price",
+        "_room_capacity", "_room_type", "_room_amenities", "_room_ids", "_rooms_of",
+    )
+
+    # updated_at è il now() di inizio transazione: una card scritta da una transazione iniziata
+    # prima dell'ultimo refresh ma committata dopo ha un updated_at "vecchio", quindi si rilegge
+    # anche una finestra all'indietro
+    REFRESH_OVERLAP_SECONDS = 60
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.loaded = False
+        self.last_rebuild_seconds: Optional[float] = None
+        self.last_rebuild_at: Optional[float] = None
+        self.last_refresh_at: Optional[float] = None
+        self.updates_applied = 0
+        # Orologio del DB all'ultimo snapshot / refresh (per le card con updated_at successivo)
+        self._synced_at: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _reset(self):
+        # Properties (per ordinale; le cancellate restano come buchi fino al rebuild)
+        self._ordinals: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        self._created: List[datetime] = []     # datetime.min = senza data
+        self._min_price = array.array("d")      # NaN = nessuna stanza
+        self._max_capacity = array.array("l")   # -1 = nessuna stanza
+        self._lat = array.array("d")            # NaN = nessuna posizione
+        self._lng = array.array("d")
+        self._amenities: List[frozenset] = []
+        self._tokens: List[List[str]] = []
+        # Indice invertito
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._sorted_tokens: Optional[List[str]] = []  # None = da riordinare
+        # Stanze (colonnare)
+        self._room_property = array.array("l")  # -1 = stanza rimossa
+        self._room_price = array.array("d")
+        self._room_capacity = array.array("l")
+        self._room_type: List[str] = []
+        self._room_amenities: List[frozenset] = []
+        self._room_ids: List[str] = []
+        self._rooms_of: List[List[int]] = []
+
+    # =================================================================
+    # CARICAMENTO E AGGIORNAMENTI
+    # =================================================================
+
+    def rebuild(self, db: Session):
+        """Ricostruisce tutto dalle card PUBLISHED; lo stato nuovo sostituisce il vecchio solo alla fine."""
+        started = time.perf_counter()
+        synced_at = db.execute(text("SELECT now()")).scalar()
+        rows = db.execute(text(
+            f"SELECT {SNAPSHOT_COLUMNS} FROM property_search_cards WHERE status = 'PUBLISHED'"
+        )).mappings().all()
+
+        fresh = SearchEngine()
+        for row in rows:
+            fresh._add(row)
+        fresh._sorted_tokens = sorted(fresh._postings)
+
+        with self._lock:
+            for name in self.STATE_ATTRIBUTES:
+                setattr(self, name, getattr(fresh, name))
+            self.loaded = True
+            self.last_rebuild_seconds = time.perf_counter() - started
+            self.last_rebuild_at = time.time()
+            self._synced_at = synced_at
+
+    def apply(self, rows: Iterable[Any], deleted_ids: Iterable[str] = ()):
+        """Applica le card appena scritte (dopo il commit) e toglie le properties cancellate."""
+        with self._lock:
+            for property_id in deleted_ids:
+                self._remove(property_id)
+                self.updates_applied += 1
+            for row in rows:
+                self._remove(row["id"])
+                if row["status"] == "PUBLISHED":
+                    self._add(row)
+                self.updates_applied += 1
+
+    def refresh(self, db: Session) -> int:
+        """
+        Riallinea il motore alle card scritte da altri processi: rilegge quelle con updated_at
+        recente e, se il numero di PUBLISHED non torna, toglie le cancellate. Ritorna le card applicate.
+        """
+        if not self.loaded or self._synced_at is None:
+            # Snapshot all'avvio non riuscito (es. DB giù): si riprova qui
+            self.rebuild(db)
+            return 0
+
+        synced_at = db.execute(text("SELECT now()")).scalar()
+        since = self._synced_at - timedelta(seconds=self.REFRESH_OVERLAP_SECONDS)
+        rows = db.execute(text(
+            f"SELECT {SNAPSHOT_COLUMNS} FROM property_search_cards WHERE updated_at > :since"
+        ), {"since": since}).mappings().all()
+        published = db.execute(text(
+            "SELECT count(*) FROM property_search_cards WHERE status = 'PUBLISHED'"
+        )).scalar()
+
+        with self._lock:
+            # Le righe della finestra già applicate (anche dai commit di questo processo) si saltano
+            changed = [row for row in rows if not self._is_current(row)]
+            self.apply(changed)
+            drifted = len(self._ordinals) != published
+
+        removed: List[str] = []
+        restored: List[Any] = []
+        if drifted:
+            # Properties cancellate (la card sparisce con la property) o card sfuggite alla finestra
+            ids = set(db.execute(text(
+                "SELECT id FROM property_search_cards WHERE status = 'PUBLISHED'"
+            )).scalars())
+            with self._lock:
+                removed = [pid for pid in self._ordinals if pid not in ids]
+                missing = [pid for pid in ids if pid not in self._ordinals]
+            if missing:
+                restored = db.execute(text(
+                    f"SELECT {SNAPSHOT_COLUMNS} FROM property_search_cards WHERE id = ANY(:ids)"
+                ), {"ids": missing}).mappings().all()
+            self.apply(restored, removed)
+
+        with self._lock:
+            self._synced_at = synced_at
+            self.last_refresh_at = time.time()
+        return len(changed) + len(restored) + len(removed)
+
+    def start_refresh(self, session_factory: Callable[[], Session], seconds: float):
+        """Thread che chiama refresh ogni `seconds` (stesso schema del controllo lag delle repliche)."""
+        if seconds > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._refresh_loop, args=(session_factory, seconds), name="search-engine-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def stop_refresh(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    # =================================================================
+    # QUERY
+    # =================================================================
+
+    def search(self, criteria: SearchCriteria) -> SearchPage:
+        location = criteria.location.strip() if criteria.location else None
+        default_limit = SearchRepository.SEARCH_LIMIT if location else SearchRepository.BASE_LIMIT
+        page_size = min(criteria.limit or default_limit, SearchRepository.SEARCH_LIMIT)
+        point = self._point(criteria)
+
+        with self._lock:
+            scores = self._match_text(location) if location else None
+            candidates = scores.keys() if scores is not None else (
+                o for o, pid in enumerate(self._ids) if pid is not None
+            )
+            rooms = self._match_rooms(criteria)
+            if rooms is not None:
+                candidates = (o for o in candidates if o in rooms)
+
+            wanted_amenities = frozenset(criteria.property_amenity_ids)
+            matched = [
+                o for o in candidates
+                if wanted_amenities <= self._amenities[o] and self._match_geo(o, criteria, point)
+            ]
+
+            sort = criteria.sort or (
+                SearchSort.RELEVANCE if scores else SearchSort.DISTANCE if point else SearchSort.NEWEST
+            )
+            if sort == SearchSort.RELEVANCE and not scores:
+                sort = SearchSort.NEWEST
+            if sort == SearchSort.DISTANCE and not point:
+                raise ValueError("Sorting by distance requires lat and lng")
+
+            keyed = self._sort_keys(matched, sort, scores, point)
+            descending = sort in (SearchSort.RELEVANCE, SearchSort.NEWEST, SearchSort.CAPACITY)
+
+            # KEYSET: stesso cursore della SearchRepository (valori della chiave dell'ultima riga),
+            # quindi i cursori valgono anche passando dal motore alla search SQL e viceversa;
+            # non per distanza e rilevanza, calcolate diversamente (BACKEND_SPECIFIC_SORTS)
+            if criteria.cursor and keyed:
+                after = tuple(
+                    float(v) if isinstance(v, Decimal) else v
+                    for v in decode_cursor(sort, criteria.cursor, len(keyed[0][0]), CURSOR_BACKEND_ENGINE)
+                )
+                try:
+                    keyed = [k for k in keyed if (k[0] < after if descending else k[0] > after)]
+                except TypeError as e:
+                    # Es. data con fuso orario contro created_at senza: cursore non di questo motore
+                    raise ValueError("Invalid cursor") from e
+
+            # TOP-K: serve solo la pagina (+1 riga per il cursore), non l'ordinamento di tutti i match
+            select = heapq.nlargest if descending else heapq.nsmallest
+            page = select(page_size + 1, keyed, key=lambda k: k[0])
+            next_cursor = (
+                encode_cursor(sort, page[page_size - 1][0], CURSOR_BACKEND_ENGINE) if len(page) > page_size else None
+            )
+            excluded = PROPERTY_INCLUDES - criteria.include if criteria.include is not None else frozenset()
+            limits = child_limits_from_settings()
+            items = [self._output(o, rooms, point, scores, excluded, limits) for _, o in page[:page_size]]
+
+        return SearchPage(items=items, next_cursor=next_cursor)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            seen: Set[int] = set()
+            index_bytes = _deep_sizeof(self._postings, seen) + _deep_sizeof(self._sorted_tokens or [], seen)
+            docs_bytes = _deep_sizeof(self._docs, seen)
+            columns_bytes = sum(_deep_sizeof(getattr(self, name), seen) for name in self.STATE_ATTRIBUTES)
+            return {
+                "loaded": self.loaded,
+                "properties": len(self._ordinals),
+                "rooms": sum(1 for p in self._room_property if p >= 0),
+                "tokens": len(self._postings),
+                "free_slots": len(self._ids) - len(self._ordinals),
+                "memory_bytes": {
+                    "inverted_index": index_bytes,
+                    "documents": docs_bytes,
+                    "columns": columns_bytes,
+                    "total": index_bytes + docs_bytes + columns_bytes,
+                },
+                "last_rebuild_seconds": self.last_rebuild_seconds,
+                "last_rebuild_at": self.last_rebuild_at,
+                "last_refresh_at": self.last_refresh_at,
+                "updates_applied": self.updates_applied,
+            }
+
+    def check(self, db: Session) -> Dict[str, Any]:
+        """Confronta i documenti in memoria con le card PUBLISHED nel DB."""
+        rows = db.execute(text(
+            "SELECT id, document FROM property_search_cards WHERE status = 'PUBLISHED'"
+        )).mappings().all()
+        db_docs = {r["id"]: r["document"] for r in rows}
+        with self._lock:
+            mem_docs = {pid: self._docs[o] for pid, o in self._ordinals.items()}
+        missing = sorted(set(db_docs) - set(mem_docs))
+        extra = sorted(set(mem_docs) - set(db_docs))
+        stale = sorted(pid for pid in set(db_docs) & set(mem_docs) if db_docs[pid] != mem_docs[pid])
+        return {
+            "consistent": not (missing or extra or stale),
+            "checked": len(db_docs),
+            "missing": missing,
+            "extra": extra,
+            "stale": stale,
+        }
+
+    def _refresh_loop(self, session_factory: Callable[[], Session], seconds: float):
+        while not self._stop.wait(seconds):
+            db = session_factory()
+            try:
+                self.refresh(db)
+            except Exception as e:
+                # Il motore resta com'era: ci si riprova al giro successivo
+                print(f"Search engine refresh failed: {e}")
+            finally:
+                db.close()
+
+    # =================================================================
+    # HELPER PRIVATI (da chiamare con il lock preso)
+    # =================================================================
+
+    def _is_current(self, row: Any) -> bool:
+        ordinal = self._ordinals.get(row["id"])
+        if row["status"] != "PUBLISHED":
+            return ordinal is None
+        return ordinal is not None and self._docs[ordinal] == row["document"]
+
+    def _add(self, row: Any):
+        doc = row["document"]
+        ordinal = len(self._ids)
+        self._ordinals[row["id"]] = ordinal
+        self._ids.append(row["id"])
+        self._docs.append(doc)
+        created = row["created_at"]
+        self._created.append(created if created is not None else datetime.min)
+        self._lat.append(doc["latitude"] if doc.get("latitude") is not None else math.nan)
+        self._lng.append(doc["longitude"] if doc.get("longitude") is not None else math.nan)
+        self._amenities.append(frozenset(a["id"] for a in doc.get("amenities") or ()))
+
+        # Indice invertito: per ogni token il peso del campo più importante in cui compare
+        weights: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(doc.get(field)):
+                weights[token] = max(weights.get(token, 0.0), weight)
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                if self._sorted_tokens is not None:
+                    bisect.insort(self._sorted_tokens, token)
+            postings[ordinal] = weight
+        self._tokens.append(list(weights))
+
+        room_ordinals = []
+        prices, capacities = [], []
+        for room in doc.get("rooms") or ():
+            room_ordinals.append(len(self._room_ids))
+            self._room_ids.append(room["id"])
+            self._room_property.append(ordinal)
+            self._room_price.append(float(room["price"]))
+            self._room_capacity.append(int(room["capacity"]))
+            self._room_type.append(room["type"])
+            self._room_amenities.append(frozenset(a["id"] for a in room.get("amenities") or ()))
+            prices.append(float(room["price"]))
+            capacities.append(int(room["capacity"]))
+        self._rooms_of.append(room_ordinals)
+        self._min_price.append(min(prices) if prices else math.nan)
+        self._max_capacity.append(max(capacities) if capacities else -1)
+
+    def _remove(self, property_id: str):
+        ordinal = self._ordinals.pop(property_id, None)
+        if ordinal is None:
+            return
+        for token in self._tokens[ordinal]:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(ordinal, None)
+                if not postings:
+                    del self._postings[token]
+                    self._sorted_tokens = None
+        for r in self._rooms_of[ordinal]:
+            self._room_property[r] = -1
+        self._ids[ordinal] = None
+        self._docs[ordinal] = None
+        self._tokens[ordinal] = []
+        self._rooms_of[ordinal] = []
+
+    def _match_text(self, location: str) -> Dict[int, float]:
+        """Ogni parola cercata deve essere prefisso di un token dell'hotel (AND); score = somma dei pesi."""
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        scores: Optional[Dict[int, float]] = None
+        for term in tokenize(location) or [normalize_search_term(location)]:
+            term_scores: Dict[int, float] = {}
+            start = bisect.bisect_left(self._sorted_tokens, term)
+            for token in self._sorted_tokens[start:]:
+                if not token.startswith(term):
+                    break
+                for o, weight in self._postings[token].items():
+                    if weight > term_scores.get(o, 0.0):
+                        term_scores[o] = weight
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {o: s + term_scores[o] for o, s in scores.items() if o in term_scores}
+            if not scores:
+                return {}
+        return scores or {}
+
+    def _match_rooms(self, criteria: SearchCriteria) -> Optional[Dict[int, List[int]]]:
+        """Scansione delle colonne delle stanze: property -> stanze che rispettano i filtri (None = nessun filtro)."""
+        if (criteria.min_price is None and criteria.max_price is None and criteria.min_capacity is None
+                and criteria.room_type is None and not criteria.room_amenity_ids):
+            return None
+        min_price = criteria.min_price if criteria.min_price is not None else -math.inf
+        max_price = criteria.max_price if criteria.max_price is not None else math.inf
+        min_capacity = criteria.min_capacity or 0
+        room_type = criteria.room_type.value if criteria.room_type is not None else None
+        wanted = frozenset(criteria.room_amenity_ids)
+
+        result: Dict[int, List[int]] = {}
+        prop, price, capacity = self._room_property, self._room_price, self._room_capacity
+        for r in range(len(prop)):
+            if prop[r] < 0 or not (min_price <= price[r] <= max_price) or capacity[r] < min_capacity:
+                continue
+            if room_type is not None and self._room_type[r] != room_type:
+                continue
+            if wanted and not wanted <= self._room_amenities[r]:
+                continue
+            result.setdefault(prop[r], []).append(r)
+        return result
+
+    @staticmethod
+    def _point(criteria: SearchCriteria) -> Optional[Tuple[float, float]]:
+        if (criteria.latitude is None) != (criteria.longitude is None):
+            raise ValueError("lat and lng must be given together")
+        if criteria.radius_km is not None and criteria.latitude is None:
+            raise ValueError("radius_km requires lat and lng")
+        bbox = (criteria.bbox_west, criteria.bbox_south, criteria.bbox_east, criteria.bbox_north)
+        if any(v is not None for v in bbox) and any(v is None for v in bbox):
+            raise ValueError("bbox needs west, south, east and north")
+        if criteria.latitude is None:
+            return None
+        return criteria.latitude, criteria.longitude
+
+    def _distance(self, o: int, point: Tuple[float, float]) -> float:
+        return distance_km(point[0], point[1], self._lat[o], self._lng[o])
+
+    def _match_geo(self, o: int, criteria: SearchCriteria, point: Optional[Tuple[float, float]]) -> bool:
+        has_position = not math.isnan(self._lat[o])
+        if criteria.radius_km is not None:
+            if not has_position or self._distance(o, point) > criteria.radius_km:
+                return False
+        if criteria.bbox_west is not None:
+            if not has_position or not (criteria.bbox_south <= self._lat[o] <= criteria.bbox_north):
+                return False
+            lng = self._lng[o]
+            if criteria.bbox_west <= criteria.bbox_east:
+                return criteria.bbox_west <= lng <= criteria.bbox_east
+            return lng >= criteria.bbox_west or lng <= criteria.bbox_east
+        return True
+
+    def _sort_keys(
+        self, ordinals: Sequence[int], sort: SearchSort,
+        scores: Optional[Dict[int, float]], point: Optional[Tuple[float, float]]
+    ) -> List[Tuple[tuple, int]]:
+        # Stesse chiavi di SORT_KEYS: l'ultima colonna è sempre l'id (ordine totale)
+        ids, created = self._ids, self._created
+        if sort == SearchSort.RELEVANCE:
+            return [((scores[o], created[o], ids[o]), o) for o in ordinals]
+        if sort == SearchSort.PRICE:
+            return [((self._min_price[o], ids[o]), o) for o in ordinals if not math.isnan(self._min_price[o])]
+        if sort == SearchSort.CAPACITY:
+            return [((self._max_capacity[o], ids[o]), o) for o in ordinals if self._max_capacity[o] >= 0]
+        if sort == SearchSort.DISTANCE:
+            return [((self._distance(o, point), ids[o]), o) for o in ordinals if not math.isnan(self._lat[o])]
+        return [((created[o], ids[o]), o) for o in ordinals]
+
+    def _output(
+        self, o: int, rooms: Optional[Dict[int, List[int]]], point: Optional[Tuple[float, float]],
+        scores: Optional[Dict[int, float]] = None, excluded: AbstractSet[str] = frozenset(),
+        limits: ChildLimits = ChildLimits()
+    ) -> Dict[str, Any]:
+        doc = dict(self._docs[o])
+        if rooms is not None:
+            # Solo le stanze che rispettano i filtri, come nella search SQL
+            keep = {self._room_ids[r] for r in rooms.get(o, ())}
+            doc["rooms"] = [room for room in doc.get("rooms") or () if room["id"] in keep]
+            doc["room_count"] = len(doc["rooms"])
+        # Stessi limiti della search SQL: le stanze più economiche e le prime foto (i totali restano)
+        doc["media"] = (doc.get("media") or [])[:limits.media]
+        doc["rooms"] = [
+            dict(room, media=(room.get("media") or [])[:limits.room_media])
+            for room in sorted(doc.get("rooms") or (), key=lambda r: (r["price"], r["id"]))[:limits.rooms]
+        ]
+        has_position = not math.isnan(self._lat[o])
+        doc["distance_km"] = round(self._distance(o, point), 2) if point and has_position else None
+        doc["score"] = round(scores[o], 4) if scores else None
+        # Collezioni non richieste (include=): via dal documento e dalle sue stanze
+        if excluded:
+            hidden = set(excluded)
+            hidden.update(f"{'room' if key == 'rooms' else key}_count" for key in excluded if key != "amenities")
+            for key in hidden:
+                doc.pop(key, None)
+            if "rooms" in doc:
+                doc["rooms"] = [{k: v for k, v in room.items() if k not in hidden} for room in doc["rooms"]]
+        return doc
+
+
+# Istanza unica per processo
+search_engine = SearchEngine()
+
+
+# =================================================================
+# CLI: python -m app.search.engine check
+# =================================================================
+
+def _compare_with_sql(db: Session) -> List[str]:
+    """
+    Esegue le stesse ricerche (senza testo: lo stemming SQL differisce di proposito)
+    sul motore e sulla SearchRepository in modalità live; ritorna le differenze trovate.
+    """
+    engine = SearchEngine()
+    engine.rebuild(db)
+    repo = SearchRepository(db, source="live", assembly="python")
+
+    amenity_ids = db.execute(text("SELECT DISTINCT amenity_id FROM property_amenities_link")).scalars().all()
+    room_types = db.execute(text("SELECT DISTINCT type FROM rooms")).scalars().all()
+    cases: List[SearchCriteria] = [SearchCriteria(sort=s, limit=SearchRepository.SEARCH_LIMIT)
+                                   for s in (SearchSort.NEWEST, SearchSort.PRICE, SearchSort.CAPACITY)]
+    cases += [SearchCriteria(property_amenity_ids=[a], limit=SearchRepository.SEARCH_LIMIT) for a in amenity_ids]
+    cases += [SearchCriteria(min_capacity=c, limit=SearchRepository.SEARCH_LIMIT) for c in (1, 2, 4)]
+    cases += [SearchCriteria(room_type=RoomType(t), limit=SearchRepository.SEARCH_LIMIT) for t in room_types]
+
+    problems = []
+    for criteria in cases:
+        expected = [(h["id"], sorted(r["id"] for r in h["rooms"])) for h in repo.search_properties(criteria).items]
+        actual = [(h["id"], sorted(r["id"] for r in h["rooms"])) for h in engine.search(criteria).items]
+        if expected != actual:
+            problems.append(f"{criteria}: sql={expected} engine={actual}")
+    print(f"Compared {len(cases)} searches, {engine.stats()['properties']} properties "
+          f"(rebuild {engine.last_rebuild_seconds:.3f}s)")
+    return problems
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != "check":
+        print(__doc__)
+        return 2
+    from app.db import SessionLocal
+    db = SessionLocal()
+    try:
+        problems = _compare_with_sql(db)
+    finally:
+        db.close()
+    for problem in problems:
+        print(f"MISMATCH {problem}")
+    print("OK" if not problems else f"{len(problems)} mismatching searches")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
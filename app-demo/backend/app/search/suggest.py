@@ -0,0 +1,229 @@
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from app.repositories.search_repository import SearchRepository, normalize_search_term
+
+# Tipi di suggerimento, in ordine di priorità a parità di match
+SUGGEST_KINDS = ("city", "country", "property")
+
+# Stessa soglia di default di pg_trgm (similarity_threshold)
+TRIGRAM_THRESHOLD = 0.3
+
+# Quanti suggerimenti distinti (città, paese, hotel) raccogliamo al massimo per un prefisso
+MAX_PREFIX_CANDIDATES = 500
+
+
+def trigrams(value: str) -> Set[str]:
+    """Trigrammi alla pg_trgm: ogni parola con due spazi davanti e uno dietro."""
+    result: Set[str] = set()
+    for word in value.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class SuggestIndex:
+    """
+    Indice per l'autocompletamento (per processo) su città, paese e nome delle properties PUBLISHED.
+
+    Array ordinato di tuple (chiave normalizzata, tipo, testo, property_id): un prefisso
+    si cerca con bisect e si scorre finché le chiavi iniziano con quel prefisso.
+    Ogni testo è indicizzato anche da ogni parola in poi ("Grand Hotel Roma" si trova con "roma").
+    Se i prefissi danno pochi risultati, fallback per similarità di trigrammi (errori di battitura).
+
+    Si aggiorna subito per le properties scritte da questo processo (PropertyService); quelle
+    pubblicate / ritirate dagli altri worker arrivano con il rebuild ogni SUGGEST_INDEX_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: List[Tuple[str, str, str, str]] = []
+        self._by_property: Dict[str, List[Tuple[str, str, str, str]]] = {}
+        # (tipo, testo) -> properties che lo hanno: per i conteggi e per il fallback trigram
+        self._values: Dict[Tuple[str, str], Set[str]] = {}
+        self._trigrams: Dict[Tuple[str, str], Set[str]] = {}
+        self.loaded = False
+        self.last_rebuild_seconds: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # =================================================================
+    # CARICAMENTO E AGGIORNAMENTI
+    # =================================================================
+
+    def rebuild(self, rows: Iterable[Any]):
+        """rows: oggetti/mapping con id, name, city, country delle properties PUBLISHED."""
+        started = time.perf_counter()
+        fresh = SuggestIndex()
+        for row in rows:
+            fresh._entries.extend(fresh._add(row["id"], row["name"], row["city"], row["country"]))
+        fresh._entries.sort()
+        with self._lock:
+            self._entries = fresh._entries
+            self._by_property = fresh._by_property
+            self._values = fresh._values
+            self._trigrams = fresh._trigrams
+            self.loaded = True
+            self.last_rebuild_seconds = time.perf_counter() - started
+
+    def start_refresh(self, session_factory: Callable[[], Session], seconds: float):
+        """Thread che rifà il rebuild ogni `seconds` (stesso schema del refresh del motore di ricerca)."""
+        if seconds > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._refresh_loop, args=(session_factory, seconds), name="suggest-index-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def stop_refresh(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def _refresh_loop(self, session_factory: Callable[[], Session], seconds: float):
+        while not self._stop.wait(seconds):
+            db = session_factory()
+            try:
+                self.rebuild(SearchRepository(db).published_suggest_rows())
+            except Exception as e:
+                # L'indice resta com'era: ci si riprova al giro successivo
+                print(f"Suggest index refresh failed: {e}")
+            finally:
+                db.close()
+
+    def upsert(self, property_id: str, name: str, city: str, country: str):
+        with self._lock:
+            self._remove(property_id)
+            for entry in self._add(property_id, name, city, country):
+                bisect.insort(self._entries, entry)
+
+    def remove(self, property_id: str):
+        with self._lock:
+            self._remove(property_id)
+
+    # =================================================================
+    # QUERY
+    # =================================================================
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        Completamenti ordinati: match esatto, poi tipo (città > paese > hotel),
+        poi numero di properties, poi alfabetico.
+        """
+        key = normalize_search_term(prefix)
+        if not key:
+            return []
+
+        with self._lock:
+            matches: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            entries = self._entries
+            i = bisect.bisect_left(entries, (key,))
+            while i < len(entries) and len(matches) < MAX_PREFIX_CANDIDATES:
+                entry_key, kind, value, property_id = entries[i]
+                if not entry_key.startswith(key):
+                    break
+                self._collect(matches, kind, value, property_id, exact=entry_key == key)
+                if kind == "property":
+                    i += 1
+                else:
+                    # Città / paese: una voce per property, basta la prima (il conteggio è in _values).
+                    # value + "\0" viene subito dopo value: si salta alla prossima chiave o al prossimo testo
+                    i = bisect.bisect_left(entries, (entry_key, kind, value + "\0"), i + 1)
+
+            results = sorted(matches.values(), key=self._rank)
+            if len(results) < limit and len(key) >= 3:
+                results.extend(self._fuzzy(key, limit - len(results), exclude=matches.keys()))
+
+        return [
+            {k: r[k] for k in ("value", "kind", "property_id", "count")}
+            for r in results[:limit]
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "properties": len(self._by_property),
+                "entries": len(self._entries),
+                "distinct_values": len(self._values),
+                "last_rebuild_seconds": self.last_rebuild_seconds,
+            }
+
+    # =================================================================
+    # HELPER PRIVATI (da chiamare con il lock preso)
+    # =================================================================
+
+    def _add(self, property_id: str, name: str, city: str, country: str) -> List[Tuple[str, str, str, str]]:
+        added = []
+        for kind, value in (("city", city), ("country", country), ("property", name)):
+            value = " ".join((value or "").split())
+            normalized = normalize_search_term(value)
+            if not normalized:
+                continue
+            words = normalized.split(" ")
+            for i in range(len(words)):
+                added.append((" ".join(words[i:]), kind, value, property_id))
+            self._values.setdefault((kind, value), set()).add(property_id)
+            if (kind, value) not in self._trigrams:
+                self._trigrams[(kind, value)] = trigrams(normalized)
+        self._by_property[property_id] = added
+        return added
+
+    def _remove(self, property_id: str):
+        for entry in self._by_property.pop(property_id, []):
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+            value_key = (entry[1], entry[2])
+            owners = self._values.get(value_key)
+            if owners is not None:
+                owners.discard(property_id)
+                if not owners:
+                    del self._values[value_key]
+                    self._trigrams.pop(value_key, None)
+
+    def _collect(self, matches: Dict, kind: str, value: str, property_id: str, exact: bool):
+        # Città e paesi si raggruppano per testo, gli hotel restano uno per property
+        group = (kind, value if kind != "property" else property_id)
+        match = matches.get(group)
+        if match is None:
+            match = matches[group] = {
+                "value": value,
+                "kind": kind,
+                "property_id": property_id if kind == "property" else None,
+                "count": len(self._values.get((kind, value), ())) if kind != "property" else 1,
+                "exact": exact,
+                "similarity": 1.0,
+            }
+        match["exact"] = match["exact"] or exact
+
+    def _fuzzy(self, key: str, limit: int, exclude: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        query = trigrams(key)
+        excluded = set(exclude)
+        found = []
+        for (kind, value), value_trigrams in self._trigrams.items():
+            similarity = len(query & value_trigrams) / len(query | value_trigrams)
+            if similarity < TRIGRAM_THRESHOLD:
+                continue
+            owners = self._values[(kind, value)]
+            if kind == "property":
+                for property_id in owners:
+                    if (kind, property_id) not in excluded:
+                        found.append({"value": value, "kind": kind, "property_id": property_id,
+                                      "count": 1, "exact": False, "similarity": similarity})
+            elif (kind, value) not in excluded:
+                found.append({"value": value, "kind": kind, "property_id": None,
+                              "count": len(owners), "exact": False, "similarity": similarity})
+        found.sort(key=lambda r: (-r["similarity"],) + self._rank(r))
+        return found[:limit]
+
+    @staticmethod
+    def _rank(match: Dict[str, Any]):
+        return (not match["exact"], SUGGEST_KINDS.index(match["kind"]), -match["count"], match["value"].casefold())
+
+
+# Istanza unica per processo
+suggest_index = SuggestIndex()
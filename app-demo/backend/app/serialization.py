@@ -0,0 +1,81 @@
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from app.compression import parse_q_values
+
+try:
+    import msgpack
+except ImportError:  # dipendenza opzionale: senza, si risponde sempre in JSON
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# =================================================================
+# RISPOSTE JSON VELOCI
+# =================================================================
+# Le liste pesanti (search, mine, media) si serializzano con un TypeAdapter costruito una volta
+# per tipo: validazione e scrittura dei byte JSON avvengono nel core Rust di pydantic in un solo
+# passaggio, anche con include= (exclude applicato lì). Niente modelli intermedi per elemento,
+# niente dict "jsonable" né json.dumps. Il confronto è in benchmarks/bench_serialization.py.
+
+@lru_cache(maxsize=None)
+def type_adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+def dump_json(tp: Any, value: Any, exclude: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Valida value come tp (dict della repository o entity di dominio) e lo scrive in JSON.
+    exclude vale per ogni elemento se value è una lista (es. include_exclude(include)).
+    """
+    adapter = type_adapter(tp)
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True), exclude=_exclude_for(value, exclude))
+
+def json_response(
+    tp: Any,
+    value: Any,
+    exclude: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    return Response(content=dump_json(tp, value, exclude), media_type="application/json", headers=headers)
+
+# =================================================================
+# MESSAGEPACK (negoziato con Accept)
+# =================================================================
+# Per i client interni (app mobile, partner): stessi dati della risposta JSON (stesso schema,
+# stesse esclusioni di include=), codificati in MessagePack. Lo chiede solo chi lo mette in Accept.
+
+def accepts_msgpack(request: Request) -> bool:
+    if msgpack is None:
+        return False
+    weights = parse_q_values(request.headers.get("accept", ""))
+    return any(weights.get(media_type, 0.0) > 0 for media_type in MSGPACK_MEDIA_TYPES)
+
+def dump_msgpack(tp: Any, value: Any, exclude: Optional[Dict[str, Any]] = None) -> bytes:
+    adapter = type_adapter(tp)
+    # mode="json": enum, date e Decimal come nella risposta JSON
+    data = adapter.dump_python(adapter.validate_python(value, from_attributes=True), mode="json", exclude=_exclude_for(value, exclude))
+    return msgpack.packb(data)
+
+def negotiated_response(
+    request: Request,
+    tp: Any,
+    value: Any,
+    exclude: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """JSON, oppure MessagePack se il client lo chiede (Accept) e il pacchetto è installato."""
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if accepts_msgpack(request):
+        return Response(content=dump_msgpack(tp, value, exclude), media_type=MSGPACK_MEDIA_TYPES[0], headers=headers)
+    return json_response(tp, value, exclude, headers)
+
+# =================================================================
+# HELPER PRIVATI
+# =================================================================
+
+def _exclude_for(value: Any, exclude: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # Per le liste l'exclude vale per ogni elemento
+    if exclude is not None and isinstance(value, list):
+        return {"__all__": exclude}
+    return exclude
@@ -0,0 +1,127 @@
+"""
+Export in streaming delle properties complete (stanze, amenities, media) di un owner o di tutto il catalogo.
+
+    python -m app.services.export_service --owner <cognito sub> [--format csv] [--output hotels.csv]
+    python -m app.services.export_service --output catalog.ndjson      # tutto il catalogo
+
+Stesso percorso di GET /api/properties/mine/export. Entrambi i formati si reimportano
+con l'import massivo (app/services/import_service.py).
+"""
+import argparse
+import csv
+import io
+import sys
+from typing import Any, Iterable, Iterator, List, Optional
+from app.config import settings
+from app.domain import entities
+from app.repositories.property_repository import PropertyRepository
+from app.schemas import PropertyData
+from app.serialization import dump_json
+from app.services.import_service import CSV_LIST_SEPARATOR
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Stesse colonne lette da read_csv (ref = id della property; status e id in più vengono ignorati all'import)
+CSV_COLUMNS = (
+    "ref", "status", "name", "address", "city", "country", "description", "latitude", "longitude", "amenities",
+    "room_id", "room_type", "room_price", "room_capacity", "room_description", "room_amenities",
+)
+
+# =================================================================
+# SCRITTURA DEI FORMATI
+# =================================================================
+# Un blocco di byte per pagina di properties: la risposta parte alla prima pagina
+# e la memoria non cresce con il numero di hotel.
+
+def ndjson_chunks(pages: Iterable[List[entities.Property]]) -> Iterator[bytes]:
+    """Una PropertyData per riga (stesso JSON di GET /api/properties/{id})."""
+    for page in pages:
+        yield b"".join(dump_json(PropertyData, prop) + b"\n" for prop in page)
+
+def csv_chunks(pages: Iterable[List[entities.Property]]) -> Iterator[bytes]:
+    """Una riga per stanza con le colonne della property ripetute (una riga sola se non ha stanze)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for page in pages:
+        for prop in page:
+            writer.writerows(_csv_rows(prop))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Catalogo vuoto: solo l'intestazione
+        yield buffer.getvalue().encode("utf-8")
+
+
+class ExportService:
+    def __init__(self, property_repo: PropertyRepository, page_size: int = settings.EXPORT_CHUNK_SIZE):
+        self.property_repo = property_repo
+        self.page_size = max(1, page_size)
+
+    def export(self, owner_id: Optional[str], fmt: str = "ndjson") -> Iterator[bytes]:
+        """Byte del file in blocchi; owner_id None = tutto il catalogo (solo CLI)."""
+        pages = self.property_repo.iter_pages(owner_id, self.page_size)
+        return csv_chunks(pages) if fmt == "csv" else ndjson_chunks(pages)
+
+
+# =================================================================
+# HELPER PRIVATI
+# =================================================================
+
+def _csv_rows(prop: entities.Property) -> Iterator[List[Any]]:
+    head = [
+        prop.id, prop.status.value, prop.name, prop.address, prop.city, prop.country, prop.description,
+        _csv_value(prop.latitude), _csv_value(prop.longitude),
+        CSV_LIST_SEPARATOR.join(a.name for a in prop.amenities),
+    ]
+    if not prop.rooms:
+        yield head + [""] * 6
+    for room in prop.rooms:
+        yield head + [
+            room.id, room.type.value, _csv_value(room.price), _csv_value(room.capacity), _csv_value(room.description),
+            CSV_LIST_SEPARATOR.join(a.name for a in room.amenities),
+        ]
+
+def _csv_value(value: Any) -> Any:
+    return "" if value is None else value
+
+
+def main(argv):
+    from app.db import SessionLocal
+    from app.repositories.user_repository import UserRepository
+    from app.storage.s3_media_storage import s3_media_storage
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--owner", help="Cognito sub of the owner; the whole catalog when omitted")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Default: from --output, else ndjson")
+    parser.add_argument("--output", help="Destination file; stdout when omitted")
+    parser.add_argument("--page-size", type=int, default=settings.EXPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv[1:])
+    fmt = args.format or ("csv" if (args.output or "").lower().endswith(".csv") else "ndjson")
+
+    db = SessionLocal()
+    try:
+        owner_id = None
+        if args.owner:
+            owner = UserRepository(db).get_by_cognito_id(args.owner)
+            if owner is None:
+                print(f"Unknown owner: {args.owner}", file=sys.stderr)
+                return 2
+            owner_id = owner.id
+
+        service = ExportService(PropertyRepository(db, s3_media_storage), page_size=args.page_size)
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in service.export(owner_id, fmt):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
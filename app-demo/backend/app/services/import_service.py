@@ -0,0 +1,334 @@
+"""
+Import massivo di properties (con stanze e amenities) per l'onboarding delle catene.
+
+    python -m app.services.import_service hotels.ndjson --owner <cognito sub> [--chunk-size 500]
+    python -m app.services.import_service hotels.csv --owner <cognito sub> [--format csv]
+
+Stesso percorso di POST /api/properties/import: stampa una riga JSON di avanzamento per chunk.
+"""
+import argparse
+import csv
+import dataclasses
+import io
+import itertools
+import sys
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from app import schemas
+from app.config import settings
+from app.domain import entities
+from app.domain.factories import AmenityFactory, PropertyAmenityFactory, RoomAmenityFactory
+from app.repositories.amenity_repository import AmenityRepository, PropertyAmenityRepository, RoomAmenityRepository
+from app.repositories.import_repository import BulkImportRepository
+from app.serialization import type_adapter
+
+# Riga del file: (numero di riga, testo JSON oppure dict con i campi già divisi)
+SourceRow = Tuple[int, Any]
+
+# Categoria delle amenities create dall'import quando la riga non la indica
+DEFAULT_AMENITY_CATEGORY = "General"
+
+CSV_LIST_SEPARATOR = "|"
+CSV_PROPERTY_FIELDS = ("ref", "name", "address", "city", "country", "description", "latitude", "longitude")
+
+# =================================================================
+# LETTURA DEI FORMATI
+# =================================================================
+
+def read_ndjson(lines: Iterable[Union[str, bytes]]) -> Iterator[SourceRow]:
+    """Una property per riga (PropertyImport in JSON, stanze comprese); le righe vuote si saltano."""
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            yield number, line
+
+def read_csv(lines: Iterable[str]) -> Iterator[SourceRow]:
+    """
+    Una stanza per riga, con le colonne della property ripetute:
+        ref,name,address,city,country,description,latitude,longitude,amenities,
+        room_type,room_price,room_capacity,room_description,room_amenities
+    Righe consecutive con lo stesso ref sono la stessa property; le amenities sono nomi separati da "|".
+    Celle vuote = campo assente. Il numero di riga è quello della prima riga della property.
+    """
+    reader = csv.DictReader(lines)
+    reader.fieldnames  # legge l'intestazione: line_num parte da lì
+    current, current_line = None, 0
+    row_start = reader.line_num + 1
+    for row in reader:
+        values = {k.strip(): v.strip() for k, v in row.items() if isinstance(k, str) and isinstance(v, str) and v.strip()}
+        ref = values.get("ref")
+        if current is None or not ref or ref != current.get("ref"):
+            if current is not None:
+                yield current_line, current
+            current, current_line = _csv_property(values), row_start
+        room = _csv_room(values)
+        if room:
+            current["rooms"].append(room)
+        # Una riga CSV può occupare più righe del file (campi tra virgolette con a capo)
+        row_start = reader.line_num + 1
+    if current is not None:
+        yield current_line, current
+
+def read_source(data: Union[str, bytes], fmt: str) -> Iterator[SourceRow]:
+    """Corpo completo (richiesta HTTP) -> righe, per formato "ndjson" o "csv"."""
+    if fmt == "csv":
+        try:
+            text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV body must be UTF-8")
+        return read_csv(io.StringIO(text, newline=""))
+    return read_ndjson(data.splitlines())
+
+
+class ImportService:
+    """
+    Valida le righe a chunk con gli schemi esistenti e salva ogni chunk in una transazione
+    (BulkImportRepository): una riga non valida si scarta e si segnala, le altre del chunk entrano.
+
+    - Amenities per nome: una query per chunk per i nomi non ancora visti (catalogo globale prima),
+      quelle che non esistono si creano una volta sola e si riusano nei chunk successivi.
+    - Le properties entrano in DRAFT come con POST /api/properties: non sono nella search pubblica,
+      quindi cache dei risultati e autocompletamento non cambiano fino alla pubblicazione.
+    """
+
+    def __init__(
+        self,
+        import_repo: BulkImportRepository,
+        property_amenity_repo: PropertyAmenityRepository,
+        room_amenity_repo: RoomAmenityRepository,
+        property_amenity_factory: PropertyAmenityFactory,
+        room_amenity_factory: RoomAmenityFactory,
+        chunk_size: int = settings.IMPORT_CHUNK_SIZE
+    ):
+        self.import_repo = import_repo
+        self.property_amenity_repo = property_amenity_repo
+        self.room_amenity_repo = room_amenity_repo
+        self.property_amenity_factory = property_amenity_factory
+        self.room_amenity_factory = room_amenity_factory
+        self.chunk_size = max(1, chunk_size)
+
+    def import_rows(
+        self, rows: Iterable[SourceRow], owner: entities.User, max_rows: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Un ImportProgress (dict) per chunk, più quello finale con done=True."""
+        totals = {"processed": 0, "imported": 0, "rooms": 0, "failed": 0, "created_amenities": 0}
+        known_property: Dict[str, entities.PropertyAmenity] = {}
+        known_room: Dict[str, entities.RoomAmenity] = {}
+        source = iter(rows)
+        chunk_number = 0
+
+        while True:
+            chunk = list(itertools.islice(source, self.chunk_size))
+            if not chunk:
+                break
+            chunk_number += 1
+
+            over_limit = None
+            if max_rows is not None and totals["processed"] + len(chunk) > max_rows:
+                # Oltre il limite ci si ferma: la prima riga esclusa viene segnalata
+                keep = max(0, max_rows - totals["processed"])
+                over_limit = {
+                    "line": chunk[keep][0], "ref": None,
+                    "errors": [{"type": "too_many_rows", "msg": f"Import limited to {max_rows} rows per request"}],
+                }
+                chunk = chunk[:keep]
+
+            valid, errors = self._validate(chunk)
+            property_ids: List[str] = []
+            if valid:
+                chunk_property = dict(known_property)
+                chunk_room = dict(known_room)
+                try:
+                    created_property = self._resolve_amenities(
+                        [a for _, item in valid for a in item.amenities],
+                        self.property_amenity_repo, self.property_amenity_factory, chunk_property
+                    )
+                    created_room = self._resolve_amenities(
+                        [a for _, item in valid for room in item.rooms for a in room.amenities],
+                        self.room_amenity_repo, self.room_amenity_factory, chunk_room
+                    )
+                    properties = [self._build_property(item, owner, chunk_property, chunk_room) for _, item in valid]
+                    self.import_repo.insert_chunk(properties, created_property, created_room)
+                except SQLAlchemyError as e:
+                    self.import_repo.rollback()
+                    # Il chunk è tutto annullato: ogni riga valida viene segnalata con l'errore del DB
+                    message = str(getattr(e, "orig", None) or e).strip()
+                    errors.extend(
+                        {"line": line, "ref": item.ref, "errors": [{"type": "database", "msg": message}]}
+                        for line, item in valid
+                    )
+                else:
+                    # Le amenities create diventano "note" solo a commit riuscito
+                    known_property, known_room = chunk_property, chunk_room
+                    property_ids = [p.id for p in properties]
+                    totals["imported"] += len(properties)
+                    totals["rooms"] += sum(len(p.rooms) for p in properties)
+                    totals["created_amenities"] += len(created_property) + len(created_room)
+
+            errors.sort(key=lambda e: e["line"])
+            if over_limit is not None:
+                errors.append(over_limit)
+            totals["processed"] += len(chunk)
+            totals["failed"] += len(errors) - (1 if over_limit is not None else 0)
+            yield {"chunk": chunk_number, **totals, "property_ids": property_ids, "errors": errors}
+            if over_limit is not None:
+                break
+
+        yield {"chunk": chunk_number, **totals, "done": True}
+
+    # =================================================================
+    # HELPER PRIVATI
+    # =================================================================
+
+    def _validate(self, chunk: List[SourceRow]) -> Tuple[List[Tuple[int, schemas.PropertyImport]], List[Dict[str, Any]]]:
+        adapter = type_adapter(schemas.PropertyImport)
+        valid, errors = [], []
+        for line, raw in chunk:
+            try:
+                if isinstance(raw, (str, bytes)):
+                    item = adapter.validate_json(raw)
+                else:
+                    item = adapter.validate_python(raw)
+            except ValidationError as e:
+                errors.append({
+                    "line": line,
+                    "ref": raw.get("ref") if isinstance(raw, dict) else None,
+                    "errors": e.errors(include_url=False, include_context=False, include_input=False),
+                })
+            else:
+                valid.append((line, item))
+        return valid, errors
+
+    def _resolve_amenities(
+        self,
+        refs: List[schemas.AmenityImport],
+        repo: AmenityRepository,
+        factory: AmenityFactory,
+        known: Dict[str, entities.IAmenity]
+    ) -> List[entities.IAmenity]:
+        # Nomi mai visti: una sola query; quelli che non esistono si creano (una volta per nome)
+        missing = {r.name.strip().lower() for r in refs} - known.keys()
+        if missing:
+            known.update(repo.get_by_names(missing))
+
+        created = []
+        for ref in refs:
+            key = ref.name.strip().lower()
+            if key not in known:
+                amenity = factory.create_amenity(
+                    id=str(uuid.uuid4()),
+                    name=ref.name.strip(),
+                    category=ref.category or DEFAULT_AMENITY_CATEGORY
+                )
+                amenity.description = ref.description
+                known[key] = amenity
+                created.append(amenity)
+        return created
+
+    def _build_property(
+        self,
+        item: schemas.PropertyImport,
+        owner: entities.User,
+        property_amenities: Dict[str, entities.PropertyAmenity],
+        room_amenities: Dict[str, entities.RoomAmenity]
+    ) -> entities.Property:
+        prop = entities.Property(
+            id=str(uuid.uuid4()),
+            owner=owner,
+            name=item.name,
+            address=item.address,
+            city=item.city,
+            country=item.country,
+            latitude=item.latitude,
+            longitude=item.longitude,
+            description=item.description,
+            status=entities.PropertyStatus.DRAFT,
+        )
+        # Copie: la descrizione custom è del link, non dell'amenity condivisa (add_amenity toglie i doppioni)
+        for ref in item.amenities:
+            amenity = dataclasses.replace(property_amenities[ref.name.strip().lower()], custom_description=None)
+            prop.add_amenity(amenity, ref.custom_description)
+
+        for room_data in item.rooms:
+            room = entities.Room(
+                id=str(uuid.uuid4()),
+                property_id=prop.id,
+                type=entities.RoomType(room_data.type),
+                price=room_data.price,
+                capacity=room_data.capacity,
+                description=room_data.description,
+            )
+            for ref in room_data.amenities:
+                amenity = dataclasses.replace(room_amenities[ref.name.strip().lower()], custom_description=None)
+                room.add_amenity(amenity, ref.custom_description)
+            prop.add_room(room)
+        return prop
+
+
+# =================================================================
+# HELPER PRIVATI (CSV)
+# =================================================================
+
+def _csv_list(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or "").split(CSV_LIST_SEPARATOR) if v.strip()]
+
+def _csv_property(values: Dict[str, str]) -> Dict[str, Any]:
+    prop: Dict[str, Any] = {k: values[k] for k in CSV_PROPERTY_FIELDS if k in values}
+    prop["amenities"] = _csv_list(values.get("amenities"))
+    prop["rooms"] = []
+    return prop
+
+def _csv_room(values: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    room = {
+        field: values[f"room_{field}"]
+        for field in ("type", "price", "capacity", "description")
+        if f"room_{field}" in values
+    }
+    if not room:
+        return None
+    room["amenities"] = _csv_list(values.get("room_amenities"))
+    return room
+
+
+def main(argv):
+    from app.db import SessionLocal
+    from app.repositories.user_repository import UserRepository
+    from app.repositories.search_card_repository import SearchCardRepository
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file")
+    parser.add_argument("--owner", required=True, help="Cognito sub of the owner (the user must exist)")
+    parser.add_argument("--format", choices=("ndjson", "csv"), help="Default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=settings.IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv[1:])
+    fmt = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+
+    db = SessionLocal()
+    try:
+        owner = UserRepository(db).get_by_cognito_id(args.owner)
+        if owner is None:
+            print(f"Unknown owner: {args.owner}")
+            return 2
+        # Processo a parte: niente indici in memoria, le card si aggiornano nella transazione
+        service = ImportService(
+            BulkImportRepository(db, search_cards=SearchCardRepository(db)),
+            PropertyAmenityRepository(db),
+            RoomAmenityRepository(db),
+            PropertyAmenityFactory(),
+            RoomAmenityFactory(),
+            chunk_size=args.chunk_size
+        )
+        progress_type = type_adapter(schemas.ImportProgress)
+        with open(args.file, encoding="utf-8-sig", newline="") as f:
+            rows = read_csv(f) if fmt == "csv" else read_ndjson(f)
+            for progress in service.import_rows(rows, owner):
+                print(progress_type.dump_json(progress_type.validate_python(progress)).decode(), flush=True)
+                last = progress
+    finally:
+        db.close()
+    return 0 if last["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,14 +1,16 @@
 # app/services/property_service.py
 import uuid
-from typing import List, Optional
+from typing import AbstractSet, List, Optional
 from fastapi import HTTPException
 
 from app.domain import entities
-from app.repositories.property_repository import PropertyRepository
+from app.repositories.property_repository import AsyncPropertyRepository, PropertyRepository
 from app.schemas import PropertyInput
 from app.domain.factories import PropertyAmenityFactory
 from app.repositories.media_repository import MediaRepository
 from app.repositories.amenity_repository import PropertyAmenityRepository
+from app.search.cache import SearchResultCache
+from app.search.suggest import SuggestIndex
 
 class PropertyService:
     def __init__(
@@ -16,24 +18,30 @@ class PropertyService:
         property_repo: PropertyRepository,
         property_amenity_factory: PropertyAmenityFactory,
         amenity_repo: PropertyAmenityRepository,
-        media_repo: MediaRepository
+        media_repo: MediaRepository,
+        search_cache: Optional[SearchResultCache] = None,
+        suggest_index: Optional[SuggestIndex] = None
     ):
         self.property_repo = property_repo
         self.property_amenity_factory = property_amenity_factory
         self.amenity_repo = amenity_repo
         self.media_repo = media_repo
+        self.search_cache = search_cache
+        self.suggest_index = suggest_index
         
     # mettiamo sia owner che owner_id per aiutarci nel test da /docs con fastapi.
-    def get_user_properties(self, owner: Optional[entities.User], owner_id: Optional[str] = None) -> List[entities.Property]:
+    def get_user_properties(
+        self, owner: Optional[entities.User], owner_id: Optional[str] = None, include: Optional[AbstractSet[str]] = None
+    ) -> List[entities.Property]:
         if owner:
-            return self.property_repo.get_by_owner_id(owner.id)
+            return self.property_repo.get_by_owner_id(owner.id, include)
         elif owner_id:
-            return self.property_repo.get_by_owner_id(owner_id)
+            return self.property_repo.get_by_owner_id(owner_id, include)
         else:
             return []
         
-    def get_property_by_id(self, property_id: str) -> entities.Property:
-        p = self.property_repo.get_by_id(property_id)
+    def get_property_by_id(self, property_id: str, include: Optional[AbstractSet[str]] = None) -> entities.Property:
+        p = self.property_repo.get_by_id(property_id, include)
         if not p:
             raise HTTPException(status_code=404, detail="Property not found")
         return p
@@ -80,6 +88,8 @@ class PropertyService:
             address=data.address,
             city=data.city,
             country=data.country,
+            latitude=data.latitude,
+            longitude=data.longitude,
             description=data.description,
             status=entities.PropertyStatus.DRAFT,
             amenities=final_amenities, # Contiene sia vecchie che nuove
@@ -108,7 +118,12 @@ class PropertyService:
             raise HTTPException(status_code=400, detail=str(e))
 
         # Save
-        return self.property_repo.save(prop)
+        saved = self.property_repo.save(prop)
+
+        # Una property appena pubblicata può comparire in qualsiasi ricerca già in cache
+        self._invalidate_search(prop.id, everywhere=True)
+        self._refresh_suggestions(saved)
+        return saved
     
     def unpublish_property(self, property_id: str, owner: entities.User) -> entities.Property:
         prop = self.property_repo.get_by_id(property_id)
@@ -120,7 +135,10 @@ class PropertyService:
 
         prop.unpublish()
 
-        return self.property_repo.save(prop)
+        saved = self.property_repo.save(prop)
+        self._invalidate_search(prop.id)
+        self._refresh_suggestions(saved)
+        return saved
     
     def archive_property(self, property_id: str, owner: entities.User) -> entities.Property:
         prop = self.property_repo.get_by_id(property_id)
@@ -132,7 +150,10 @@ class PropertyService:
 
         prop.archive()
 
-        return self.property_repo.save(prop)
+        saved = self.property_repo.save(prop)
+        self._invalidate_search(prop.id)
+        self._refresh_suggestions(saved)
+        return saved
 
     def delete_property(self, property_id: str, owner: entities.User) -> None:
         prop = self.property_repo.get_by_id(property_id)
@@ -144,6 +165,9 @@ class PropertyService:
             raise HTTPException(status_code=403, detail="Not authorized")
 
         self.property_repo.delete(prop.id)
+        self._invalidate_search(prop.id)
+        if self.suggest_index is not None:
+            self.suggest_index.remove(prop.id)
         
     def update_property(self, property_id: str, data: PropertyInput, owner: entities.User) -> entities.Property:
         prop = self.property_repo.get_by_id(property_id)
@@ -159,6 +183,8 @@ class PropertyService:
         prop.address = data.address
         prop.city = data.city
         prop.country = data.country
+        prop.latitude = data.latitude
+        prop.longitude = data.longitude
         prop.description = data.description
 
         # AMENITIES ESISTENTI (Solo ID)
@@ -191,6 +217,55 @@ class PropertyService:
         
         prop.media = property_media
 
-        return self.property_repo.save(prop)
+        saved = self.property_repo.save(prop)
+
+        # Se è pubblicata, i nuovi testi possono farla comparire in altre ricerche
+        self._invalidate_search(prop.id, everywhere=prop.status == entities.PropertyStatus.PUBLISHED)
+        self._refresh_suggestions(saved)
+        return saved
+
+    # =================================================================
+    # HELPER PRIVATI
+    # =================================================================
+
+    def _invalidate_search(self, property_id: str, everywhere: bool = False):
+        if self.search_cache is None:
+            return
+        if everywhere:
+            self.search_cache.invalidate_all()
+        else:
+            self.search_cache.invalidate_property(property_id)
+
     
-    
\ No newline at end of file
+
+    def _refresh_suggestions(self, prop: entities.Property):
+        # Nell'autocompletamento entrano solo le properties pubblicate
+        if self.suggest_index is None:
+            return
+        if prop.status == entities.PropertyStatus.PUBLISHED:
+            self.suggest_index.upsert(prop.id, prop.name, prop.city, prop.country)
+        else:
+            self.suggest_index.remove(prop.id)
+
+
+class AsyncPropertyService:
+    """Letture delle properties per le rotte GET async; stesse regole di PropertyService."""
+
+    def __init__(self, property_repo: AsyncPropertyRepository):
+        self.property_repo = property_repo
+
+    async def get_user_properties(
+        self, owner: Optional[entities.User], owner_id: Optional[str] = None, include: Optional[AbstractSet[str]] = None
+    ) -> List[entities.Property]:
+        if owner:
+            return await self.property_repo.get_by_owner_id(owner.id, include)
+        elif owner_id:
+            return await self.property_repo.get_by_owner_id(owner_id, include)
+        else:
+            return []
+
+    async def get_property_by_id(self, property_id: str, include: Optional[AbstractSet[str]] = None) -> entities.Property:
+        p = await self.property_repo.get_by_id(property_id, include)
+        if not p:
+            raise HTTPException(status_code=404, detail="Property not found")
+        return p
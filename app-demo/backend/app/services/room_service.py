@@ -1,13 +1,17 @@
 # app/services/room_service.py
+import dataclasses
 import uuid
+from typing import List, Optional
 from fastapi import HTTPException
 from app.domain import entities
-from app.repositories.room_repository import RoomRepository
+from app.repositories.room_repository import AsyncRoomRepository, RoomRepository
 from app.repositories.property_repository import PropertyRepository
 from app.repositories.media_repository import MediaRepository
 from app.schemas import NewAmenityInput, RoomInput
 from app.domain.factories import RoomAmenityFactory
 from app.repositories.amenity_repository import RoomAmenityRepository
+from app.search.cache import SearchResultCache
+from app.config import settings
 
 class RoomService:
     def __init__(
@@ -16,13 +20,15 @@ class RoomService:
         property_repo: PropertyRepository,
         media_repo: MediaRepository,
         room_amenity_factory: RoomAmenityFactory,
-        amenity_repo: RoomAmenityRepository
+        amenity_repo: RoomAmenityRepository,
+        search_cache: Optional[SearchResultCache] = None
     ):
         self.room_repo = room_repo
         self.property_repo = property_repo
         self.media_repo = media_repo
         self.room_amenity_factory = room_amenity_factory
         self.amenity_repo = amenity_repo
+        self.search_cache = search_cache
         
     def add_room(self, property_id: str, data: RoomInput, owner: entities.User) -> entities.Room:
         # Recupero Property (Serve per validazione logica)
@@ -84,8 +90,81 @@ class RoomService:
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
-        return self.room_repo.save(new_room)
+        saved = self.room_repo.save(new_room)
+        # Se la property è pubblicata, la stanza può farla comparire in altre ricerche (filtri su prezzo, capienza, amenities)
+        self._invalidate_search(prop.id, everywhere=prop.status == entities.PropertyStatus.PUBLISHED)
+        return saved
     
+    def add_rooms(self, property_id: str, data: List[RoomInput], owner: entities.User) -> List[entities.Room]:
+        """
+        Molte stanze per la stessa property in una transazione (onboarding di un hotel):
+        un solo controllo di ownership, amenities e media risolti in blocco, stanze ricaricate con una query.
+        """
+        if not data:
+            raise HTTPException(status_code=400, detail="No rooms to add")
+        if len(data) > settings.ROOM_BATCH_MAX_ROOMS:
+            raise HTTPException(status_code=400, detail=f"At most {settings.ROOM_BATCH_MAX_ROOMS} rooms per batch")
+
+        # Solo la property (niente stanze, media e amenities): serve per ownership e stato
+        prop = self.property_repo.get_by_id(property_id, include=frozenset())
+        if not prop:
+            raise HTTPException(status_code=404, detail="Property not found")
+        if not prop.is_owned_by(owner.id):
+            raise HTTPException(status_code=403, detail="Not authorized")
+
+        # Amenities esistenti: una query per tutti gli id; un id sconosciuto rifiuta il batch
+        existing = self.amenity_repo.get_by_ids({item.id for room in data for item in room.amenities})
+        unknown = sorted({item.id for room in data for item in room.amenities} - existing.keys())
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown room amenities: {', '.join(unknown)}")
+
+        # Nuove amenities: si riusa quella con lo stesso nome se c'è già, altrimenti si crea una volta sola
+        names = {new_data.name.strip().lower() for room in data for new_data in room.new_amenities}
+        by_name = self.amenity_repo.get_by_names(names)
+        created = []
+        for room_data in data:
+            for new_data in room_data.new_amenities:
+                key = new_data.name.strip().lower()
+                if key not in by_name:
+                    amenity = self.room_amenity_factory.create_amenity(
+                        id=str(uuid.uuid4()),
+                        name=new_data.name.strip(),
+                        category=new_data.category
+                    )
+                    amenity.description = new_data.description
+                    by_name[key] = amenity
+                    created.append(amenity)
+
+        media = self.media_repo.get_by_ids({mid for room in data for mid in room.media_ids})
+
+        new_rooms = []
+        for room_data in data:
+            room = entities.Room(
+                id=str(uuid.uuid4()),
+                property_id=property_id,
+                type=entities.RoomType(room_data.type),
+                price=room_data.price,
+                capacity=room_data.capacity,
+                description=room_data.description,
+                media=[media[mid] for mid in dict.fromkeys(room_data.media_ids) if mid in media]
+            )
+            # Copie: la descrizione custom è del link, non dell'amenity (add_amenity toglie i doppioni)
+            for item in room_data.amenities:
+                room.add_amenity(dataclasses.replace(existing[item.id], custom_description=None), item.custom_description)
+            for new_data in room_data.new_amenities:
+                room.add_amenity(dataclasses.replace(by_name[new_data.name.strip().lower()], custom_description=None))
+
+            # DOMAIN CHECK: come add_room
+            try:
+                prop.add_room(room)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            new_rooms.append(room)
+
+        saved = self.room_repo.insert_many(new_rooms, created)
+        self._invalidate_search(prop.id, everywhere=prop.status == entities.PropertyStatus.PUBLISHED)
+        return saved
+
     def get_room(self, room_id: str) -> entities.Room:
         room = self.room_repo.get_by_id(room_id)
         if not room:
@@ -105,6 +184,8 @@ class RoomService:
             raise HTTPException(status_code=403, detail="Not authorized")
         
         self.room_repo.delete(room_id)
+        # Togliere la stanza più economica / più grande cambia prezzo e capienza della property
+        self._invalidate_search(prop.id, everywhere=prop.status == entities.PropertyStatus.PUBLISHED)
         
     def update_room(self, room_id: str, data: RoomInput, owner: entities.User) -> entities.Room:
         room = self.room_repo.get_by_id(room_id)
@@ -138,7 +219,9 @@ class RoomService:
             if m: 
                 room.media.append(m)
 
-        return self.room_repo.save(room)
+        saved = self.room_repo.save(room)
+        self._invalidate_search(prop.id, everywhere=prop.status == entities.PropertyStatus.PUBLISHED)
+        return saved
     
     # intendiamo creazione di una nuova amenity e collegamento alla stanza
     def add_new_amenity(self, room_id: str, data: NewAmenityInput, owner: entities.User):
@@ -172,7 +255,9 @@ class RoomService:
         # Qui il metodo add_amenity della Room deve accettare anche la descrizione
         room.add_amenity(target_amenity, custom_description=data.description)
         
-        return self.room_repo.save(room)
+        saved = self.room_repo.save(room)
+        self._invalidate_search(prop.id, everywhere=prop.status == entities.PropertyStatus.PUBLISHED)
+        return saved
     
     def remove_room_amenity(self, room_id: str, amenity_id: str, owner: entities.User) -> entities.Room:
         # Recuperi
@@ -188,4 +273,36 @@ class RoomService:
         room.remove_amenity(amenity_id)
         
         # SAVE
-        return self.room_repo.save(room)
\ No newline at end of file
+        saved = self.room_repo.save(room)
+        self._invalidate_search(prop.id, everywhere=prop.status == entities.PropertyStatus.PUBLISHED)
+        return saved
+
+    # =================================================================
+    # HELPER PRIVATI
+    # =================================================================
+
+    # Le pagine di search in cache che contengono la property della stanza non sono più valide
+    # (everywhere: tutte, perché la property può entrare in pagine dove prima non c'era)
+    def _invalidate_search(self, property_id: str, everywhere: bool = False):
+        if self.search_cache is None:
+            return
+        if everywhere:
+            self.search_cache.invalidate_all()
+        else:
+            self.search_cache.invalidate_property(property_id)
+
+
+class AsyncRoomService:
+    """Letture delle stanze per le rotte GET async; stesse regole di RoomService."""
+
+    def __init__(self, room_repo: AsyncRoomRepository):
+        self.room_repo = room_repo
+
+    async def get_room(self, room_id: str) -> entities.Room:
+        room = await self.room_repo.get_by_id(room_id)
+        if not room:
+            raise HTTPException(status_code=404, detail="Room not found")
+        return room
+
+    async def get_rooms_by_property_id(self, property_id: str) -> list[entities.Room]:
+        return await self.room_repo.get_by_property_id(property_id)
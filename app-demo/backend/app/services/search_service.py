@@ -1,11 +1,125 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
+import anyio.to_thread
+from fastapi import HTTPException
 from app.domain import entities # <--- Importa entities
-from app.repositories.search_repository import SearchRepository
+from app.domain.search import SearchCriteria, SearchPage
+from app.repositories.search_repository import AsyncSearchRepository, SearchRepository
+from app.search.cache import SearchResultCache
+from app.search.suggest import SuggestIndex
+from app.search.engine import SearchEngine
 
 class SearchService:
-    def __init__(self, search_repo: SearchRepository):
+    def __init__(
+        self,
+        search_repo: SearchRepository,
+        cache: Optional[SearchResultCache] = None,
+        suggest_index: Optional[SuggestIndex] = None,
+        engine: Optional[SearchEngine] = None
+    ):
         self.search_repo = search_repo
+        self.cache = cache
+        self.suggest_index = suggest_index
+        self.engine = engine
 
-    # Ritorna una lista di Entità di Dominio, non Dizionari
-    def search(self, location: str = None) -> List[Dict[str, Any]]:
-        return self.search_repo.search_properties(location)
\ No newline at end of file
+    # Ritorna una pagina di risultati (dizionari) + il cursore per la pagina successiva
+    def search(self, criteria: Optional[SearchCriteria] = None) -> SearchPage:
+        criteria = criteria or SearchCriteria()
+
+        # Motore in memoria: già più veloce della cache, e sempre aggiornato ai commit
+        if self.engine is not None and self.engine.loaded:
+            try:
+                return self.engine.search(criteria)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        if self.cache is not None:
+            cached = self.cache.get_page(criteria)
+            if cached is not None:
+                return cached
+
+        try:
+            page = self.search_repo.search_properties(criteria)
+        except ValueError as e:
+            # Cursore non valido / non coerente con l'ordinamento, o filtri geo incompleti
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if self.cache is not None:
+            self.cache.set_page(criteria, page)
+        return page
+
+    # Export di tutti i risultati, un documento alla volta (niente cache né motore in memoria:
+    # servono i dati del DB e la lista completa non deve mai stare in memoria)
+    def export(self, criteria: Optional[SearchCriteria] = None) -> Iterator[Dict[str, Any]]:
+        try:
+            return self.search_repo.stream_properties(criteria)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Conteggi per facet sull'intero insieme di risultati (sort/cursor/limit ignorati)
+    def facets(self, criteria: Optional[SearchCriteria] = None) -> Dict[str, Any]:
+        try:
+            return self.search_repo.facet_counts(criteria or SearchCriteria())
+        except ValueError as e:
+            # Filtri incoerenti (es. raggio senza punto di riferimento)
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Autocompletamento: servito dall'indice in memoria, il DB si tocca solo se non è ancora caricato
+    def suggest(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        if self.suggest_index is None:
+            return []
+        if not self.suggest_index.loaded:
+            self.suggest_index.rebuild(self.search_repo.published_suggest_rows())
+        return self.suggest_index.suggest(prefix, limit)
+
+
+class AsyncSearchService(SearchService):
+    """
+    Stessa logica di SearchService (motore in memoria, cache, indice dei suggerimenti)
+    con la repository async: usata dalle rotte GET async. L'export resta su SearchService.
+    """
+
+    def __init__(
+        self,
+        search_repo: AsyncSearchRepository,
+        cache: Optional[SearchResultCache] = None,
+        suggest_index: Optional[SuggestIndex] = None,
+        engine: Optional[SearchEngine] = None
+    ):
+        super().__init__(search_repo, cache, suggest_index, engine)
+
+    async def search(self, criteria: Optional[SearchCriteria] = None) -> SearchPage:
+        criteria = criteria or SearchCriteria()
+
+        if self.engine is not None and self.engine.loaded:
+            try:
+                # Scansione in puro Python (properties e stanze): nel threadpool, non sull'event loop
+                return await anyio.to_thread.run_sync(self.engine.search, criteria)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        if self.cache is not None:
+            cached = self.cache.get_page(criteria)
+            if cached is not None:
+                return cached
+
+        try:
+            page = await self.search_repo.search_properties(criteria)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if self.cache is not None:
+            self.cache.set_page(criteria, page)
+        return page
+
+    async def facets(self, criteria: Optional[SearchCriteria] = None) -> Dict[str, Any]:
+        try:
+            return await self.search_repo.facet_counts(criteria or SearchCriteria())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def suggest(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        if self.suggest_index is None:
+            return []
+        if not self.suggest_index.loaded:
+            self.suggest_index.rebuild(await self.search_repo.published_suggest_rows())
+        return self.suggest_index.suggest(prefix, limit)
@@ -1,20 +1,33 @@
+import threading
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from app.config import settings
 from app.storage.media_storage_interface import IMediaStorage
 
 class S3MediaStorage(IMediaStorage):
-    def __init__(self):
-        # Configurazione client S3
-        # Se siamo in LocalStack, endpoint_url sarà valorizzato
-        self.s3_client = boto3.client(
-            's3',
-            region_name=settings.AWS_REGION,
-            endpoint_url=settings.AWS_ENDPOINT_URL # Fondamentale per LocalStack
-            # Nota: Le credenziali vengono prese automaticamente dalle var d'ambiente standard AWS_ACCESS_KEY_ID
-        )
+    """
+    Storage dei media su S3. Va usata come istanza unica per processo (s3_media_storage, sotto):
+    il client boto3 tiene un pool di connessioni HTTP keep-alive che va riusato tra le richieste.
+
+    Il client si crea al primo upload/delete (le rotte che non toccano S3 non lo pagano),
+    con il lock perché le rotte sync girano nel threadpool. I client boto3 sono thread-safe,
+    le Session no: ne usiamo una dedicata, creata una volta sola insieme al client.
+    """
+
+    def __init__(self, s3_client=None):
+        self._s3_client = s3_client
+        self._lock = threading.Lock()
         self.bucket_name = settings.S3_MEDIA_BUCKET
 
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            with self._lock:
+                if self._s3_client is None:
+                    self._s3_client = self._create_client()
+        return self._s3_client
+
     def store_media(self, file_name: str, file_data: bytes, content_type: str) -> str:
         try:
             self.s3_client.put_object(
@@ -46,4 +59,29 @@ class S3MediaStorage(IMediaStorage):
                 self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
         except ClientError as e:
             print(f"S3 Delete Error: {e}")
-            pass
\ No newline at end of file
+            pass
+
+    # =================================================================
+    # HELPER PRIVATI
+    # =================================================================
+
+    @staticmethod
+    def _create_client():
+        config = Config(
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            connect_timeout=settings.S3_CONNECT_TIMEOUT,
+            read_timeout=settings.S3_READ_TIMEOUT,
+            retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": "standard"},
+        )
+        # Se siamo in LocalStack, endpoint_url sarà valorizzato.
+        # Le credenziali vengono prese automaticamente dalle var d'ambiente standard AWS_ACCESS_KEY_ID
+        return boto3.session.Session().client(
+            's3',
+            region_name=settings.AWS_REGION,
+            endpoint_url=settings.AWS_ENDPOINT_URL, # Fondamentale per LocalStack
+            config=config
+        )
+
+
+# Istanza unica per processo
+s3_media_storage = S3MediaStorage()
@@ -0,0 +1,139 @@
+"""
+Costo di serializzazione di una pagina di search (50 hotel), prima e dopo app/serialization.py.
+
+    cd app-demo/backend && python -m benchmarks.bench_serialization [--hotels 50] [--repeat 50]
+
+Va lanciato dalla cartella backend (serve il package app); funziona anche come
+python benchmarks/bench_serialization.py.
+
+I documenti sono dict come quelli della SearchRepository (stessa forma, chiavi in più comprese).
+Nessun DB: si misura solo la trasformazione dict -> byte JSON della risposta.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+if not __package__:
+    # Lanciato come script: la cartella backend (quella del package app) non è nel path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.schemas import PropertySearchResponse, include_exclude
+from app.serialization import dump_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def media(prefix: str, i: int) -> Dict[str, Any]:
+    return {
+        "id": f"{prefix}-m{i}", "file_name": f"photo-{i}.jpg", "file_type": "image/jpeg",
+        "storage_path": f"http://localstack:4566/media/{prefix}-m{i}-photo-{i}.jpg", "description": "Vista",
+    }
+
+def amenity(i: int) -> Dict[str, Any]:
+    return {
+        "id": f"a{i}", "name": f"Amenity {i}", "category": "Comfort", "is_global": True,
+        "description": "Descrizione dell'amenity", "custom_description": None,
+    }
+
+def hotel(i: int) -> Dict[str, Any]:
+    hid = f"h{i}"
+    return {
+        "id": hid, "name": f"Grand Hotel {i}", "address": f"Via Roma {i}", "city": "Roma", "country": "Italia",
+        "description": "Un hotel nel centro storico, a due passi da tutto. " * 4, "status": "PUBLISHED",
+        "latitude": 41.9 + i / 1000, "longitude": 12.5 - i / 1000, "distance_km": 1.234 + i, "score": 0.8123,
+        "min_price": Decimal("89.00"), "cover": media(hid, 0),
+        "owner": {"id": "u1", "name": "Mario", "email": "mario@example.com"},
+        "amenities": [amenity(a) for a in range(8)],
+        "media": [media(hid, m) for m in range(5)], "media_count": 12,
+        "rooms": [
+            {
+                # property_id / is_available: nel documento ma non nello schema (li toglie la validazione)
+                "id": f"{hid}-r{r}", "property_id": hid, "type": "DOUBLE", "description": "Camera doppia",
+                "price": Decimal("89.00") + r * 10, "capacity": 2, "is_available": True,
+                "amenities": [amenity(a) for a in range(4)], "media": [media(f"{hid}-r{r}", 0)], "media_count": 3,
+            }
+            for r in range(3)
+        ],
+        "room_count": 6,
+    }
+
+
+# =================================================================
+# PERCORSI DI SERIALIZZAZIONE
+# =================================================================
+
+def classic(items: List[Dict[str, Any]]) -> bytes:
+    # Vecchio percorso FastAPI: modelli pydantic -> dict -> jsonable_encoder -> json.dumps
+    models = [PropertySearchResponse.model_validate(item) for item in items]
+    return JSONResponse(jsonable_encoder([m.model_dump() for m in models])).body
+
+def include_before(items: List[Dict[str, Any]]) -> bytes:
+    # include= prima di app/serialization.py: un modello e un dump per hotel, poi json.dumps
+    exclude = include_exclude({"media"})
+    return JSONResponse(
+        [PropertySearchResponse.model_validate(item).model_dump(mode="json", exclude=exclude) for item in items]
+    ).body
+
+def fast(items: List[Dict[str, Any]]) -> bytes:
+    return dump_json(List[PropertySearchResponse], items)
+
+def include_fast(items: List[Dict[str, Any]]) -> bytes:
+    return dump_json(List[PropertySearchResponse], items, exclude=include_exclude({"media"}))
+
+def orjson_after_validation(items: List[Dict[str, Any]]) -> bytes:
+    # Riferimento: stessa validazione, encoder orjson sul dict "python"
+    models = [PropertySearchResponse.model_validate(item) for item in items]
+    return orjson.dumps([m.model_dump() for m in models])
+
+
+def measure(fn: Callable[[List[Dict[str, Any]]], bytes], items: List[Dict[str, Any]], repeat: int) -> Dict[str, float]:
+    fn(items)  # warm-up (TypeAdapter, import lazy)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(items)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": statistics.median(timings), "p95_ms": sorted(timings)[int(len(timings) * 0.95) - 1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hotels", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    items = [hotel(i) for i in range(args.hotels)]
+    # Stesso contenuto JSON prima e dopo (a meno di spazi e formato dei float)
+    assert json.loads(classic(items)) == json.loads(fast(items))
+    assert json.loads(include_before(items)) == json.loads(include_fast(items))
+
+    cases = [
+        ("classic (validate + jsonable_encoder + json.dumps)", classic),
+        ("fast (cached TypeAdapter dump_json)", fast),
+        ("include=media before (per-item model_dump + json.dumps)", include_before),
+        ("include=media fast (dump_json with exclude)", include_fast),
+    ]
+    if orjson is not None:
+        cases.append(("reference: validate + orjson.dumps", orjson_after_validation))
+
+    print(f"{args.hotels} hotels, {len(fast(items)) / 1024:.0f} KiB of JSON, {args.repeat} runs")
+    baseline = None
+    for name, fn in cases:
+        result = measure(fn, items, args.repeat)
+        baseline = baseline or result["median_ms"]
+        print(f"  {name:<58} median {result['median_ms']:7.3f} ms  p95 {result['p95_ms']:7.3f} ms  "
+              f"x{baseline / result['median_ms']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+
+# Settings obbligatorie per importare app.config (i test non parlano con AWS)
+os.environ.setdefault("AWS_ENDPOINT_URL", "http://localhost:4566")
+os.environ.setdefault("S3_MEDIA_BUCKET", "test-media")
@@ -0,0 +1,74 @@
+import json
+from types import SimpleNamespace
+import psycopg2
+from app.domain import entities
+from app.domain.factories import PropertyAmenityFactory, RoomAmenityFactory
+from app.repositories.import_repository import BulkImportRepository
+from app.services.import_service import ImportService, read_ndjson
+
+
+class FakeCursor:
+    def __init__(self, session):
+        self.session = session
+
+    def copy_expert(self, statement, buffer):
+        data = buffer.read()
+        if "Broken" in data:
+            raise psycopg2.DataError("invalid input syntax for type numeric")
+        self.session.copied.append(statement)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Sessione con la sola connessione grezza (psycopg2) che usa BulkImportRepository._copy."""
+
+    def __init__(self):
+        self.copied, self.commits, self.rollbacks = [], 0, 0
+
+    def connection(self):
+        return SimpleNamespace(
+            connection=SimpleNamespace(cursor=lambda: FakeCursor(self)),
+            dialect=SimpleNamespace(loaded_dbapi=psycopg2),
+        )
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class NoAmenities:
+    def get_by_names(self, names):
+        return {}
+
+
+def _line(name):
+    return json.dumps({
+        "ref": name, "name": name, "address": "Via Roma 1", "city": "Roma", "country": "IT",
+        "description": "Hotel", "rooms": [{"type": "SINGLE", "price": 80, "capacity": 1}],
+    })
+
+
+def test_failing_copy_chunk_is_reported_and_import_continues():
+    db = FakeSession()
+    service = ImportService(
+        BulkImportRepository(db), NoAmenities(), NoAmenities(),
+        PropertyAmenityFactory(), RoomAmenityFactory(), chunk_size=2
+    )
+    owner = entities.User(id="owner-1", name="Owner", email="owner@example.com", cognito_uuid="sub-1")
+    lines = [_line("Broken A"), _line("Broken B"), _line("Good C"), _line("Good D")]
+
+    progress = list(service.import_rows(read_ndjson(lines), owner))
+
+    failed, imported, final = progress
+    assert failed["imported"] == 0 and failed["property_ids"] == []
+    assert [e["line"] for e in failed["errors"]] == [1, 2]
+    assert all(e["errors"][0]["type"] == "database" for e in failed["errors"])
+    assert "invalid input syntax" in failed["errors"][0]["errors"][0]["msg"]
+
+    assert imported["imported"] == 2 and imported["rooms"] == 2 and not imported["errors"]
+    assert final["done"] and (final["processed"], final["imported"], final["failed"]) == (4, 2, 2)
+    assert db.commits == 1 and db.rollbacks >= 1
@@ -0,0 +1,54 @@
+from datetime import datetime
+import pytest
+from app.domain.search import SearchCriteria, SearchSort
+from app.repositories.search_repository import SearchRepository
+from app.search.engine import SearchEngine
+
+ROMA = (41.9028, 12.4964)
+
+
+def _engine():
+    engine = SearchEngine()
+    for i in range(4):
+        property_id = f"p{i}"
+        engine._add({
+            "id": property_id, "status": "PUBLISHED", "created_at": datetime(2024, 1, i + 1),
+            "document": {
+                "id": property_id, "name": f"Hotel {i}", "city": "Roma",
+                "latitude": ROMA[0] + i * 0.01, "longitude": ROMA[1], "rooms": [],
+            },
+        })
+    return engine
+
+
+def _criteria(sort, cursor=None):
+    return SearchCriteria(sort=sort, latitude=ROMA[0], longitude=ROMA[1], limit=2, cursor=cursor)
+
+
+def _sql_plan(criteria):
+    # Prima query del piano: il cursore si decodifica prima di toccare il DB
+    return next(SearchRepository(None, source="live", assembly="python")._search_plan(criteria))
+
+
+def test_engine_distance_cursor_is_rejected_by_sql_search():
+    cursor = _engine().search(_criteria(SearchSort.DISTANCE)).next_cursor
+    assert cursor
+
+    with pytest.raises(ValueError, match="another search backend"):
+        _sql_plan(_criteria(SearchSort.DISTANCE, cursor))
+
+
+def test_sql_distance_cursor_is_rejected_by_engine():
+    # Ultima riga della pagina SQL: distanza in metri (earth_distance) + id
+    rows = [{"cursor_0": 0.0, "cursor_1": "p0"}, {"cursor_0": 1111.9, "cursor_1": "p1"}, {"cursor_0": 2223.9, "cursor_1": "p2"}]
+    _, cursor = SearchRepository(None)._paginate(rows, 2, SearchSort.DISTANCE)
+
+    with pytest.raises(ValueError, match="another search backend"):
+        _engine().search(_criteria(SearchSort.DISTANCE, cursor))
+
+
+def test_newest_cursor_moves_between_backends():
+    cursor = _engine().search(_criteria(SearchSort.NEWEST)).next_cursor
+
+    _, params = _sql_plan(_criteria(SearchSort.NEWEST, cursor))
+    assert params["cursor_0"] == datetime(2024, 1, 3) and params["cursor_1"] == "p2"
@@ -24,6 +24,18 @@ CREATE TABLE IF NOT EXISTS properties (
     description TEXT,
     status VARCHAR(20) DEFAULT 'DRAFT', -- Es: DRAFT, PUBLISHED, INACTIVE
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    -- Documento di ricerca (mantenuto dal trigger trg_properties_search_document)
+    search_document TEXT,     -- testo minuscolo e senza accenti (per trigram)
+    search_vector TSVECTOR,   -- documento full-text pesato (italiano + inglese)
+
+    -- Statistiche delle stanze (mantenute dal trigger trg_rooms_property_stats)
+    min_room_price DECIMAL(10, 2), -- prezzo della stanza più economica (NULL se non ci sono stanze)
+    max_room_capacity INTEGER,     -- capienza della stanza più grande (NULL se non ci sono stanze)
+
+    -- Coordinate (WGS84, gradi decimali). NULL = posizione non indicata: esclusa dai filtri geografici
+    latitude DOUBLE PRECISION CHECK (latitude BETWEEN -90 AND 90),
+    longitude DOUBLE PRECISION CHECK (longitude BETWEEN -180 AND 180),
     
     -- Vincolo Chiave Esterna
     CONSTRAINT fk_property_owner 
@@ -155,6 +167,14 @@ CREATE INDEX idx_properties_city_trgm ON properties USING gin (city gin_trgm_ops
 -- Cosa migliora: search per nome hotel veloce anche con tanti record
 CREATE INDEX idx_properties_name_trgm ON properties USING gin (name gin_trgm_ops);
 
+-- Indici trigram GIN sulle colonne 'address' e 'description' della tabella properties
+-- Tipo: GIN (trigram)
+-- Cosa fa: insieme a city e name coprono tutti i campi pesati della search in modalità "trigram"
+-- Come si usa: Postgres li usa con l'operatore <% (word_similarity) e li combina con un BitmapOr
+-- Cosa migliora: la search tollerante agli errori di battitura non scansiona tutta la tabella
+CREATE INDEX idx_properties_address_trgm ON properties USING gin (address gin_trgm_ops);
+CREATE INDEX idx_properties_description_trgm ON properties USING gin (description gin_trgm_ops);
+
 -- Indice B-tree su 'property_id' della tabella rooms
 -- Tipo: B-tree
 -- Cosa fa: permette di recuperare rapidamente tutte le stanze di una proprietà specifica
@@ -169,6 +189,13 @@ CREATE INDEX idx_rooms_property_id ON rooms(property_id);
 -- Cosa migliora: evita full scan della tabella media quando carichiamo le foto/asset di più hotel
 CREATE INDEX idx_media_property_id ON media(property_id);
 
+-- Indice B-tree su 'room_id' della tabella media
+-- Tipo: B-tree
+-- Cosa fa: permette di recuperare rapidamente i media collegati a una stanza
+-- Come si usa: utilizzato nelle query WHERE room_id = ANY(...) e nei LATERAL della search json
+-- Cosa migliora: i media delle stanze (che hanno solo room_id) si caricano senza full scan
+CREATE INDEX idx_media_room_id ON media(room_id);
+
 -- Indice B-tree su 'property_id' della tabella property_amenities_link
 -- Tipo: B-tree
 -- Cosa fa: velocizza il recupero delle amenities associate a una proprietà
@@ -183,6 +210,209 @@ CREATE INDEX idx_prop_amenities_link_pid ON property_amenities_link(property_id)
 -- Cosa migliora: evita full scan della tabella link quando recuperiamo amenities di più stanze
 CREATE INDEX idx_room_amenities_link_rid ON room_amenities_link(room_id);
 
+-- ========================================================
+-- FULL-TEXT SEARCH SULLE PROPERTIES
+-- ========================================================
+
+-- Abilita l'estensione unaccent
+-- Tipo: estensione Postgres
+-- Cosa fa: rimuove gli accenti dal testo (es. 'Città' -> 'Citta')
+-- Come si usa: usata dal trigger del documento di ricerca e dalle query di search
+-- Cosa migliora: 'citta' trova 'Città', 'cafe' trova 'Café'
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- Funzione trigger che mantiene il documento di ricerca di ogni property
+-- search_document: concatenazione minuscola e senza accenti dei 5 campi testuali
+-- search_vector: tsvector pesato (A = nome, B = città/paese, C = indirizzo, D = descrizione)
+--                con stemming sia italiano che inglese ('camere' ~ 'camera', 'hotels' ~ 'hotel')
+CREATE OR REPLACE FUNCTION properties_search_document_refresh() RETURNS trigger AS $$
+DECLARE
+    v_name TEXT := unaccent(coalesce(NEW.name, ''));
+    v_place TEXT := unaccent(concat_ws(' ', NEW.city, NEW.country));
+    v_address TEXT := unaccent(coalesce(NEW.address, ''));
+    v_description TEXT := unaccent(coalesce(NEW.description, ''));
+BEGIN
+    NEW.search_document := lower(concat_ws(' ', v_name, v_place, v_address, v_description));
+    NEW.search_vector :=
+        setweight(to_tsvector('italian', v_name), 'A') || setweight(to_tsvector('english', v_name), 'A') ||
+        setweight(to_tsvector('italian', v_place), 'B') || setweight(to_tsvector('english', v_place), 'B') ||
+        setweight(to_tsvector('simple', v_address), 'C') ||
+        setweight(to_tsvector('italian', v_description), 'D') || setweight(to_tsvector('english', v_description), 'D');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_properties_search_document ON properties;
+CREATE TRIGGER trg_properties_search_document
+    BEFORE INSERT OR UPDATE OF name, address, city, country, description ON properties
+    FOR EACH ROW EXECUTE FUNCTION properties_search_document_refresh();
+
+-- Indice GIN sul tsvector della tabella properties
+-- Tipo: GIN (full-text)
+-- Cosa fa: indice invertito lessema -> properties
+-- Come si usa: utilizzato dalle query con search_vector @@ websearch_to_tsquery(...)
+-- Cosa migliora: la ricerca per parole (con stemming) non scansiona più tutta la tabella
+CREATE INDEX idx_properties_search_vector ON properties USING gin (search_vector);
+
+-- Indice trigram GIN sul documento normalizzato della tabella properties
+-- Tipo: GIN (trigram)
+-- Cosa fa: copre con un solo indice la ricerca parziale su nome, città, paese, indirizzo e descrizione
+-- Come si usa: utilizzato dalle query con search_document LIKE '%...%'
+-- Cosa migliora: sostituisce l'OR di 5 ILIKE (di cui solo 2 indicizzati) che forzava un seq scan
+CREATE INDEX idx_properties_search_document_trgm ON properties USING gin (search_document gin_trgm_ops);
+
+-- ========================================================
+-- ORDINAMENTI E PAGINAZIONE (KEYSET) DELLA SEARCH
+-- ========================================================
+
+-- Funzione trigger che tiene aggiornati min_room_price e max_room_capacity della property
+-- Ricalcola le statistiche della property (vecchia e nuova, se la stanza cambia property)
+-- a ogni INSERT/UPDATE/DELETE di una stanza.
+CREATE OR REPLACE FUNCTION properties_room_stats_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE properties p
+        SET min_room_price = s.min_price, max_room_capacity = s.max_capacity
+        FROM (SELECT min(price) AS min_price, max(capacity) AS max_capacity FROM rooms WHERE property_id = OLD.property_id) s
+        WHERE p.id = OLD.property_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE properties p
+        SET min_room_price = s.min_price, max_room_capacity = s.max_capacity
+        FROM (SELECT min(price) AS min_price, max(capacity) AS max_capacity FROM rooms WHERE property_id = NEW.property_id) s
+        WHERE p.id = NEW.property_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rooms_property_stats ON rooms;
+CREATE TRIGGER trg_rooms_property_stats
+    AFTER INSERT OR DELETE OR UPDATE OF price, capacity, property_id ON rooms
+    FOR EACH ROW EXECUTE FUNCTION properties_room_stats_refresh();
+
+-- Indici B-tree parziali (solo properties PUBLISHED), uno per ordinamento
+-- Tipo: B-tree parziale
+-- Cosa fa: tengono le properties pubblicate già ordinate per (chiave, id)
+-- Come si usa: utilizzati dalle query ORDER BY ... LIMIT n con WHERE (chiave, id) < (cursore)
+-- Cosa migliora: ogni pagina (anche la centesima) legge solo n righe dell'indice, senza OFFSET né sort
+CREATE INDEX idx_properties_published_newest ON properties (created_at DESC, id DESC) WHERE status = 'PUBLISHED';
+CREATE INDEX idx_properties_published_price ON properties (min_room_price, id) WHERE status = 'PUBLISHED';
+CREATE INDEX idx_properties_published_capacity ON properties (max_room_capacity DESC, id DESC) WHERE status = 'PUBLISHED';
+
+-- ========================================================
+-- FILTRI FACET DELLA SEARCH (prezzo, capienza, tipo, amenities)
+-- ========================================================
+
+-- Indici B-tree composti sulla tabella rooms
+-- Tipo: B-tree (composto)
+-- Cosa fa: per ogni property tengono le stanze ordinate per prezzo / capienza; (type, price) per tipo
+-- Come si usa: utilizzati da EXISTS (SELECT 1 FROM rooms r WHERE r.property_id = p.id AND r.price BETWEEN ...)
+-- Cosa migliora: il filtro per prezzo/ospiti/tipo si risolve con un range scan per hotel, senza leggere tutte le stanze
+CREATE INDEX idx_rooms_property_price ON rooms(property_id, price);
+CREATE INDEX idx_rooms_property_capacity ON rooms(property_id, capacity);
+CREATE INDEX idx_rooms_type_price ON rooms(type, price);
+
+-- Indici B-tree inversi sulle tabelle di link (amenity -> property / stanza)
+-- Tipo: B-tree (composto)
+-- Cosa fa: dato un id di amenity restituiscono subito le properties / stanze che la offrono
+-- Come si usa: utilizzati da WHERE amenity_id = ANY(...) GROUP BY ... HAVING count(*) = n
+-- Cosa migliora: il filtro "ha tutte queste amenities" non scansiona più tutte le tabelle di link
+CREATE INDEX idx_prop_amenities_link_aid_pid ON property_amenities_link(amenity_id, property_id);
+CREATE INDEX idx_room_amenities_link_aid_rid ON room_amenities_link(amenity_id, room_id);
+
+-- ========================================================
+-- RICERCA GEOGRAFICA (raggio, bounding box, distanza)
+-- ========================================================
+
+-- earthdistance (richiede cube) è una contrib standard di Postgres: niente servizi esterni
+CREATE EXTENSION IF NOT EXISTS cube;
+CREATE EXTENSION IF NOT EXISTS earthdistance;
+
+-- Indice GiST sul punto (cube) calcolato dalle coordinate, solo properties PUBLISHED
+-- Tipo: GiST (espressione ll_to_earth)
+-- Cosa fa: indicizza ogni hotel come punto sulla sfera terrestre
+-- Come si usa: utilizzato da earth_box(ll_to_earth(:lat, :lng), :raggio) @> ll_to_earth(latitude, longitude)
+-- Cosa migliora: "hotel entro X km" legge solo gli hotel nel box del raggio, poi earth_distance rifinisce
+CREATE INDEX idx_properties_published_earth ON properties USING gist (ll_to_earth(latitude, longitude)) WHERE status = 'PUBLISHED';
+
+-- Indice B-tree composto sulle coordinate, solo properties PUBLISHED
+-- Tipo: B-tree (composto, parziale)
+-- Cosa fa: tiene gli hotel ordinati per latitudine (e longitudine)
+-- Come si usa: utilizzato da latitude BETWEEN :south AND :north AND longitude BETWEEN :west AND :east
+-- Cosa migliora: le viste mappa (bounding box) non scansionano tutta la tabella
+CREATE INDEX idx_properties_published_lat_lng ON properties (latitude, longitude) WHERE status = 'PUBLISHED';
+
+-- ========================================================
+-- EXPORT DEL CATALOGO
+-- ========================================================
+
+-- Indice B-tree composto (owner_id, id) sulla tabella properties
+-- Tipo: B-tree (composto)
+-- Cosa fa: tiene le properties di ogni owner ordinate per id
+-- Come si usa: utilizzato dalle pagine keyset dell'export (WHERE owner_id = ... AND id > ... ORDER BY id LIMIT n)
+--              e da /api/properties/mine (WHERE owner_id = ...)
+-- Cosa migliora: ogni pagina dell'export legge solo n righe dell'indice, anche per gli owner con migliaia di hotel
+CREATE INDEX idx_properties_owner_id ON properties (owner_id, id);
+
+-- ========================================================
+-- READ MODEL DELLA SEARCH (proiezione CQRS)
+-- ========================================================
+
+-- Tabella PROPERTY_SEARCH_CARDS
+-- Una riga per property con tutto quello che serve alla search già unito:
+-- colonne per filtri/ordinamenti (stessi nomi di properties) + il documento JSON della risposta.
+-- La scrive solo il backend (SearchCardRepository), nella stessa transazione delle scritture
+-- su properties, rooms, media e amenities. Per popolarla su un DB esistente:
+--   python -m app.search.cards rebuild
+CREATE TABLE IF NOT EXISTS property_search_cards (
+    id VARCHAR(50) PRIMARY KEY,  -- = properties.id
+    status VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP,
+    name VARCHAR(150) NOT NULL,
+    address VARCHAR(255),
+    city VARCHAR(100),
+    country VARCHAR(100),
+    description TEXT,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    search_document TEXT,
+    search_vector TSVECTOR,
+
+    -- Riassunto stanze / owner / amenities / copertina
+    min_room_price DECIMAL(10, 2),
+    max_room_price DECIMAL(10, 2),
+    max_room_capacity INTEGER,
+    room_count INTEGER NOT NULL DEFAULT 0,
+    room_types TEXT[] NOT NULL DEFAULT '{}',
+    amenity_ids TEXT[] NOT NULL DEFAULT '{}',
+    amenity_names TEXT[] NOT NULL DEFAULT '{}',
+    owner_id VARCHAR(50) NOT NULL,
+    owner_name VARCHAR(100),
+    cover_media JSONB,           -- primo media della property (NULL se non ce ne sono)
+
+    -- Documento completo (stessa forma di PropertySearchResponse)
+    document JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT fk_search_card_property FOREIGN KEY (id) REFERENCES properties(id) ON DELETE CASCADE
+);
+
+-- Indici della proiezione: gli stessi della search su properties, ma su un'unica tabella
+-- Tipo: GIN (tsvector, trigram, array), B-tree parziali, GiST (earthdistance)
+-- Cosa fanno: testo, keyset per newest/price/capacity, "ha tutte queste amenities" (amenity_ids @> ...), raggio e mappa
+-- Come si usano: automaticamente dalle query della search con SEARCH_SOURCE=cards
+-- Cosa migliorano: /api/search legge una sola tabella, senza join né LATERAL per riga
+CREATE INDEX idx_search_cards_search_vector ON property_search_cards USING gin (search_vector);
+CREATE INDEX idx_search_cards_search_document_trgm ON property_search_cards USING gin (search_document gin_trgm_ops);
+CREATE INDEX idx_search_cards_amenity_ids ON property_search_cards USING gin (amenity_ids);
+CREATE INDEX idx_search_cards_published_newest ON property_search_cards (created_at DESC, id DESC) WHERE status = 'PUBLISHED';
+CREATE INDEX idx_search_cards_published_price ON property_search_cards (min_room_price, id) WHERE status = 'PUBLISHED';
+CREATE INDEX idx_search_cards_published_capacity ON property_search_cards (max_room_capacity DESC, id DESC) WHERE status = 'PUBLISHED';
+CREATE INDEX idx_search_cards_published_earth ON property_search_cards USING gist (ll_to_earth(latitude, longitude)) WHERE status = 'PUBLISHED';
+-- Refresh periodico del motore di ricerca in memoria (card scritte dagli altri processi)
+CREATE INDEX idx_search_cards_updated_at ON property_search_cards (updated_at);
+
 
 
 -- ========================================================